@@ -3,8 +3,16 @@
 """
 Handles interactions with the Google Gemini API for text and image generation.
 Uses dedicated models from config. Sets thinkingBudget=0 for text models.
-Includes timing logs. Includes prompt enhancement function.
-Added describe_image_with_gemini function.
+Includes timing logs. Includes prompt enhancement function (memoized with rotating alternatives).
+Added describe_image_with_gemini function (results cached by image hash + model, utils/result_cache.py).
+All calls go through the shared async HTTP client (api/http_client.py).
+Streaming parses SSE frames incrementally on the event loop (api/sse_parser.py).
+API keys are picked per call by the health-aware key pool (api/key_pool.py).
+Transient failures are retried on another key with backoff + jitter within a per-operation deadline.
+Image calls can be hedged at the observed p90 latency (api/hedging.py, opt-in).
+Payload JSON/base64 encoding and response decoding run in the codec pool (utils/codec_pool.py).
+Hot-path debug logs use %-style args and LazyPayload summaries (utils/log_helpers.py).
+Identical concurrent image/text/describe calls share one in-flight request (utils/singleflight.py); coalesce=False opts out.
 """
 
 import base64
@@ -13,18 +21,37 @@ import json
 import logging
 import asyncio
 import time
-from typing import Optional, Tuple, Dict, Any, List, AsyncGenerator, Iterator
+import random
+from contextlib import asynccontextmanager
+from typing import Optional, Tuple, Dict, Any, List, AsyncGenerator, Union, Sequence
 from html import escape
-import requests
+import httpx
+from cachetools import TTLCache
 from config import (
     GEMINI_API_BASE_URL,
     GEMINI_IMAGE_MODEL,
     GEMINI_TEXT_MODEL,
     SYSTEM_PROMPT_ENHANCE_RESPECT_STYLE,
-    api_key_cycler,
     MAX_IMAGE_BYTES_API, # Import MAX_IMAGE_BYTES_API
+    GEMINI_RETRY_MAX_ATTEMPTS,
+    GEMINI_RETRY_BACKOFF_BASE,
+    GEMINI_RETRY_BACKOFF_MAX,
+    RESULT_CACHE_DIR,
+    DESCRIBE_CACHE_TTL_SECONDS,
+    DESCRIBE_CACHE_MEMORY_SIZE,
+    ENHANCE_CACHE_MAXSIZE,
+    ENHANCE_CACHE_TTL_SECONDS,
+    ENHANCE_CACHE_ALTERNATIVES,
 )
 from utils.cache import _guess_mime_type
+from utils.result_cache import ResultCache, make_cache_key
+from utils.log_helpers import LazyPayload
+from utils.codec_pool import run_codec, encode_json_bytes, decode_json_bytes, decode_json_with_inline_data, b64encode_str, sha256_digest
+from utils.singleflight import SingleFlight
+from api.http_client import get_http_client
+from api.sse_parser import SSEParser
+from api.key_pool import key_pool
+from api.hedging import HedgePolicy, image_hedge_policy
 
 logger = logging.getLogger(__name__)
 
@@ -34,10 +61,18 @@ REQUEST_TIMEOUT_IMAGE = 240
 REQUEST_TIMEOUT_TEXT_SINGLE = 90 # Already defined in config
 REQUEST_TIMEOUT_TEXT_STREAM = (10, 180)
 REQUEST_TIMEOUT_TEXT_ENHANCE = 60
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+RESPONSE_PREVIEW_BYTES = 2000
+IMAGE_GENERATION_CONFIG = {"candidateCount": 1, "responseModalities": ["TEXT", "IMAGE"]}
+TEXT_SINGLE_GENERATION_CONFIG = {"candidateCount": 1, "temperature": 0.7, "thinkingConfig": {"thinkingBudget": 0}}
+DESCRIBE_PROMPT = "Describe this image in detail, focusing on the main subject, setting, actions, and overall mood. Provide only the description. It should be in Russian."
 
-class StreamError(Exception):
-    """Custom exception for errors during streaming API calls."""
-    pass
+enhance_cache: TTLCache = TTLCache(maxsize=max(1, ENHANCE_CACHE_MAXSIZE), ttl=ENHANCE_CACHE_TTL_SECONDS)
+describe_cache = ResultCache("describe", RESULT_CACHE_DIR / "describe", DESCRIBE_CACHE_TTL_SECONDS, DESCRIBE_CACHE_MEMORY_SIZE)
+# Identical concurrent requests share one in-flight call (double taps, same !prompt from several users)
+image_flight = SingleFlight("image")
+text_flight = SingleFlight("text")
+describe_flight = SingleFlight("describe")
 
 # ================================== _parse_gemini_finish_reason(): Parses API finish reason/safety blocks ==================================
 def _parse_gemini_finish_reason(candidate: Dict[str, Any], prompt_feedback: Optional[Dict[str, Any]]) -> Optional[str]:
@@ -74,26 +109,218 @@ def _parse_gemini_finish_reason(candidate: Dict[str, Any], prompt_feedback: Opti
 # ================================== _parse_gemini_finish_reason() end ==================================
 
 
+# ================================== _gemini_url(): Builds the REST endpoint URL for a model method ==================================
+def _gemini_url(model_name: str, method: str, api_key: str) -> str:
+    separator = "&" if "?" in method else "?"
+    return f"{GEMINI_API_BASE_URL.strip('/')}/v1beta/models/{model_name}:{method}{separator}key={api_key}"
+# ================================== _gemini_url() end ==================================
+
+
+# ================================== _parse_retry_after(): Reads Retry-After seconds from a response ==================================
+def _parse_retry_after(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if not value:
+        return None
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    try:
+        return max(0.0, float(value))
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    except ValueError:
+        return None
+# ================================== _parse_retry_after() end ==================================
+
+
+# ================================== _response_text_preview(): Response text for error reporting without decoding large bodies ==================================
+def _response_text_preview(response: httpx.Response) -> str:
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if response.is_error:
+        return response.text
+    return response.content[:RESPONSE_PREVIEW_BYTES].decode("utf-8", errors="replace")
+# ================================== _response_text_preview() end ==================================
+
+
+# ================================== _retry_delay(): Backoff before the next attempt (full jitter, waits out key cooldowns) ==================================
+def _retry_delay(attempt: int, tried_keys: List[str]) -> float:
+    backoff = random.uniform(0, min(GEMINI_RETRY_BACKOFF_MAX, GEMINI_RETRY_BACKOFF_BASE * (2 ** (attempt - 1))))
+    # Cooldown comes from Retry-After when the API sent one (see key_pool.release)
+    return max(backoff, key_pool.wait_time(exclude=tried_keys))
+# ================================== _retry_delay() end ==================================
+
+
+# ================================== _send_gemini(): Sends a POST with retries on other keys within a deadline ==================================
+async def _send_gemini(
+    model_name: str, method: str, payload: Union[Dict[str, Any], bytes], timeout: Any, deadline: float, stream: bool = False, payload_size_hint: int = 0,
+    exclude_keys: Sequence[str] = (), used_keys: Optional[List[str]] = None,
+) -> httpx.Response:
+    """
+    Retries transient failures (429/5xx, timeouts, connection errors) on a different key with exponential
+    backoff + jitter, honouring Retry-After, until GEMINI_RETRY_MAX_ATTEMPTS or `deadline` seconds run out.
+    Every attempt is reported to the key pool here (for streams, when the headers arrive).
+    Returns the final response; with stream=True the caller must aclose() it.
+    `payload` may be pre-encoded JSON bytes; otherwise it is encoded once in the codec pool.
+    `exclude_keys` are avoided while other keys exist; every key this call acquires is appended to `used_keys`.
+    """
+    client = get_http_client()
+    body = payload if isinstance(payload, bytes) else await run_codec(encode_json_bytes, payload, size_hint=payload_size_hint)
+    deadline_at = time.monotonic() + deadline
+    tried_keys: List[str] = list(exclude_keys)
+    attempt = 0
+    headers = {"Accept": "text/event-stream"} if stream else None
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    while True:
+        attempt += 1
+        api_key = key_pool.acquire(exclude=tried_keys); tried_keys.append(api_key)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if used_keys is not None:
+            used_keys.append(api_key)
+        attempt_timeout = timeout
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if isinstance(timeout, (int, float)):
+            attempt_timeout = max(1.0, min(timeout, deadline_at - time.monotonic()))
+        start_time = time.monotonic()
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        try:
+            request = client.build_request("POST", _gemini_url(model_name, method, api_key), headers=headers, content=body, timeout=attempt_timeout)
+            response = await client.send(request, stream=stream)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        except asyncio.CancelledError:
+            key_pool.release(api_key, None, cancelled=True)
+            raise
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        except httpx.TransportError as e:
+            key_pool.release(api_key, None, time.monotonic() - start_time)
+            delay = _retry_delay(attempt, tried_keys)
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if attempt >= GEMINI_RETRY_MAX_ATTEMPTS or time.monotonic() + delay >= deadline_at:
+                raise
+            logger.warning(f"Gemini {method}: {type(e).__name__} на попытке {attempt}, повтор через {delay:.1f}с на другом ключе.")
+            await asyncio.sleep(delay)
+            continue
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        except Exception:
+            key_pool.release(api_key, None, time.monotonic() - start_time) # Non-transport httpx errors (DecodingError, TooManyRedirects) and bugs: free the slot, no retry
+            raise
+        key_pool.release(api_key, response.status_code, time.monotonic() - start_time, _parse_retry_after(response))
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= GEMINI_RETRY_MAX_ATTEMPTS:
+            return response
+        delay = _retry_delay(attempt, tried_keys)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if time.monotonic() + delay >= deadline_at:
+            logger.warning(f"Gemini {method}: статус {response.status_code}, дедлайн {deadline:.0f}с не позволяет повтор.")
+            return response
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if stream: await response.aclose()
+        logger.warning(f"Gemini {method}: статус {response.status_code} на попытке {attempt}, повтор через {delay:.1f}с на другом ключе.")
+        await asyncio.sleep(delay)
+# ================================== _send_gemini() end ==================================
+
+
+# ================================== _post_gemini(): POSTs a payload with retries, returns the final response ==================================
+async def _post_gemini(
+    model_name: str, method: str, payload: Union[Dict[str, Any], bytes], timeout: float, payload_size_hint: int = 0,
+    exclude_keys: Sequence[str] = (), used_keys: Optional[List[str]] = None,
+) -> httpx.Response:
+    return await _send_gemini(model_name, method, payload, timeout, deadline=timeout, payload_size_hint=payload_size_hint, exclude_keys=exclude_keys, used_keys=used_keys)
+# ================================== _post_gemini() end ==================================
+
+
+# ================================== _post_gemini_hedged(): POSTs with an optional hedge request after the p90 delay ==================================
+async def _post_gemini_hedged(
+    model_name: str, method: str, payload: Dict[str, Any], timeout: float, policy: HedgePolicy, payload_size_hint: int = 0
+) -> httpx.Response:
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if not policy.enabled:
+        return await _post_gemini(model_name, method, payload, timeout, payload_size_hint=payload_size_hint)
+    # Encode once; the primary and the hedge send the same bytes
+    payload = await run_codec(encode_json_bytes, payload, size_hint=payload_size_hint)
+    policy.record_request()
+    start_time = time.monotonic()
+    primary_keys: List[str] = []
+    primary = asyncio.create_task(_post_gemini(model_name, method, payload, timeout, used_keys=primary_keys))
+    tasks = [primary]
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    try:
+        hedge_delay = policy.hedge_delay()
+        done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if not done and policy.try_acquire_hedge():
+            remaining = timeout - (time.monotonic() - start_time)
+            logger.info(f"Хедж {method}: нет ответа за {hedge_delay:.1f}с, второй запрос (осталось {remaining:.0f}с).")
+            tasks.append(asyncio.create_task(_post_gemini(model_name, method, payload, max(1.0, remaining), exclude_keys=list(primary_keys)))) # Another key than the (possibly slow) primary
+        pending = set(tasks)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                # Reminder: Use new line, not semicolon, for the following block/statement.
+                if task.exception() is None and not task.result().is_error:
+                    policy.record_latency(time.monotonic() - start_time)
+                    # Reminder: Use new line, not semicolon, for the following block/statement.
+                    if task is not primary:
+                        policy.hedge_wins += 1; logger.info(f"Хедж {method} выиграл за {time.monotonic() - start_time:.1f}с.")
+                    return task.result()
+        # Neither succeeded: report the primary's outcome, as without hedging
+        return primary.result()
+    finally:
+        for task in tasks:
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if not task.done():
+                task.cancel()
+# ================================== _post_gemini_hedged() end ==================================
+
+
+# ================================== _stream_gemini(): Opens a streamed POST with retries before the first byte ==================================
+@asynccontextmanager
+async def _stream_gemini(model_name: str, method: str, payload: Union[Dict[str, Any], bytes], timeout: httpx.Timeout, deadline: float):
+    response = await _send_gemini(model_name, method, payload, timeout, deadline=deadline, stream=True)
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    try:
+        yield response
+    finally:
+        await response.aclose()
+# ================================== _stream_gemini() end ==================================
+
+
+
 # ================================== generate_image_with_gemini(): Generates image (+ optional text) via Gemini API ==================================
 async def generate_image_with_gemini(
     prompt: str,
     input_image_original: Optional[bytes] = None,
     input_image_user: Optional[bytes] = None,
     model_name: str = GEMINI_IMAGE_MODEL,
+    coalesce: bool = True,
+) -> Tuple[Optional[str], Optional[bytes], Optional[str]]:
+    """
+    Concurrent calls with the same model, prompt, input images and generation config share one request.
+    Pass coalesce=False when each call is meant to produce its own result (e.g. randomized settings).
+    """
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if not coalesce:
+        return await _request_image_generation(prompt, input_image_original, input_image_user, model_name)
+    input_size = len(input_image_original or b"") + len(input_image_user or b"")
+    original_digest = await run_codec(sha256_digest, input_image_original, size_hint=input_size) if input_image_original else b""
+    user_digest = await run_codec(sha256_digest, input_image_user, size_hint=input_size) if input_image_user else b""
+    flight_key = make_cache_key("image", model_name, prompt, original_digest, user_digest, json.dumps(IMAGE_GENERATION_CONFIG, sort_keys=True))
+    return await image_flight.do(flight_key, lambda: _request_image_generation(prompt, input_image_original, input_image_user, model_name))
+# ================================== generate_image_with_gemini() end ==================================
+
+
+# ================================== _request_image_generation(): Sends one image generation request ==================================
+async def _request_image_generation(
+    prompt: str, input_image_original: Optional[bytes], input_image_user: Optional[bytes], model_name: str
 ) -> Tuple[Optional[str], Optional[bytes], Optional[str]]:
-    api_key = next(api_key_cycler)
-    api_url = f"{GEMINI_API_BASE_URL.strip('/')}/v1beta/models/{model_name}:generateContent?key={api_key}"
-    headers = {"Content-Type": "application/json"}
-    logger.debug(f"Вызов Gemini Image API: {api_url}, Модель: {model_name}")
+    logger.debug("Вызов Gemini Image API, Модель: %s", model_name)
     parts = []
     # Reminder: Use new line, not semicolon, for the following block/statement.
     if len(prompt) > MAX_PROMPT_LEN_IMAGE:
         logger.warning(f"Длина промпта изображения {len(prompt)} > {MAX_PROMPT_LEN_IMAGE}. Обрезается.")
         prompt = prompt[:MAX_PROMPT_LEN_IMAGE] + "..."
     parts.append({"text": prompt})
-    logger.debug(f"Промпт изображения (длина {len(prompt)}): '{prompt[:100]}...'")
+    logger.debug("Промпт изображения (длина %s): '%s...'", len(prompt), prompt[:100])
     # Reminder: Use new line, not semicolon, for the following block/statement.
-    def add_image_part(image_bytes: bytes, image_label: str) -> Optional[str]:
+    async def add_image_part(image_bytes: bytes, image_label: str) -> Optional[str]:
         # Reminder: Use new line, not semicolon, for the following block/statement.
         try:
             mime_type, _ = _guess_mime_type(image_bytes)
@@ -101,33 +328,35 @@ async def generate_image_with_gemini(
             if len(image_bytes) > MAX_IMAGE_BYTES_API:
                 size_mb = len(image_bytes) / (1024 * 1024); limit_mb = MAX_IMAGE_BYTES_API / (1024 * 1024)
                 error_msg = f"Размер '{image_label}' ({size_mb:.1f}MB) > лимита ({limit_mb:.1f}MB)."; logger.error(error_msg); return error_msg
-            encoded_image = base64.b64encode(image_bytes).decode("utf-8")
+            encoded_image = await run_codec(b64encode_str, image_bytes, size_hint=len(image_bytes))
             parts.append({"inlineData": {"mimeType": mime_type, "data": encoded_image}})
-            logger.debug(f"Добавлено '{image_label}' ({len(image_bytes)} байт, {mime_type})")
+            logger.debug("Добавлено '%s' (%s байт, %s)", image_label, len(image_bytes), mime_type)
             return None
         # Reminder: Use new line, not semicolon, for the following block/statement.
         except Exception as e: error_msg = f"Ошибка '{image_label}': {e}"; logger.error(error_msg, exc_info=True); return error_msg
     # Reminder: Use new line, not semicolon, for the following block/statement.
     if input_image_original:
-        error = add_image_part(input_image_original, "основное")
+        error = await add_image_part(input_image_original, "основное")
         # Reminder: Use new line, not semicolon, for the following block/statement.
         if error: return None, None, f"Ошибка изображения: {error}"
     # Reminder: Use new line, not semicolon, for the following block/statement.
     if input_image_user:
-        error = add_image_part(input_image_user, "пользовательское")
+        error = await add_image_part(input_image_user, "пользовательское")
         # Reminder: Use new line, not semicolon, for the following block/statement.
         if error: return None, None, f"Ошибка изображения: {error}"
-    payload = {"contents": [{"role": "user", "parts": parts}], "generationConfig": {"candidateCount": 1, "responseModalities": ["TEXT", "IMAGE"]}}
-    logger.debug(f"Отправка Payload (Image API). Частей: {len(parts)}")
+    payload = {"contents": [{"role": "user", "parts": parts}], "generationConfig": IMAGE_GENERATION_CONFIG}
+    logger.debug("Отправка Payload (Image API). Частей: %s", len(parts))
     response_text_content = "(ответ не получен)"
     # Reminder: Use new line, not semicolon, for the following block/statement.
     try:
         start_time = time.time()
-        response = await asyncio.to_thread(requests.post, api_url, headers=headers, json=payload, timeout=REQUEST_TIMEOUT_IMAGE)
+        input_size = len(input_image_original or b"") + len(input_image_user or b"")
+        response = await _post_gemini_hedged(model_name, "generateContent", payload, REQUEST_TIMEOUT_IMAGE, image_hedge_policy, payload_size_hint=input_size)
         end_time = time.time(); logger.info(f"IMAGE API Call took {end_time - start_time:.3f}s (Status {response.status_code})")
-        logger.debug(f"Статус ответа API: {response.status_code}"); response_text_content = response.text
+        logger.debug("Статус ответа API: %s", response.status_code); response_text_content = _response_text_preview(response)
         response.raise_for_status()
-        res_json = response.json(); logger.debug(f"Ответ API (JSON начало): {str(res_json)[:500]}...")
+        res_json = await run_codec(decode_json_with_inline_data, response.content, size_hint=len(response.content))
+        logger.debug("Ответ API (JSON): %s", LazyPayload(res_json))
         generated_text: Optional[str] = None; output_image_bytes: Optional[bytes] = None
         # Reminder: Use new line, not semicolon, for the following block/statement.
         if "error" in res_json:
@@ -149,23 +378,23 @@ async def generate_image_with_gemini(
                         # Reminder: Use new line, not semicolon, for the following block/statement.
                         if data.get("mimeType", "").startswith("image/"):
                             # Reminder: Use new line, not semicolon, for the following block/statement.
-                            try: output_image_bytes = base64.b64decode(data["data"]); logger.debug(f"API вернул изображение ({len(output_image_bytes)} байт).")
+                            try: output_image_bytes = data["data"] if isinstance(data["data"], bytes) else base64.b64decode(data["data"]); logger.debug("API вернул изображение (%s байт).", len(output_image_bytes))
                             # Reminder: Use new line, not semicolon, for the following block/statement.
                             except Exception as e: decode_error = f"Ошибка декодирования: {e}"; logger.error(decode_error); error_text = f"Ошибка API: Не удалось декодировать изображение. ({e})"; return generated_text, None, error_text
             else: logger.warning("Candidate has no 'content' or 'parts'.")
-        else: logger.warning(f"Ответ API ОК, но нет кандидатов. Ответ: {res_json}"); return None, None, "Ошибка API: Нет данных ответа."
+        else: logger.warning("Ответ API ОК, но нет кандидатов. Ответ: %s", LazyPayload(res_json)); return None, None, "Ошибка API: Нет данных ответа."
         # Reminder: Use new line, not semicolon, for the following block/statement.
         if not output_image_bytes and not generated_text:
             finish_reason = candidate.get('finishReason', 'N/A') if 'candidate' in locals() else 'N/A'
             logger.warning(f"API OK, но нет контента (текст/изобр). FinishReason: {finish_reason}"); return None, None, "Ошибка API: Не удалось сгенерировать контент."
         return generated_text, output_image_bytes, None
     # Reminder: Use new line, not semicolon, for the following block/statement.
-    except requests.exceptions.Timeout: logger.error(f"Тайм-аут Image API ({REQUEST_TIMEOUT_IMAGE} сек)."); return None, None, f"Ошибка: Тайм-аут запроса к API ({REQUEST_TIMEOUT_IMAGE}с)."
+    except httpx.TimeoutException: logger.error(f"Тайм-аут Image API ({REQUEST_TIMEOUT_IMAGE} сек)."); return None, None, f"Ошибка: Тайм-аут запроса к API ({REQUEST_TIMEOUT_IMAGE}с)."
     # Reminder: Use new line, not semicolon, for the following block/statement.
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         status_code_str = "N/A"; error_detail = str(e)
         # Reminder: Use new line, not semicolon, for the following block/statement.
-        if e.response is not None:
+        if isinstance(e, httpx.HTTPStatusError):
             status_code = e.response.status_code; status_code_str = str(status_code)
             # Reminder: Use new line, not semicolon, for the following block/statement.
             try:
@@ -185,146 +414,128 @@ async def generate_image_with_gemini(
         return None, None, "Ошибка: Некорректный формат ответа API."
     # Reminder: Use new line, not semicolon, for the following block/statement.
     except Exception as e: logger.exception(f"Неожиданная ошибка при вызове Image API: {e}"); return None, None, "Неожиданная внутренняя ошибка API."
-# ================================== generate_image_with_gemini() end ==================================
+# ================================== _request_image_generation() end ==================================
+
+
+# ================================== _iter_sse_data(): Yields SSE 'data' payloads from a streamed response ==================================
+async def _iter_sse_data(response: httpx.Response) -> AsyncGenerator[str, None]:
+    parser = SSEParser()
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    async for raw_chunk in response.aiter_bytes():
+        for data_str in parser.feed(raw_chunk):
+            yield data_str
+    for data_str in parser.flush():
+        yield data_str
+# ================================== _iter_sse_data() end ==================================
 
 
-_sentinel = object()
 # ================================== generate_text_with_gemini_stream(): Generates text via Gemini streaming API ==================================
 async def generate_text_with_gemini_stream(
     history_contents: List[Dict[str, Any]], current_prompt: str, system_prompt_text: Optional[str], model_name: str = GEMINI_TEXT_MODEL
 ) -> AsyncGenerator[Tuple[Optional[str], Optional[str]], None]:
-    api_key = next(api_key_cycler)
-    api_url = f"{GEMINI_API_BASE_URL.strip('/')}/v1beta/models/{model_name}:streamGenerateContent?alt=sse&key={api_key}"
-    headers = {"Content-Type": "application/json", "Accept": "text/event-stream"}
     contents_payload = history_contents + [{"role": "user", "parts": [{"text": current_prompt}]}]
     generation_config = {"candidateCount": 1, "thinkingConfig": {"thinkingBudget": 0}}
     logger.info(f"Text Stream API: Model={model_name}, thinkingBudget=0")
     payload = {"contents": contents_payload, "generationConfig": generation_config}
     # Reminder: Use new line, not semicolon, for the following block/statement.
-    if system_prompt_text: payload["system_instruction"] = {"parts": [{"text": system_prompt_text}]}; logger.debug(f"Сис.инстр. текста: '{system_prompt_text[:100]}...'")
+    if system_prompt_text: payload["system_instruction"] = {"parts": [{"text": system_prompt_text}]}; logger.debug("Сис.инстр. текста: '%s...'", system_prompt_text[:100])
     else: logger.debug("Сис.инстр. текста не задана.")
-    logger.debug(f"Вызов Text API (stream): {api_url}, Контента: {len(contents_payload)}")
+    logger.debug("Вызов Text API (stream): Модель: %s, Контента: %s", model_name, len(contents_payload))
+    stream_timeout = httpx.Timeout(REQUEST_TIMEOUT_TEXT_STREAM[1], connect=REQUEST_TIMEOUT_TEXT_STREAM[0])
+    full_response_text = ""
     # Reminder: Use new line, not semicolon, for the following block/statement.
-    def stream_request() -> Iterator[bytes]:
-        # Reminder: Use new line, not semicolon, for the following block/statement.
-        try:
-            with requests.Session() as session:
-                start_time = time.time(); logger.debug(f"STREAM API Call START")
-                with session.post(api_url, headers=headers, json=payload, stream=True, timeout=REQUEST_TIMEOUT_TEXT_STREAM) as response:
-                    end_time = time.time(); logger.info(f"STREAM API Response (Status {response.status_code}) took {end_time - start_time:.3f}s"); logger.debug(f"Поток подключен (статус {response.status_code}).")
-                    response.raise_for_status()
-                    for line_bytes in response.iter_lines():
-                        # Reminder: Use new line, not semicolon, for the following block/statement.
-                        if line_bytes: yield line_bytes
-                    logger.debug("Завершение потока (iter_lines).")
-        # Reminder: Use new line, not semicolon, for the following block/statement.
-        except requests.exceptions.Timeout as err: logger.error(f"Тайм-аут Text API: {err}"); raise StreamError(f"Тайм-аут API ({REQUEST_TIMEOUT_TEXT_STREAM[1]}с)") from err
-        # Reminder: Use new line, not semicolon, for the following block/statement.
-        except requests.exceptions.RequestException as err:
-            error_details = str(err); status_code_str = "N/A"
+    try:
+        start_time = time.time(); logger.debug("STREAM API Call START")
+        async with _stream_gemini(model_name, "streamGenerateContent?alt=sse", payload, stream_timeout, deadline=REQUEST_TIMEOUT_TEXT_STREAM[1]) as response:
+            end_time = time.time(); logger.info(f"STREAM API Response (Status {response.status_code}) took {end_time - start_time:.3f}s"); logger.debug("Поток подключен (статус %s).", response.status_code)
             # Reminder: Use new line, not semicolon, for the following block/statement.
-            if err.response is not None:
-                status_code = err.response.status_code; status_code_str = str(status_code)
+            if response.is_error: await response.aread()
+            response.raise_for_status()
+            async for data_str in _iter_sse_data(response):
+                data_str = data_str.strip()
+                # Reminder: Use new line, not semicolon, for the following block/statement.
+                if not data_str: continue
                 # Reminder: Use new line, not semicolon, for the following block/statement.
                 try:
-                    response_text = err.response.text
+                    json_data = json.loads(data_str)
+                    # Reminder: Use new line, not semicolon, for the following block/statement.
+                    if "error" in json_data:
+                        error_info = json_data["error"]; error_message = error_info.get("message", "Неизв. ошибка потока")
+                        logger.error(f"Ошибка потока Gemini API: {error_message}"); yield None, f"Ошибка API в потоке: {error_message}"; return
+                    candidates = json_data.get("candidates", []); text_chunk = ""; safety_error_msg = None
                     # Reminder: Use new line, not semicolon, for the following block/statement.
-                    try: err_json = json.loads(response_text); msg = err_json.get("error", {}).get("message", response_text[:500])
+                    if candidates:
+                        candidate = candidates[0]; prompt_feedback = json_data.get("promptFeedback")
+                        safety_error_msg = _parse_gemini_finish_reason(candidate, prompt_feedback)
+                        # Reminder: Use new line, not semicolon, for the following block/statement.
+                        if not safety_error_msg:
+                            content = candidate.get("content")
+                            # Reminder: Use new line, not semicolon, for the following block/statement.
+                            if content and "parts" in content and content["parts"]: text_chunk = content["parts"][0].get("text", "")
+                    else: prompt_feedback = json_data.get("promptFeedback"); safety_error_msg = _parse_gemini_finish_reason({}, prompt_feedback)
                     # Reminder: Use new line, not semicolon, for the following block/statement.
-                    except json.JSONDecodeError: msg = response_text[:500]
-                    error_details = f"HTTP {status_code}: {msg}"
+                    if safety_error_msg: logger.warning(f"Поток остановлен: {safety_error_msg}"); yield None, safety_error_msg; return
+                    elif text_chunk: full_response_text += text_chunk; yield text_chunk, None
                 # Reminder: Use new line, not semicolon, for the following block/statement.
-                except Exception: error_details = f"HTTP {status_code} (не чит. ответ)"
-            # Reminder: Use new line, not semicolon, for the following block/statement.
-            if status_code_str == '404' or 'not found' in error_details.lower(): logger.error(f"Ошибка Text API: Endpoint не найден '{model_name}'."); raise StreamError(f"Модель '{model_name}' не поддерживает стриминг.") from err
-            else: logger.error(f"Ошибка Text API: {error_details}"); raise StreamError(f"Ошибка сети API ({status_code_str}): {escape(error_details)}") from err
-        # Reminder: Use new line, not semicolon, for the following block/statement.
-        except Exception as err: logger.exception(f"Неизвестная ошибка Text API: {err}"); raise StreamError(f"Неизвестная ошибка потока: {err}") from err
+                except json.JSONDecodeError: logger.warning(f"Не декодирован JSON-фрагмент: {data_str}")
+                # Reminder: Use new line, not semicolon, for the following block/statement.
+                except Exception as e: logger.exception(f"Ошибка JSON-фрагмента: {e} - Data: {data_str}"); yield None, f"Ошибка данных потока: {escape(str(e))}"
+            logger.debug("Завершение потока (SSE).")
     # Reminder: Use new line, not semicolon, for the following block/statement.
-    def _blocking_next(iterator: Iterator) -> Any:
-        # Reminder: Use new line, not semicolon, for the following block/statement.
-        try: return next(iterator)
-        # Reminder: Use new line, not semicolon, for the following block/statement.
-        except StopIteration: return _sentinel
-        # Reminder: Use new line, not semicolon, for the following block/statement.
-        except StreamError as e: raise e
-        # Reminder: Use new line, not semicolon, for the following block/statement.
-        except Exception as e: logger.error(f"Ошибка итератора потока: {e}", exc_info=True); raise StreamError(f"Ошибка итератора: {e}") from e
-    blocking_iterator = None; full_response_text = ""
+    except httpx.TimeoutException as err: logger.error(f"Тайм-аут Text API: {err}"); yield None, f"Тайм-аут API ({REQUEST_TIMEOUT_TEXT_STREAM[1]}с)"
     # Reminder: Use new line, not semicolon, for the following block/statement.
-    try:
-        blocking_iterator = await asyncio.to_thread(stream_request); logger.debug("Получен итератор потока.")
-        while True:
-            line_bytes = None
+    except httpx.HTTPError as err:
+        error_details = str(err); status_code_str = "N/A"
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if isinstance(err, httpx.HTTPStatusError):
+            status_code = err.response.status_code; status_code_str = str(status_code)
             # Reminder: Use new line, not semicolon, for the following block/statement.
             try:
-                line_bytes = await asyncio.to_thread(_blocking_next, blocking_iterator)
+                response_text = err.response.text
                 # Reminder: Use new line, not semicolon, for the following block/statement.
-                if line_bytes is _sentinel: logger.debug("Итератор завершен (sentinel)."); break
-                decoded_line = line_bytes.decode("utf-8", errors="ignore").strip()
+                try: err_json = json.loads(response_text); msg = err_json.get("error", {}).get("message", response_text[:500])
                 # Reminder: Use new line, not semicolon, for the following block/statement.
-                if decoded_line.startswith("data:"):
-                    data_str = decoded_line[len("data:") :].strip()
-                    # Reminder: Use new line, not semicolon, for the following block/statement.
-                    if data_str:
-                        # Reminder: Use new line, not semicolon, for the following block/statement.
-                        try:
-                            json_data = json.loads(data_str)
-                            # Reminder: Use new line, not semicolon, for the following block/statement.
-                            if "error" in json_data:
-                                error_info = json_data["error"]; error_message = error_info.get("message", "Неизв. ошибка потока")
-                                logger.error(f"Ошибка потока Gemini API: {error_message}"); yield None, f"Ошибка API в потоке: {error_message}"; return
-                            candidates = json_data.get("candidates", []); text_chunk = ""; safety_error_msg = None
-                            # Reminder: Use new line, not semicolon, for the following block/statement.
-                            if candidates:
-                                candidate = candidates[0]; prompt_feedback = json_data.get("promptFeedback")
-                                safety_error_msg = _parse_gemini_finish_reason(candidate, prompt_feedback)
-                                # Reminder: Use new line, not semicolon, for the following block/statement.
-                                if not safety_error_msg:
-                                    content = candidate.get("content")
-                                    # Reminder: Use new line, not semicolon, for the following block/statement.
-                                    if content and "parts" in content and content["parts"]: text_chunk = content["parts"][0].get("text", "")
-                            else: prompt_feedback = json_data.get("promptFeedback"); safety_error_msg = _parse_gemini_finish_reason({}, prompt_feedback)
-                            # Reminder: Use new line, not semicolon, for the following block/statement.
-                            if safety_error_msg: logger.warning(f"Поток остановлен: {safety_error_msg}"); yield None, safety_error_msg; return
-                            elif text_chunk: full_response_text += text_chunk; yield text_chunk, None
-                        # Reminder: Use new line, not semicolon, for the following block/statement.
-                        except json.JSONDecodeError: logger.warning(f"Не декодирован JSON-фрагмент: {data_str}")
-                        # Reminder: Use new line, not semicolon, for the following block/statement.
-                        except Exception as e: logger.exception(f"Ошибка JSON-фрагмента: {e} - Data: {data_str}"); yield None, f"Ошибка данных потока: {escape(str(e))}"
-            # Reminder: Use new line, not semicolon, for the following block/statement.
-            except StreamError as stream_err: logger.error(f"Ошибка итерации потока: {stream_err}"); yield None, str(stream_err); return
+                except json.JSONDecodeError: msg = response_text[:500]
+                error_details = f"HTTP {status_code}: {msg}"
             # Reminder: Use new line, not semicolon, for the following block/statement.
-            except Exception as iter_err: logger.exception(f"Неожиданная ошибка итерации: {iter_err}"); yield None, f"Неожиданная ошибка потока: {escape(str(iter_err))}"; return
-    # Reminder: Use new line, not semicolon, for the following block/statement.
-    except StreamError as setup_err: logger.error(f"Ошибка установки потока: {setup_err}"); yield None, str(setup_err)
+            except Exception: error_details = f"HTTP {status_code} (не чит. ответ)"
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if status_code_str == '404' or 'not found' in error_details.lower(): logger.error(f"Ошибка Text API: Endpoint не найден '{model_name}'."); yield None, f"Модель '{model_name}' не поддерживает стриминг."
+        else: logger.error(f"Ошибка Text API: {error_details}"); yield None, f"Ошибка сети API ({status_code_str}): {escape(error_details)}"
     # Reminder: Use new line, not semicolon, for the following block/statement.
-    except Exception as setup_err: logger.exception(f"Неож. ошибка установки потока: {setup_err}"); yield None, f"Неож. ошибка установки потока: {escape(str(setup_err))}"
+    except Exception as err: logger.exception(f"Неож. ошибка потока: {err}"); yield None, f"Неожиданная ошибка потока: {escape(str(err))}"
 # ================================== generate_text_with_gemini_stream() end ==================================
 
 
 # ================================== generate_text_with_gemini_single(): Generates single text response ==================================
 async def generate_text_with_gemini_single(
-    user_prompt: str, system_prompt_text: Optional[str], model_name: str = GEMINI_TEXT_MODEL
+    user_prompt: str, system_prompt_text: Optional[str], model_name: str = GEMINI_TEXT_MODEL, coalesce: bool = True
 ) -> Tuple[Optional[str], Optional[str]]:
-    api_key = next(api_key_cycler)
-    api_url = f"{GEMINI_API_BASE_URL.strip('/')}/v1beta/models/{model_name}:generateContent?key={api_key}"
-    headers = {"Content-Type": "application/json"}
-    logger.debug(f"Вызов Text API (single): {api_url}, Модель: {model_name}")
-    generation_config = {"candidateCount": 1, "temperature": 0.7, "thinkingConfig": {"thinkingBudget": 0}}
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if not coalesce:
+        return await _request_text_single(user_prompt, system_prompt_text, model_name)
+    flight_key = make_cache_key("text", model_name, user_prompt, system_prompt_text or "", json.dumps(TEXT_SINGLE_GENERATION_CONFIG, sort_keys=True))
+    return await text_flight.do(flight_key, lambda: _request_text_single(user_prompt, system_prompt_text, model_name))
+# ================================== generate_text_with_gemini_single() end ==================================
+
+
+# ================================== _request_text_single(): Sends one single-response text request ==================================
+async def _request_text_single(user_prompt: str, system_prompt_text: Optional[str], model_name: str) -> Tuple[Optional[str], Optional[str]]:
+    logger.debug("Вызов Text API (single), Модель: %s", model_name)
+    generation_config = TEXT_SINGLE_GENERATION_CONFIG
     logger.info(f"Text Single API: Model={model_name}, thinkingBudget=0")
     payload = {"contents": [{"role": "user", "parts": [{"text": user_prompt}]}], "generationConfig": generation_config}
     # Reminder: Use new line, not semicolon, for the following block/statement.
-    if system_prompt_text: payload["system_instruction"] = {"parts": [{"text": system_prompt_text}]}; logger.debug(f"Сис.инстр. (single): '{system_prompt_text[:100]}...'")
+    if system_prompt_text: payload["system_instruction"] = {"parts": [{"text": system_prompt_text}]}; logger.debug("Сис.инстр. (single): '%s...'", system_prompt_text[:100])
     response_text_content = "(ответ не получен)"
     # Reminder: Use new line, not semicolon, for the following block/statement.
     try:
-        start_time = time.time(); logger.debug(f"SINGLE API Call START")
-        response = await asyncio.to_thread(requests.post, api_url, headers=headers, json=payload, timeout=REQUEST_TIMEOUT_TEXT_SINGLE)
+        start_time = time.time(); logger.debug("SINGLE API Call START")
+        response = await _post_gemini(model_name, "generateContent", payload, REQUEST_TIMEOUT_TEXT_SINGLE)
         end_time = time.time(); logger.info(f"SINGLE API Call took {end_time - start_time:.3f}s (Status {response.status_code})")
-        logger.debug(f"Статус ответа API (single): {response.status_code}"); response_text_content = response.text
+        logger.debug("Статус ответа API (single): %s", response.status_code); response_text_content = _response_text_preview(response)
         response.raise_for_status()
-        res_json = response.json(); logger.debug(f"Ответ API (single, JSON начало): {str(res_json)[:500]}...")
+        res_json = await run_codec(decode_json_bytes, response.content, size_hint=len(response.content)); logger.debug("Ответ API (single, JSON): %s", LazyPayload(res_json))
         generated_text: Optional[str] = None
         # Reminder: Use new line, not semicolon, for the following block/statement.
         if "error" in res_json:
@@ -341,14 +552,14 @@ async def generate_text_with_gemini_single(
                 all_text_parts = [part.get("text", "") for part in candidate["content"]["parts"] if "text" in part]
                 generated_text = "".join(all_text_parts).strip(); logger.debug("API вернул текст (single)."); return generated_text, None
             else: logger.warning("Ответ API (single) нет content/parts."); return None, "Некорректная структура ответа API."
-        else: logger.warning(f"Ответ API ОК (single), но нет кандидатов: {res_json}"); return None, "Ошибка API: Нет данных ответа."
+        else: logger.warning("Ответ API ОК (single), но нет кандидатов: %s", LazyPayload(res_json)); return None, "Ошибка API: Нет данных ответа."
     # Reminder: Use new line, not semicolon, for the following block/statement.
-    except requests.exceptions.Timeout: logger.error(f"Тайм-аут Text API (single, {REQUEST_TIMEOUT_TEXT_SINGLE} сек)."); return None, f"Ошибка: Тайм-аут API ({REQUEST_TIMEOUT_TEXT_SINGLE}с)."
+    except httpx.TimeoutException: logger.error(f"Тайм-аут Text API (single, {REQUEST_TIMEOUT_TEXT_SINGLE} сек)."); return None, f"Ошибка: Тайм-аут API ({REQUEST_TIMEOUT_TEXT_SINGLE}с)."
     # Reminder: Use new line, not semicolon, for the following block/statement.
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         status_code_str = "N/A"; error_detail = str(e)
         # Reminder: Use new line, not semicolon, for the following block/statement.
-        if e.response is not None:
+        if isinstance(e, httpx.HTTPStatusError):
             status_code = e.response.status_code; status_code_str = str(status_code)
             # Reminder: Use new line, not semicolon, for the following block/statement.
             try:
@@ -368,7 +579,7 @@ async def generate_text_with_gemini_single(
         return None, "Ошибка: Некорректный формат ответа API."
     # Reminder: Use new line, not semicolon, for the following block/statement.
     except Exception as e: logger.exception(f"Неожиданная ошибка Text API (single): {e}"); return None, "Неожиданная внутренняя ошибка API."
-# ================================== generate_text_with_gemini_single() end ==================================
+# ================================== _request_text_single() end ==================================
 
 
 # ================================== enhance_prompt_with_gemini(): Enhances image prompt via LLM ==================================
@@ -387,32 +598,68 @@ async def enhance_prompt_with_gemini(
         if selected_style_data: llm_input_parts.append(f"- Style: {selected_style_data.get('name', 'N/A')}"); context_added = True
         llm_input_parts.append("---")
     else: llm_input_parts.append("Style Context: None")
-    user_prompt_for_llm = "\n".join(llm_input_parts); logger.debug(f"Prompt для улучшения LLM:\n{user_prompt_for_llm}")
+    user_prompt_for_llm = "\n".join(llm_input_parts); logger.debug("Prompt для улучшения LLM:\n%s", user_prompt_for_llm)
     system_prompt = SYSTEM_PROMPT_ENHANCE_RESPECT_STYLE
     # Reminder: Use new line, not semicolon, for the following block/statement.
     if not system_prompt: logger.error("Сист. промпт улучшения не загружен!"); return None, "Ошибка конфигурации: Проблема с промптом улучшения."
-    enhanced_prompt, error_message = await generate_text_with_gemini_single(user_prompt=user_prompt_for_llm, system_prompt_text=system_prompt, model_name=model_name)
+    cache_key = make_cache_key(
+        original_prompt, (selected_type_data or {}).get("id", ""), (selected_style_data or {}).get("name", ""), model_name, system_prompt
+    )
+    cache_entry = enhance_cache.get(cache_key)
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if cache_entry and cache_entry["llm_calls"] >= ENHANCE_CACHE_ALTERNATIVES:
+        alternatives = cache_entry["alternatives"]; index = cache_entry["next"] % len(alternatives)
+        cache_entry["next"] = index + 1
+        logger.info(f"Enhance кэш HIT ({cache_key[:12]}): вариант {index + 1}/{len(alternatives)}.")
+        return alternatives[index], None
+    # No coalescing: every call that misses the memo must add its own alternative, otherwise concurrent taps
+    # would count shared results as separate LLM calls and fill the memo with fewer distinct alternatives
+    enhanced_prompt, error_message = await generate_text_with_gemini_single(user_prompt=user_prompt_for_llm, system_prompt_text=system_prompt, model_name=model_name, coalesce=False)
     # Reminder: Use new line, not semicolon, for the following block/statement.
     if error_message: logger.error(f"Ошибка при улучшении: {error_message}"); return None, f"Ошибка LLM при улучшении: {error_message}"
     # Reminder: Use new line, not semicolon, for the following block/statement.
     if not enhanced_prompt: logger.warning("Улучшение не вернуло текст."); return None, "LLM не вернул улучшенный промпт."
     cleaned_enhanced_prompt = enhanced_prompt.strip(); logger.info(f"Улучшенный промпт: '{cleaned_enhanced_prompt[:150]}...'")
+    # Entry may have been evicted/replaced while awaiting the LLM; re-read before appending
+    cache_entry = enhance_cache.get(cache_key) or {"alternatives": [], "next": 0, "llm_calls": 0}
+    cache_entry["llm_calls"] += 1
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if cleaned_enhanced_prompt not in cache_entry["alternatives"]:
+        cache_entry["alternatives"].append(cleaned_enhanced_prompt)
+    cache_entry["next"] = cache_entry["alternatives"].index(cleaned_enhanced_prompt) + 1
+    enhance_cache[cache_key] = cache_entry
     return cleaned_enhanced_prompt, None
 # ================================== enhance_prompt_with_gemini() end ==================================
 
 
-# ================================== describe_image_with_gemini(): Asks Gemini to describe an image ==================================
+# ================================== describe_image_with_gemini(): Describes an image, served from the describe cache when possible ==================================
 async def describe_image_with_gemini(image_bytes: bytes, model_name: str = GEMINI_IMAGE_MODEL) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Returns a cached description for identical image bytes + model (+ prompt), otherwise asks Gemini.
+    Only successful descriptions are cached.
+    """
+    cache_key = make_cache_key(model_name, DESCRIBE_PROMPT, await run_codec(sha256_digest, image_bytes, size_hint=len(image_bytes)))
+    cached = await describe_cache.get(cache_key)
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if cached:
+        logger.info(f"Describe кэш HIT ({cache_key[:12]}, модель {model_name}).")
+        return cached, None
+    description, error = await describe_flight.do(cache_key, lambda: _request_image_description(image_bytes, model_name))
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if description and not error:
+        await describe_cache.set(cache_key, description)
+    return description, error
+# ================================== describe_image_with_gemini() end ==================================
+
+
+# ================================== _request_image_description(): Asks Gemini to describe an image ==================================
+async def _request_image_description(image_bytes: bytes, model_name: str) -> Tuple[Optional[str], Optional[str]]:
     """
     Sends an image to Gemini and asks for a textual description.
     Uses the standard generateContent endpoint with the specified (likely multimodal) model.
     """
-    api_key = next(api_key_cycler)
-    api_url = f"{GEMINI_API_BASE_URL.strip('/')}/v1beta/models/{model_name}:generateContent?key={api_key}"
-    headers = {"Content-Type": "application/json"}
-    logger.debug(f"Вызов Gemini Describe API: {api_url}, Модель: {model_name}")
-    describe_prompt = "Describe this image in detail, focusing on the main subject, setting, actions, and overall mood. Provide only the description. It should be in Russian."
-    parts = [{"text": describe_prompt}]
+    logger.debug("Вызов Gemini Describe API, Модель: %s", model_name)
+    parts = [{"text": DESCRIBE_PROMPT}]
     # Reminder: Use new line, not semicolon, for the following block/statement.
     try:
         mime_type, _ = _guess_mime_type(image_bytes)
@@ -420,23 +667,23 @@ async def describe_image_with_gemini(image_bytes: bytes, model_name: str = GEMIN
         if len(image_bytes) > MAX_IMAGE_BYTES_API:
             size_mb = len(image_bytes) / (1024 * 1024); limit_mb = MAX_IMAGE_BYTES_API / (1024 * 1024)
             error_msg = f"Размер изображения для описания ({size_mb:.1f}MB) > лимита ({limit_mb:.1f}MB)."; logger.error(error_msg); return None, error_msg
-        encoded_image = base64.b64encode(image_bytes).decode("utf-8")
+        encoded_image = await run_codec(b64encode_str, image_bytes, size_hint=len(image_bytes))
         parts.append({"inlineData": {"mimeType": mime_type, "data": encoded_image}})
-        logger.debug(f"Добавлено изображение ({len(image_bytes)} байт, {mime_type}) для описания.")
+        logger.debug("Добавлено изображение (%s байт, %s) для описания.", len(image_bytes), mime_type)
     # Reminder: Use new line, not semicolon, for the following block/statement.
     except Exception as e: error_msg = f"Ошибка подготовки изображения для описания: {e}"; logger.error(error_msg, exc_info=True); return None, error_msg
     payload = {"contents": [{"role": "user", "parts": parts}], "generationConfig": {"candidateCount": 1}} # Requesting only text implicitly
-    logger.debug(f"Отправка Payload (Describe API). Частей: {len(parts)}")
+    logger.debug("Отправка Payload (Describe API). Частей: %s", len(parts))
     response_text_content = "(ответ не получен)"
     # Reminder: Use new line, not semicolon, for the following block/statement.
     try:
         start_time = time.time()
         # Use a reasonable timeout for text generation
-        response = await asyncio.to_thread(requests.post, api_url, headers=headers, json=payload, timeout=REQUEST_TIMEOUT_TEXT_SINGLE)
+        response = await _post_gemini(model_name, "generateContent", payload, REQUEST_TIMEOUT_TEXT_SINGLE, payload_size_hint=len(image_bytes))
         end_time = time.time(); logger.info(f"DESCRIBE API Call took {end_time - start_time:.3f}s (Status {response.status_code})")
-        logger.debug(f"Статус ответа API (Describe): {response.status_code}"); response_text_content = response.text
+        logger.debug("Статус ответа API (Describe): %s", response.status_code); response_text_content = _response_text_preview(response)
         response.raise_for_status()
-        res_json = response.json(); logger.debug(f"Ответ API (Describe, JSON начало): {str(res_json)[:500]}...")
+        res_json = await run_codec(decode_json_bytes, response.content, size_hint=len(response.content)); logger.debug("Ответ API (Describe, JSON): %s", LazyPayload(res_json))
         generated_text: Optional[str] = None
         # Reminder: Use new line, not semicolon, for the following block/statement.
         if "error" in res_json:
@@ -458,14 +705,14 @@ async def describe_image_with_gemini(image_bytes: bytes, model_name: str = GEMIN
                 if not generated_text: logger.warning("Описание API вернуло пустой текст."); return None, "API вернул пустое описание."
                 return generated_text, None # Success
             else: logger.warning("Candidate (Describe) has no 'content' or 'parts'."); return None, "Некорректная структура ответа API (описание)."
-        else: logger.warning(f"Ответ API ОК (Describe), но нет кандидатов. Ответ: {res_json}"); return None, "Ошибка API: Нет данных ответа (описание)."
+        else: logger.warning("Ответ API ОК (Describe), но нет кандидатов. Ответ: %s", LazyPayload(res_json)); return None, "Ошибка API: Нет данных ответа (описание)."
     # Reminder: Use new line, not semicolon, for the following block/statement.
-    except requests.exceptions.Timeout: logger.error(f"Тайм-аут Describe API ({REQUEST_TIMEOUT_TEXT_SINGLE} сек)."); return None, f"Ошибка: Тайм-аут API описания ({REQUEST_TIMEOUT_TEXT_SINGLE}с)."
+    except httpx.TimeoutException: logger.error(f"Тайм-аут Describe API ({REQUEST_TIMEOUT_TEXT_SINGLE} сек)."); return None, f"Ошибка: Тайм-аут API описания ({REQUEST_TIMEOUT_TEXT_SINGLE}с)."
     # Reminder: Use new line, not semicolon, for the following block/statement.
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         status_code_str = "N/A"; error_detail = str(e)
         # Reminder: Use new line, not semicolon, for the following block/statement.
-        if e.response is not None:
+        if isinstance(e, httpx.HTTPStatusError):
             status_code = e.response.status_code; status_code_str = str(status_code)
             # Reminder: Use new line, not semicolon, for the following block/statement.
             try:
@@ -485,7 +732,7 @@ async def describe_image_with_gemini(image_bytes: bytes, model_name: str = GEMIN
         return None, "Ошибка: Некорректный формат ответа API (описание)."
     # Reminder: Use new line, not semicolon, for the following block/statement.
     except Exception as e: logger.exception(f"Неожиданная ошибка при вызове Describe API: {e}"); return None, "Неожиданная внутренняя ошибка API (описание)."
-# ================================== describe_image_with_gemini() end ==================================
+# ================================== _request_image_description() end ==================================
 
 
 # api/gemini_api.py end
\ No newline at end of file
@@ -0,0 +1,94 @@
+# api/hedging.py
+# -*- coding: utf-8 -*-
+"""
+Hedged-request policy for slow Gemini calls (opt-in, used for image generation).
+Tracks observed latencies to derive the hedge delay (p90) and caps hedges at a percentage of traffic.
+"""
+
+import logging
+import time
+from collections import deque
+from typing import Optional, Dict, Any
+from config import GEMINI_HEDGE_ENABLED, GEMINI_HEDGE_BUDGET_PERCENT, GEMINI_HEDGE_DEFAULT_DELAY
+
+logger = logging.getLogger(__name__)
+
+LATENCY_SAMPLES = 200
+MIN_SAMPLES_FOR_QUANTILE = 20
+HEDGE_QUANTILE = 0.9
+BUDGET_WINDOW_SECONDS = 600
+
+# ================================== HedgePolicy: Decides when and whether to send a hedge request ==================================
+class HedgePolicy:
+    def __init__(self, enabled: bool, budget_percent: float, default_delay: float):
+        self.enabled = enabled
+        self.budget_percent = budget_percent
+        self.default_delay = default_delay
+        self._latencies: deque = deque(maxlen=LATENCY_SAMPLES)
+        self._requests: deque = deque() # timestamps of primary requests
+        self._hedges: deque = deque() # timestamps of sent hedges
+        self.total_hedges = 0
+        self.hedge_wins = 0
+
+    # ================================== _prune(): Drops budget entries older than the window ==================================
+    def _prune(self, now: float):
+        for window in (self._requests, self._hedges):
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            while window and now - window[0] > BUDGET_WINDOW_SECONDS:
+                window.popleft()
+    # ================================== _prune() end ==================================
+
+    # ================================== record_request(): Counts a primary request towards the budget base ==================================
+    def record_request(self):
+        now = time.monotonic()
+        self._requests.append(now)
+        self._prune(now)
+    # ================================== record_request() end ==================================
+
+    # ================================== record_latency(): Adds a successful call latency sample ==================================
+    def record_latency(self, latency: float):
+        self._latencies.append(latency)
+    # ================================== record_latency() end ==================================
+
+    # ================================== hedge_delay(): Seconds to wait before hedging (observed p90 or default) ==================================
+    def hedge_delay(self) -> float:
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if len(self._latencies) < MIN_SAMPLES_FOR_QUANTILE:
+            return self.default_delay
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(HEDGE_QUANTILE * len(ordered)))]
+    # ================================== hedge_delay() end ==================================
+
+    # ================================== try_acquire_hedge(): Takes a hedge from the budget if allowed ==================================
+    def try_acquire_hedge(self) -> bool:
+        now = time.monotonic()
+        self._prune(now)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if (len(self._hedges) + 1) > len(self._requests) * self.budget_percent / 100.0:
+            logger.debug(f"Хедж пропущен: бюджет {self.budget_percent}% исчерпан ({len(self._hedges)}/{len(self._requests)}).")
+            return False
+        self._hedges.append(now)
+        self.total_hedges += 1
+        return True
+    # ================================== try_acquire_hedge() end ==================================
+
+    # ================================== snapshot(): Returns policy state for the admin status command ==================================
+    def snapshot(self) -> Dict[str, Any]:
+        self._prune(time.monotonic())
+        return {
+            "enabled": self.enabled,
+            "delay": self.hedge_delay(),
+            "samples": len(self._latencies),
+            "window_requests": len(self._requests),
+            "window_hedges": len(self._hedges),
+            "budget_percent": self.budget_percent,
+            "total_hedges": self.total_hedges,
+            "hedge_wins": self.hedge_wins,
+        }
+    # ================================== snapshot() end ==================================
+# ================================== HedgePolicy end ==================================
+
+
+image_hedge_policy = HedgePolicy(GEMINI_HEDGE_ENABLED, GEMINI_HEDGE_BUDGET_PERCENT, GEMINI_HEDGE_DEFAULT_DELAY)
+
+# api/hedging.py end
@@ -0,0 +1,85 @@
+# api/http_client.py
+# -*- coding: utf-8 -*-
+"""
+Process-wide async HTTP client for all Gemini API calls.
+Keeps one keep-alive connection pool (HTTP/2 when 'h2' is installed) with limits from config.
+Telegram file downloads (utils/cache.py) use a separate plain GET client without the Gemini JSON headers.
+"""
+
+import logging
+from typing import Optional
+import httpx
+from config import (
+    GEMINI_HTTP_MAX_CONNECTIONS,
+    GEMINI_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    GEMINI_HTTP_KEEPALIVE_EXPIRY,
+    GEMINI_HTTP2_ENABLED,
+)
+
+logger = logging.getLogger(__name__)
+
+_http_client: Optional[httpx.AsyncClient] = None
+_download_client: Optional[httpx.AsyncClient] = None
+
+# ================================== _is_http2_available(): Checks if the optional 'h2' package is installed ==================================
+def _is_http2_available() -> bool:
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    try:
+        import h2  # noqa: F401
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    except ImportError:
+        return False
+    return True
+# ================================== _is_http2_available() end ==================================
+
+
+# ================================== get_http_client(): Returns the shared AsyncClient, creating it on first use ==================================
+def get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if _http_client is not None and not _http_client.is_closed:
+        return _http_client
+    use_http2 = GEMINI_HTTP2_ENABLED and _is_http2_available()
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if GEMINI_HTTP2_ENABLED and not use_http2:
+        logger.warning("GEMINI_HTTP2 включен, но пакет 'h2' не установлен. Используется HTTP/1.1.")
+    limits = httpx.Limits(
+        max_connections=GEMINI_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=GEMINI_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=GEMINI_HTTP_KEEPALIVE_EXPIRY,
+    )
+    _http_client = httpx.AsyncClient(http2=use_http2, limits=limits, headers={"Content-Type": "application/json"})
+    logger.info(f"HTTP клиент Gemini создан: http2={use_http2}, max_conn={GEMINI_HTTP_MAX_CONNECTIONS}, keepalive={GEMINI_HTTP_MAX_KEEPALIVE_CONNECTIONS}, expiry={GEMINI_HTTP_KEEPALIVE_EXPIRY}s")
+    return _http_client
+# ================================== get_http_client() end ==================================
+
+
+# ================================== get_download_client(): Returns the shared plain GET client for file downloads ==================================
+def get_download_client() -> httpx.AsyncClient:
+    global _download_client
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if _download_client is not None and not _download_client.is_closed:
+        return _download_client
+    limits = httpx.Limits(max_connections=GEMINI_HTTP_MAX_CONNECTIONS, max_keepalive_connections=GEMINI_HTTP_MAX_KEEPALIVE_CONNECTIONS, keepalive_expiry=GEMINI_HTTP_KEEPALIVE_EXPIRY)
+    _download_client = httpx.AsyncClient(limits=limits)
+    logger.info("HTTP клиент загрузок создан.")
+    return _download_client
+# ================================== get_download_client() end ==================================
+
+
+# ================================== close_http_client(): Closes the shared clients and their pooled connections ==================================
+async def close_http_client():
+    global _http_client, _download_client
+    clients = [(name, client) for name, client in (("Gemini", _http_client), ("загрузок", _download_client)) if client is not None]
+    _http_client = None; _download_client = None
+    for name, client in clients:
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        try:
+            await client.aclose()
+            logger.info(f"HTTP клиент {name} закрыт.")
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        except Exception as e:
+            logger.error(f"Ошибка закрытия HTTP клиента {name}: {e}")
+# ================================== close_http_client() end ==================================
+
+# api/http_client.py end
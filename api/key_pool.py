@@ -0,0 +1,168 @@
+# api/key_pool.py
+# -*- coding: utf-8 -*-
+"""
+Health-aware Gemini API key scheduler (replaces the blind itertools.cycle).
+Tracks per-key in-flight requests, recent 429/5xx rates and a latency EWMA.
+Failing keys go into cooldown; each call is routed to the least-loaded healthy key.
+All methods are synchronous and meant to be called from the event loop thread.
+"""
+
+import logging
+import time
+from collections import deque
+from typing import Optional, List, Dict, Any, Iterable
+from config import GEMINI_API_KEYS, GEMINI_KEY_COOLDOWN_BASE, GEMINI_KEY_COOLDOWN_MAX
+
+logger = logging.getLogger(__name__)
+
+HEALTH_WINDOW_SECONDS = 300
+LATENCY_EWMA_ALPHA = 0.2
+ERROR_RATE_PENALTY = 4.0
+
+# ================================== _KeyStats: Mutable health counters of one API key ==================================
+class _KeyStats:
+    __slots__ = ("key", "in_flight", "latency_ewma", "recent", "cooldown_until", "consecutive_failures", "total_requests", "total_429", "total_5xx", "last_used")
+
+    def __init__(self, key: str):
+        self.key = key
+        self.in_flight = 0
+        self.latency_ewma: Optional[float] = None
+        self.recent: deque = deque() # (timestamp, status_code or None)
+        self.cooldown_until = 0.0
+        self.consecutive_failures = 0
+        self.total_requests = 0
+        self.total_429 = 0
+        self.total_5xx = 0
+        self.last_used = 0.0
+
+    # ================================== _prune(): Drops outcomes older than the health window ==================================
+    def _prune(self, now: float):
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        while self.recent and now - self.recent[0][0] > HEALTH_WINDOW_SECONDS:
+            self.recent.popleft()
+    # ================================== _prune() end ==================================
+
+    # ================================== rates(): Returns recent (429 rate, 5xx/network error rate) ==================================
+    def rates(self, now: float):
+        self._prune(now)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if not self.recent:
+            return 0.0, 0.0
+        total = len(self.recent)
+        rate_429 = sum(1 for _, status in self.recent if status == 429) / total
+        rate_5xx = sum(1 for _, status in self.recent if status is None or status >= 500) / total
+        return rate_429, rate_5xx
+    # ================================== rates() end ==================================
+# ================================== _KeyStats end ==================================
+
+
+# ================================== ApiKeyPool: Routes calls to the least-loaded healthy key ==================================
+class ApiKeyPool:
+    def __init__(self, keys: Iterable[str], cooldown_base: float = 30.0, cooldown_max: float = 600.0):
+        self._stats: Dict[str, _KeyStats] = {key: _KeyStats(key) for key in keys}
+        self.cooldown_base = cooldown_base
+        self.cooldown_max = cooldown_max
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if not self._stats:
+            raise ValueError("ApiKeyPool требует хотя бы один ключ.")
+
+    # ================================== _score(): Lower is better; in-flight load plus error penalty ==================================
+    def _score(self, stats: _KeyStats, now: float):
+        rate_429, rate_5xx = stats.rates(now)
+        load = stats.in_flight + ERROR_RATE_PENALTY * (rate_429 + rate_5xx)
+        return (load, stats.latency_ewma or 0.0, stats.last_used)
+    # ================================== _score() end ==================================
+
+    # ================================== acquire(): Picks a key and marks one request in flight on it ==================================
+    def acquire(self, exclude: Iterable[str] = ()) -> str:
+        now = time.monotonic()
+        excluded = set(exclude)
+        candidates = [s for s in self._stats.values() if s.key not in excluded] or list(self._stats.values())
+        healthy = [s for s in candidates if s.cooldown_until <= now]
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if healthy:
+            chosen = min(healthy, key=lambda s: self._score(s, now))
+        else:
+            chosen = min(candidates, key=lambda s: s.cooldown_until)
+            logger.warning(f"Все ключи API в cooldown. Используется ключ ...{chosen.key[-4:]} (cooldown ещё {chosen.cooldown_until - now:.0f}с).")
+        chosen.in_flight += 1
+        chosen.total_requests += 1
+        chosen.last_used = now
+        return chosen.key
+    # ================================== acquire() end ==================================
+
+    # ================================== wait_time(): Seconds until acquire(exclude) can return a key that is not in cooldown ==================================
+    def wait_time(self, exclude: Iterable[str] = ()) -> float:
+        now = time.monotonic()
+        excluded = set(exclude)
+        candidates = [s for s in self._stats.values() if s.key not in excluded] or list(self._stats.values())
+        return max(0.0, min(s.cooldown_until for s in candidates) - now)
+    # ================================== wait_time() end ==================================
+
+    # ================================== release(): Records the outcome of a request made with `key` ==================================
+    def release(self, key: str, status_code: Optional[int], latency: Optional[float] = None, retry_after: Optional[float] = None, cancelled: bool = False):
+        """status_code=None means a network error or timeout (no HTTP response). Cancelled calls only free the slot."""
+        stats = self._stats.get(key)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if stats is None:
+            return
+        now = time.monotonic()
+        stats.in_flight = max(0, stats.in_flight - 1)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if cancelled and status_code is None:
+            return
+        stats.recent.append((now, status_code))
+        stats._prune(now)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if latency is not None and status_code is not None and status_code < 400:
+            stats.latency_ewma = latency if stats.latency_ewma is None else (LATENCY_EWMA_ALPHA * latency + (1 - LATENCY_EWMA_ALPHA) * stats.latency_ewma)
+        is_rate_limited = status_code == 429
+        is_server_error = status_code is None or status_code >= 500
+        is_auth_error = status_code in (401, 403)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if is_rate_limited: stats.total_429 += 1
+        elif is_server_error: stats.total_5xx += 1
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if not (is_rate_limited or is_server_error or is_auth_error):
+            stats.consecutive_failures = 0
+            return
+        stats.consecutive_failures += 1
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if is_auth_error:
+            cooldown = self.cooldown_max
+        elif is_rate_limited:
+            cooldown = retry_after if retry_after else self.cooldown_base * (2 ** (stats.consecutive_failures - 1))
+        elif stats.consecutive_failures >= 2:
+            cooldown = self.cooldown_base * (2 ** (stats.consecutive_failures - 2))
+        else:
+            return
+        cooldown = min(cooldown, self.cooldown_max)
+        stats.cooldown_until = max(stats.cooldown_until, now + cooldown)
+        logger.warning(f"Ключ API ...{key[-4:]} в cooldown на {cooldown:.0f}с (статус {status_code}, подряд ошибок: {stats.consecutive_failures}).")
+    # ================================== release() end ==================================
+
+    # ================================== snapshot(): Returns per-key state for the admin status command ==================================
+    def snapshot(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        result = []
+        for stats in self._stats.values():
+            rate_429, rate_5xx = stats.rates(now)
+            result.append({
+                "key": f"...{stats.key[-4:]}",
+                "in_flight": stats.in_flight,
+                "latency_ewma": stats.latency_ewma,
+                "rate_429": rate_429,
+                "rate_5xx": rate_5xx,
+                "cooldown_left": max(0.0, stats.cooldown_until - now),
+                "total_requests": stats.total_requests,
+                "total_429": stats.total_429,
+                "total_5xx": stats.total_5xx,
+            })
+        return result
+    # ================================== snapshot() end ==================================
+# ================================== ApiKeyPool end ==================================
+
+
+key_pool = ApiKeyPool(GEMINI_API_KEYS, cooldown_base=GEMINI_KEY_COOLDOWN_BASE, cooldown_max=GEMINI_KEY_COOLDOWN_MAX)
+
+# api/key_pool.py end
@@ -0,0 +1,80 @@
+# api/sse_parser.py
+# -*- coding: utf-8 -*-
+"""
+Incremental Server-Sent Events parser that runs on the event loop.
+Fed raw body chunks as they arrive; returns the 'data' payload of every complete event.
+Handles CRLF/LF/CR line endings, multi-line data fields, comments and chunks split mid-line or mid-UTF-8 sequence.
+"""
+
+import codecs
+from typing import List
+
+# ================================== SSEParser: Incremental SSE frame parser ==================================
+class SSEParser:
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._buffer = ""
+        self._data_lines: List[str] = []
+
+    # ================================== feed(): Consumes a chunk, returns data of completed events ==================================
+    def feed(self, chunk: bytes) -> List[str]:
+        self._buffer += self._decoder.decode(chunk)
+        return self._drain(final=False)
+    # ================================== feed() end ==================================
+
+    # ================================== flush(): Ends the stream, returns data of a trailing unterminated event ==================================
+    def flush(self) -> List[str]:
+        self._buffer += self._decoder.decode(b"", final=True)
+        events = self._drain(final=True)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if self._buffer:
+            self._process_line(self._buffer, events)
+            self._buffer = ""
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if self._data_lines:
+            events.append("\n".join(self._data_lines))
+            self._data_lines = []
+        return events
+    # ================================== flush() end ==================================
+
+    # ================================== _drain(): Splits buffered text into complete lines ==================================
+    def _drain(self, final: bool) -> List[str]:
+        events: List[str] = []
+        buffer = self._buffer
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if buffer.endswith("\r") and not final:
+            # A lone CR may be the first half of a CRLF split across chunks
+            held = "\r"
+            buffer = buffer[:-1]
+        else:
+            held = ""
+        lines = buffer.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+        self._buffer = lines.pop() + held
+        for line in lines:
+            self._process_line(line, events)
+        return events
+    # ================================== _drain() end ==================================
+
+    # ================================== _process_line(): Applies one SSE line to the pending event ==================================
+    def _process_line(self, line: str, events: List[str]):
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if not line:
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if self._data_lines:
+                events.append("\n".join(self._data_lines))
+                self._data_lines = []
+            return
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if line.startswith(":"):
+            return
+        field, sep, value = line.partition(":")
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if sep and value.startswith(" "):
+            value = value[1:]
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if field == "data":
+            self._data_lines.append(value)
+    # ================================== _process_line() end ==================================
+# ================================== SSEParser end ==================================
+
+# api/sse_parser.py end
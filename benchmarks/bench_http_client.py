@@ -0,0 +1,99 @@
+# benchmarks/bench_http_client.py
+# -*- coding: utf-8 -*-
+"""
+Compares the legacy 'requests.post in asyncio.to_thread' call path with the shared async HTTP client.
+Runs against benchmarks/fake_gemini_server.py on localhost and reports calls/s and p95 latency.
+Usage: python benchmarks/bench_http_client.py [--calls N] [--concurrency C] [--latency SECONDS]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from benchmarks.fake_gemini_server import start_fake_server
+
+# ================================== _percentile(): Returns the p-th percentile of samples ==================================
+def _percentile(samples: List[float], p: float) -> float:
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+# ================================== _percentile() end ==================================
+
+
+# ================================== _run(): Fires `calls` requests with bounded concurrency and collects latencies ==================================
+async def _run(call_once, calls: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            ok = await call_once()
+            latencies.append(time.perf_counter() - start)
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if not ok:
+                errors += 1
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(calls)))
+    wall = time.perf_counter() - wall_start
+    return {"calls_per_s": calls / wall if wall else 0.0, "p50": statistics.median(latencies), "p95": _percentile(latencies, 95), "errors": errors}
+# ================================== _run() end ==================================
+
+
+# ================================== main(): Runs both call paths and prints a comparison ==================================
+async def main(args):
+    server, base_url = start_fake_server(latency=args.latency)
+    os.environ["GEMINI_API_BASE_URL"] = base_url
+    os.environ.setdefault("TELEGRAM_BOT_TOKEN", "0:bench")
+    os.environ.setdefault("GEMINI_API_KEYS", "bench-key-1,bench-key-2")
+    os.environ.setdefault("ADMIN_TELEGRAM_ID", "1")
+    import logging
+    import requests
+    import config
+    from api import gemini_api
+    from api.http_client import close_http_client
+    logging.getLogger().setLevel(logging.WARNING)
+    api_url = f"{base_url}/v1beta/models/{config.GEMINI_TEXT_MODEL}:generateContent?key=bench"
+    payload = {"contents": [{"role": "user", "parts": [{"text": "ping"}]}]}
+
+    async def legacy_call() -> bool:
+        response = await asyncio.to_thread(requests.post, api_url, headers={"Content-Type": "application/json"}, json=payload, timeout=90)
+        return response.status_code == 200
+
+    async def shared_client_call() -> bool:
+        text, error = await gemini_api.generate_text_with_gemini_single("ping", None)
+        return error is None
+
+    print(f"calls={args.calls} concurrency={args.concurrency} server_latency={args.latency}s")
+    results = {}
+    for name, fn in (("legacy requests+to_thread", legacy_call), ("shared httpx.AsyncClient", shared_client_call)):
+        await fn()
+        results[name] = await _run(fn, args.calls, args.concurrency)
+    await close_http_client()
+    server.shutdown()
+    for name, r in results.items():
+        print(f"{name:28s} {r['calls_per_s']:9.1f} calls/s   p50={r['p50'] * 1000:7.2f}ms   p95={r['p95'] * 1000:7.2f}ms   errors={r['errors']}")
+# ================================== main() end ==================================
+
+
+# Reminder: Use new line, not semicolon, for the following block/statement.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0)
+    asyncio.run(main(parser.parse_args()))
+
+# benchmarks/bench_http_client.py end
@@ -0,0 +1,73 @@
+# benchmarks/bench_logging.py
+# -*- coding: utf-8 -*-
+"""
+Measures CPU time and peak memory of logging one image API response the old way
+(eager f-string with str(res_json)[:500]) vs. LazyPayload (%-style, size/shape summary).
+Runs at INFO level (debug disabled, the production default) and at DEBUG level.
+Usage: python benchmarks/bench_logging.py [--image-mb MB] [--iterations N]
+"""
+
+import argparse
+import base64
+import io
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.log_helpers import LazyPayload
+
+logger = logging.getLogger("bench_logging")
+
+# ================================== _eager(): Old pattern ==================================
+def _eager(res_json):
+    logger.debug(f"Ответ API (JSON начало): {str(res_json)[:500]}...")
+# ================================== _eager() end ==================================
+
+
+# ================================== _lazy(): New pattern ==================================
+def _lazy(res_json):
+    logger.debug("Ответ API (JSON): %s", LazyPayload(res_json))
+# ================================== _lazy() end ==================================
+
+
+# ================================== _measure(): CPU seconds per call and peak traced bytes ==================================
+def _measure(func, res_json, iterations: int):
+    func(res_json)
+    tracemalloc.start()
+    start = time.process_time()
+    for _ in range(iterations):
+        func(res_json)
+    cpu = (time.process_time() - start) / iterations
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu, peak
+# ================================== _measure() end ==================================
+
+
+# ================================== main(): Runs the comparison ==================================
+def main(args):
+    image = b"\x89PNG\r\n\x1a\n" + os.urandom(int(args.image_mb * 1024 * 1024))
+    res_json = {"candidates": [{"content": {"parts": [{"text": "caption"}, {"inlineData": {"mimeType": "image/png", "data": base64.b64encode(image).decode("ascii")}}], "role": "model"}, "finishReason": "STOP"}]}
+    handler = logging.StreamHandler(io.StringIO())
+    logger.addHandler(handler); logger.propagate = False
+    print(f"image={args.image_mb}MB iterations={args.iterations}")
+    for level_name in ("INFO", "DEBUG"):
+        logger.setLevel(getattr(logging, level_name))
+        for name, func in (("eager f-string", _eager), ("LazyPayload", _lazy)):
+            cpu, peak = _measure(func, res_json, args.iterations)
+            print(f"{level_name:5s} {name:15s} cpu={cpu * 1000:9.3f}ms/call   peak mem={peak / (1024 * 1024):8.2f}MB")
+# ================================== main() end ==================================
+
+
+# Reminder: Use new line, not semicolon, for the following block/statement.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--image-mb", type=float, default=4.0)
+    parser.add_argument("--iterations", type=int, default=20)
+    main(parser.parse_args())
+
+# benchmarks/bench_logging.py end
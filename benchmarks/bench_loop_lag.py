@@ -0,0 +1,91 @@
+# benchmarks/bench_loop_lag.py
+# -*- coding: utf-8 -*-
+"""
+Measures event-loop lag while image calls with multi-MB base64 payloads are in flight.
+Runs generate_image_with_gemini against benchmarks/fake_gemini_server.py once per CODEC_POOL_KIND
+(each in a fresh subprocess, since config is read at import) and reports loop lag p99/max and calls/s.
+Usage: python benchmarks/bench_loop_lag.py [--calls N] [--concurrency C] [--image-mb MB]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+MODES = ("inline", "thread", "process")
+
+# ================================== _worker(): Runs the load in the current process and prints a JSON result ==================================
+async def _worker(args):
+    from benchmarks.fake_gemini_server import start_fake_server
+    image_size = int(args.image_mb * 1024 * 1024)
+    server, base_url = start_fake_server(latency=0.05, image_bytes=image_size)
+    os.environ["GEMINI_API_BASE_URL"] = base_url
+    import logging
+    from api import gemini_api
+    from api.http_client import close_http_client
+    from utils.codec_pool import shutdown_codec_pool
+    from utils.loop_monitor import LoopLagMonitor
+    logging.getLogger().setLevel(logging.WARNING)
+    input_image = b"\x89PNG\r\n\x1a\n" + os.urandom(min(image_size, gemini_api.MAX_IMAGE_BYTES_API - 16))
+    monitor = LoopLagMonitor(interval=0.005)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            text, image, error = await gemini_api.generate_image_with_gemini("bench", input_image_original=input_image)
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if error or not image:
+                errors += 1
+
+    await one()
+    monitor.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(args.calls)))
+    wall = time.perf_counter() - start
+    await monitor.stop()
+    lag = monitor.snapshot()
+    await close_http_client(); shutdown_codec_pool(); server.shutdown()
+    print(json.dumps({"calls_per_s": args.calls / wall, "lag_p99_ms": lag["p99"] * 1000, "lag_max_ms": lag["max"] * 1000, "errors": errors}))
+# ================================== _worker() end ==================================
+
+
+# ================================== main(): Spawns one worker per pool kind and prints a comparison ==================================
+def main(args):
+    print(f"calls={args.calls} concurrency={args.concurrency} image={args.image_mb}MB in/out")
+    for mode in MODES:
+        env = dict(os.environ, CODEC_POOL_KIND=mode, TELEGRAM_BOT_TOKEN=os.getenv("TELEGRAM_BOT_TOKEN", "0:bench"),
+                   GEMINI_API_KEYS=os.getenv("GEMINI_API_KEYS", "bench-key-1,bench-key-2"), ADMIN_TELEGRAM_ID=os.getenv("ADMIN_TELEGRAM_ID", "1"))
+        cmd = [sys.executable, __file__, "--worker", "--calls", str(args.calls), "--concurrency", str(args.concurrency), "--image-mb", str(args.image_mb)]
+        result = subprocess.run(cmd, env=env, cwd=ROOT_DIR, capture_output=True, text=True)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if result.returncode != 0:
+            print(f"{mode:8s} FAILED:\n{result.stderr[-2000:]}")
+            continue
+        r = json.loads(result.stdout.strip().splitlines()[-1])
+        print(f"{mode:8s} {r['calls_per_s']:7.1f} calls/s   loop lag p99={r['lag_p99_ms']:7.1f}ms   max={r['lag_max_ms']:7.1f}ms   errors={r['errors']}")
+# ================================== main() end ==================================
+
+
+# Reminder: Use new line, not semicolon, for the following block/statement.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--image-mb", type=float, default=3.0)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parsed = parser.parse_args()
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if parsed.worker:
+        asyncio.run(_worker(parsed))
+    else:
+        main(parsed)
+
+# benchmarks/bench_loop_lag.py end
@@ -0,0 +1,89 @@
+# benchmarks/bench_state_memory.py
+# -*- coding: utf-8 -*-
+"""
+Measures memory and serialized size of N image keyboard states: the old per-message dict (with copied catalog dicts,
+as a pickle round trip produced them) vs. ImageState (slots, shared catalog dicts, binary encoding).
+Reports traced memory per state, serialized bytes per state and encode/decode time.
+Usage: python benchmarks/bench_state_memory.py [--states N]
+"""
+
+import argparse
+import os
+import pickle
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "1:bench"); os.environ.setdefault("GEMINI_API_KEYS", "bench"); os.environ.setdefault("ADMIN_TELEGRAM_ID", "1")
+import config
+from utils.image_state import ImageState
+
+# ================================== _make_state_dict(): One realistic state as send_image_generation_response builds it ==================================
+def _make_state_dict(rng: random.Random, i: int) -> dict:
+    type_idx = rng.choice(list(config.TYPE_INDEX_TO_DATA)); style_idx = rng.choice(list(config.STYLE_ABSOLUTE_INDEX_TO_DATA))
+    artist_idx = rng.choice(list(config.ARTIST_ABSOLUTE_INDEX_TO_DATA)) if rng.random() < 0.5 else None
+    type_data = config.TYPE_INDEX_TO_DATA[type_idx]; style_data = config.STYLE_ABSOLUTE_INDEX_TO_DATA[style_idx]
+    artist_data = config.ARTIST_ABSOLUTE_INDEX_TO_DATA.get(artist_idx) if artist_idx else None
+    prompt = f"кот в космосе номер {i} на фоне туманности"
+    settings = {"type_data": type_data, "style_data": style_data, "artist_data": artist_data, "ar": "16:9"}
+    parsed = {"type": type_data, "style": style_data, "artist": None, "ar": "16:9", "randomize_type": False, "randomize_style": False,
+              "randomize_artist": artist_data is not None, "style_marker": style_data, "type_choice_list": None, "style_choice_list": None, "artist_choice_list": None}
+    return {
+        "original_user_prompt": prompt, "effective_prompt": prompt,
+        "selected_type_data": type_data, "selected_style_data": style_data, "selected_artist_data": artist_data, "selected_ar": "16:9",
+        "selected_type_index": type_idx, "selected_style_abs_index": style_idx, "selected_artist_abs_index": artist_idx,
+        "settings_visible": False, "ar_select_visible": False, "type_select_visible": False,
+        "style_select_visible": False, "artist_select_visible": False, "prompt_action_visible": False,
+        "awaiting_prompt_change": False, "type_page": 0, "style_page": 0, "artist_page": 0,
+        "last_api_text_result": "Вот изображение.", "api_call_prompt": f"{prompt}, {style_data['name']}, reply in Russian. --ar 16:9",
+        "api_call_settings": settings, "original_parsed_settings": parsed,
+        "generated_file_id": f"AgACAgIAAxkDAAI{i:012d}ZmJhc2U2NF9maWxlX2lkX2V4YW1wbGVfdmFsdWU", "base_image_file_id_for_regen": None,
+        "source_image_file_id_1_for_regen": None, "source_image_file_id_2_for_regen": None, "is_combination_result": False,
+    }
+# ================================== _make_state_dict() end ==================================
+
+
+# ================================== _traced(): Builds objects under tracemalloc; returns (objects, bytes) ==================================
+def _traced(build):
+    tracemalloc.start()
+    objects = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return objects, current
+# ================================== _traced() end ==================================
+
+
+# ================================== main(): Runs the comparison ==================================
+def main(args):
+    rng = random.Random(42); n = args.states
+    templates = [_make_state_dict(rng, i) for i in range(n)]
+    # Both layouts as they look after a restart (strings and containers freshly allocated by the loader)
+    pickled_all = [pickle.dumps(t, protocol=pickle.HIGHEST_PROTOCOL) for t in templates]
+    encoded_all = [ImageState.from_dict(t).encode() for t in templates]
+    dicts, dict_bytes = _traced(lambda: [pickle.loads(b) for b in pickled_all]) # pickle copies every catalog dict into each state
+    slotted, slot_bytes = _traced(lambda: [ImageState.decode(b) for b in encoded_all])
+    sample = dicts[:10000]
+    start = time.perf_counter(); pickled = [pickle.dumps(d, protocol=pickle.HIGHEST_PROTOCOL) for d in sample]; pickle_s = (time.perf_counter() - start) / len(sample)
+    start = time.perf_counter(); encoded = [s.encode() for s in slotted[:10000]]; encode_s = (time.perf_counter() - start) / len(encoded)
+    start = time.perf_counter(); decoded = [ImageState.decode(b) for b in encoded]; decode_s = (time.perf_counter() - start) / len(decoded)
+    assert decoded[0].to_dict() == ImageState.from_dict(templates[0]).to_dict()
+    assert decoded[0]["selected_style_data"] is config.STYLE_ABSOLUTE_INDEX_TO_DATA[decoded[0]["selected_style_abs_index"]]
+    scale = 100000 / n
+    print(f"states={n}")
+    print(f"dict + copied catalog dicts: {dict_bytes / n:8.0f} B/state in memory ({dict_bytes * scale / (1024 * 1024):7.1f}MB per 100k), "
+          f"pickle {sum(map(len, pickled)) / len(pickled):6.0f} B/state, dump {pickle_s * 1e6:.1f}us")
+    print(f"ImageState (slots)         : {slot_bytes / n:8.0f} B/state in memory ({slot_bytes * scale / (1024 * 1024):7.1f}MB per 100k), "
+          f"encoded {sum(map(len, encoded)) / len(encoded):6.0f} B/state, encode {encode_s * 1e6:.1f}us, decode {decode_s * 1e6:.1f}us")
+# ================================== main() end ==================================
+
+
+# Reminder: Use new line, not semicolon, for the following block/statement.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--states", type=int, default=100000)
+    main(parser.parse_args())
+
+# benchmarks/bench_state_memory.py end
@@ -0,0 +1,127 @@
+# benchmarks/fake_bot_api_server.py
+# -*- coding: utf-8 -*-
+"""
+Minimal local stand-in for a self-hosted telegram-bot-api server, for exercising TELEGRAM_BOT_API_URL / TELEGRAM_LOCAL_MODE.
+Answers getMe / getFile / deleteWebhook / getUpdates. Files are the contents of a data directory, keyed by name (file_id = file name).
+In local mode getFile returns absolute paths (like `telegram-bot-api --local`); otherwise files are served under /file/bot<token>/.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+FAKE_BOT_USER = {"id": 1, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+
+# ================================== _make_handler(): Builds a request handler class bound to a data directory ==================================
+def _make_handler(data_dir: Path, local_mode: bool):
+    data_dir = data_dir.resolve()
+
+    # ================================== FakeBotApiHandler: Serves Bot API methods and file downloads ==================================
+    class FakeBotApiHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, body: dict):
+            self._send_raw(status, json.dumps(body).encode("utf-8"), "application/json")
+
+        def _send_raw(self, status: int, data: bytes, content_type: str):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _params(self) -> dict:
+            params = {k: v[0] for k, v in parse_qs(urlsplit(self.path).query).items()}
+            length = int(self.headers.get("Content-Length", "0") or 0)
+            body = self.rfile.read(length) if length else b""
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if body and "json" in self.headers.get("Content-Type", ""):
+                params.update(json.loads(body))
+            elif body:
+                params.update({k: v[0] for k, v in parse_qs(body.decode("utf-8")).items()})
+            return params
+
+        def _get_file(self, file_id: str):
+            path = (data_dir / file_id).resolve()
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if path.parent != data_dir or not path.is_file():
+                self._send_json(400, {"ok": False, "error_code": 400, "description": "Bad Request: file not found"})
+                return
+            file_path = str(path) if local_mode else path.name
+            self._send_json(200, {"ok": True, "result": {"file_id": file_id, "file_unique_id": f"u_{file_id}", "file_size": path.stat().st_size, "file_path": file_path}})
+
+        def _handle(self):
+            parts = urlsplit(self.path).path.strip("/").split("/")
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if len(parts) >= 3 and parts[0] == "file" and parts[1].startswith("bot"):
+                path = (data_dir / unquote(parts[-1])).resolve()
+                # Reminder: Use new line, not semicolon, for the following block/statement.
+                if path.parent == data_dir and path.is_file():
+                    self._send_raw(200, path.read_bytes(), "application/octet-stream")
+                else:
+                    self._send_json(404, {"ok": False, "error_code": 404, "description": "Not Found"})
+                return
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if len(parts) != 2 or not parts[0].startswith("bot"):
+                self._send_json(404, {"ok": False, "error_code": 404, "description": "Not Found"})
+                return
+            method = parts[1]; params = self._params()
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if method == "getMe":
+                self._send_json(200, {"ok": True, "result": FAKE_BOT_USER})
+            elif method == "getFile":
+                self._get_file(str(params.get("file_id", "")))
+            elif method == "deleteWebhook":
+                self._send_json(200, {"ok": True, "result": True})
+            elif method == "getUpdates":
+                self._send_json(200, {"ok": True, "result": []})
+            else:
+                self._send_json(404, {"ok": False, "error_code": 404, "description": "Not Found: method not found"})
+
+        def do_GET(self):
+            self._handle()
+
+        def do_POST(self):
+            self._handle()
+    # ================================== FakeBotApiHandler end ==================================
+    return FakeBotApiHandler
+# ================================== _make_handler() end ==================================
+
+
+# ================================== start_fake_bot_api_server(): Starts the fake server in a daemon thread ==================================
+def start_fake_bot_api_server(data_dir: Path, local_mode: bool = True, host: str = "127.0.0.1", port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    server = ThreadingHTTPServer((host, port), _make_handler(Path(data_dir), local_mode))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://{server.server_address[0]}:{server.server_address[1]}"
+    return server, base_url
+# ================================== start_fake_bot_api_server() end ==================================
+
+
+# Reminder: Use new line, not semicolon, for the following block/statement.
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("data_dir", type=Path)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--remote", action="store_true", help="Serve files over HTTP instead of returning local paths")
+    args = parser.parse_args()
+    srv, url = start_fake_bot_api_server(args.data_dir, local_mode=not args.remote, port=args.port)
+    print(f"Fake Bot API server on {url}, data dir {args.data_dir.resolve()} (Ctrl+C to stop)")
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    try:
+        while True:
+            time.sleep(3600)
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    except KeyboardInterrupt:
+        srv.shutdown()
+
+# benchmarks/fake_bot_api_server.py end
@@ -0,0 +1,118 @@
+# benchmarks/fake_gemini_server.py
+# -*- coding: utf-8 -*-
+"""
+Minimal local stand-in for the Gemini REST API used by the benchmarks.
+Answers :generateContent with a fixed JSON candidate and :streamGenerateContent with SSE frames.
+Keeps HTTP/1.1 keep-alive so connection reuse is measurable. Latency is configurable.
+Can fail the first N requests with a given status to exercise retries.
+Can attach an inline base64 image of a given size to generateContent responses.
+"""
+
+import base64
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+FAKE_TEXT = "Fake Gemini response."
+STREAM_CHUNKS = 5
+
+# ================================== _make_handler(): Builds a request handler class bound to server settings ==================================
+def _make_handler(latency: float, fail_first: int, fail_status: int, image_bytes: int):
+    image_part = None
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if image_bytes > 0:
+        fake_png = b"\x89PNG\r\n\x1a\n" + os.urandom(image_bytes)
+        image_part = {"inlineData": {"mimeType": "image/png", "data": base64.b64encode(fake_png).decode("ascii")}}
+    response_parts = [{"text": FAKE_TEXT}] + ([image_part] if image_part else [])
+    candidate = {"content": {"parts": response_parts, "role": "model"}, "finishReason": "STOP"}
+    # Encoded once so the server thread does not compete with the client for the GIL
+    generate_body = json.dumps({"candidates": [candidate]}).encode("utf-8")
+    failures_left = [fail_first]
+    failures_lock = threading.Lock()
+
+    # ================================== FakeGeminiHandler: Serves generateContent / streamGenerateContent ==================================
+    class FakeGeminiHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, body: dict):
+            self._send_raw(status, json.dumps(body).encode("utf-8"))
+
+        def _send_raw(self, status: int, data: bytes):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", "0") or 0)
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if length:
+                self.rfile.read(length)
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if latency > 0:
+                time.sleep(latency)
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            with failures_lock:
+                should_fail = failures_left[0] > 0
+                # Reminder: Use new line, not semicolon, for the following block/statement.
+                if should_fail:
+                    failures_left[0] -= 1
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if should_fail:
+                self._send_json(fail_status, {"error": {"code": fail_status, "message": "simulated failure"}})
+                return
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if ":streamGenerateContent" in self.path:
+                frames = b"".join(
+                    b"data: " + json.dumps({"candidates": [{"content": {"parts": [{"text": f"chunk{i} "}], "role": "model"}}]}).encode("utf-8") + b"\r\n\r\n"
+                    for i in range(STREAM_CHUNKS)
+                )
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Content-Length", str(len(frames)))
+                self.end_headers()
+                self.wfile.write(frames)
+                return
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if ":generateContent" in self.path:
+                self._send_raw(200, generate_body)
+                return
+            self._send_json(404, {"error": {"code": 404, "message": "not found"}})
+    # ================================== FakeGeminiHandler end ==================================
+    return FakeGeminiHandler
+# ================================== _make_handler() end ==================================
+
+
+# ================================== start_fake_server(): Starts the fake server in a daemon thread ==================================
+def start_fake_server(
+    latency: float = 0.0, host: str = "127.0.0.1", port: int = 0, fail_first: int = 0, fail_status: int = 503, image_bytes: int = 0
+) -> Tuple[ThreadingHTTPServer, str]:
+    server = ThreadingHTTPServer((host, port), _make_handler(latency, fail_first, fail_status, image_bytes))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://{server.server_address[0]}:{server.server_address[1]}"
+    return server, base_url
+# ================================== start_fake_server() end ==================================
+
+
+# Reminder: Use new line, not semicolon, for the following block/statement.
+if __name__ == "__main__":
+    srv, url = start_fake_server(port=8765)
+    print(f"Fake Gemini server on {url} (Ctrl+C to stop)")
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    try:
+        while True:
+            time.sleep(3600)
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    except KeyboardInterrupt:
+        srv.shutdown()
+
+# benchmarks/fake_gemini_server.py end
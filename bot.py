@@ -9,7 +9,6 @@ Updates /styles list to show group aliases.
 import logging
 import sys
 import asyncio
-import pickle
 from pathlib import Path
 import signal
 from handlers.text_gen import handle_private_text
@@ -19,7 +18,6 @@ from telegram.ext import (
     CallbackQueryHandler, filters, Defaults,
 )
 from telegram.constants import ParseMode, ChatType
-from cachetools import TTLCache
 # Reminder: Use new line, not semicolon, for the following block/statement.
 try:
     import config
@@ -36,6 +34,13 @@ try:
     from handlers import media_groups as media_group_handlers
     from handlers import callbacks as callback_handlers
     from handlers import info_commands as info_command_handlers
+    from api.http_client import close_http_client
+    from utils.codec_pool import shutdown_codec_pool
+    from utils.cache import cache_index
+    from utils.cache_janitor import cache_janitor_job
+    from utils.result_cache import result_cache_sweep_job
+    from utils.loop_monitor import loop_lag_monitor
+    from utils.state_store import state_store, PersistentStateCache, state_checkpoint_job
 # Reminder: Use new line, not semicolon, for the following block/statement.
 except ImportError as e:
     print(f"CRITICAL ERROR: Failed to import handlers: {e}.", file=sys.stderr)
@@ -44,65 +49,25 @@ except ImportError as e:
 logger = logging.getLogger(__name__)
 
 PERSISTENCE_DIR = config.BASE_DIR / "persistence"
-BOT_DATA_STATE_FILE = config.BOT_DATA_STATE_FILE
-STATE_CACHE_TTL_SECONDS = 12 * 60 * 60
-STATE_CACHE_MAXSIZE = 1000
+STATE_CACHE_TTL_SECONDS = 12 * 60 * 60 # Hot tier only; evicted states stay in SQLite for config.STATE_COLD_TTL_SECONDS
+STATE_WARM_START_STATES = 5000 # Newest states loaded at startup, the rest are paged in on demand
 _application_instance: Application | None = None
 
-# ================================== load_bot_data_from_file(): Loads image state from file ==================================
-def load_bot_data_from_file() -> dict:
-    # Reminder: Use new line, not semicolon, for the following block/statement.
-    if BOT_DATA_STATE_FILE.is_file():
-        logger.info(f"Загрузка state из {BOT_DATA_STATE_FILE}")
-        # Reminder: Use new line, not semicolon, for the following block/statement.
-        try:
-            with open(BOT_DATA_STATE_FILE, "rb") as f:
-                loaded_data = pickle.load(f)
-            # Reminder: Use new line, not semicolon, for the following block/statement.
-            if isinstance(loaded_data, dict):
-                 image_states = {k: v for k, v in loaded_data.items() if isinstance(k, str) and k.startswith(config.IMAGE_STATE_CACHE_KEY_PREFIX)}
-                 logger.info(f"Загружено {len(image_states)} состояний.")
-                 return image_states
-            else:
-                 logger.warning("Загруженный файл не словарь.")
-                 return {}
-        # Reminder: Use new line, not semicolon, for the following block/statement.
-        except Exception as e:
-            logger.error(f"Не удалось загрузить state: {e}.", exc_info=True)
-            return {}
-    else:
-        logger.info("Файл state не найден.")
-        return {}
-# ================================== load_bot_data_from_file() end ==================================
-
-
-# ================================== save_bot_data_to_file(): Saves image state to file ==================================
-def save_bot_data_to_file(bot_data_cache: TTLCache):
-    image_states_to_save = {}
-    # Reminder: Use new line, not semicolon, for the following block/statement.
-    try:
-        for key, value in list(bot_data_cache.items()):
-            # Reminder: Use new line, not semicolon, for the following block/statement.
-            if isinstance(key, str) and key.startswith(config.IMAGE_STATE_CACHE_KEY_PREFIX):
-                image_states_to_save[key] = value
-    # Reminder: Use new line, not semicolon, for the following block/statement.
-    except Exception as e:
-        logger.error(f"Ошибка итерации TTLCache: {e}")
-    logger.info(f"Сохранение {len(image_states_to_save)} состояний в {BOT_DATA_STATE_FILE}")
-    # Reminder: Use new line, not semicolon, for the following block/statement.
-    if not image_states_to_save:
-        logger.info("Нет состояний для сохранения.")
-        return
-    # Reminder: Use new line, not semicolon, for the following block/statement.
-    try:
-        PERSISTENCE_DIR.mkdir(parents=True, exist_ok=True)
-        with open(BOT_DATA_STATE_FILE, "wb") as f:
-            pickle.dump(image_states_to_save, f)
-        logger.info("Состояния успешно сохранены.")
-    # Reminder: Use new line, not semicolon, for the following block/statement.
-    except Exception as e:
-        logger.error(f"Не удалось сохранить state: {e}", exc_info=True)
-# ================================== save_bot_data_to_file() end ==================================
+# ================================== on_post_init(): Starts background monitors once the loop is running ==================================
+async def on_post_init(application: Application):
+    loop_lag_monitor.start()
+    logger.info("post_init: монитор задержки event loop запущен.")
+# ================================== on_post_init() end ==================================
+
+
+# ================================== on_post_shutdown(): Releases shared resources after the application stops ==================================
+async def on_post_shutdown(application: Application):
+    logger.info("post_shutdown: закрытие HTTP клиента Gemini...")
+    await close_http_client()
+    await loop_lag_monitor.stop()
+    shutdown_codec_pool()
+    cache_index.close()
+# ================================== on_post_shutdown() end ==================================
 
 
 # ================================== main(): Initializes and runs the bot ==================================
@@ -119,20 +84,27 @@ def main():
     except Exception as e:
         logger.critical(f"Не удалось создать каталог: {e}", exc_info=True)
         sys.exit(1)
-    bot_data_cache = TTLCache(maxsize=STATE_CACHE_MAXSIZE, ttl=STATE_CACHE_TTL_SECONDS)
-    loaded_image_states = load_bot_data_from_file()
+    bot_data_cache = PersistentStateCache(max_bytes=config.STATE_HOT_CACHE_MAX_BYTES, ttl=STATE_CACHE_TTL_SECONDS, store=state_store, store_ttl=config.STATE_COLD_TTL_SECONDS)
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    try:
+        bot_data_cache.load(STATE_WARM_START_STATES)
     # Reminder: Use new line, not semicolon, for the following block/statement.
-    if loaded_image_states:
-        logger.info(f"Слияние {len(loaded_image_states)} состояний.")
-        bot_data_cache.update(loaded_image_states)
+    except Exception as e:
+        logger.error(f"Не удалось загрузить state: {e}", exc_info=True)
     # Reminder: Use new line, not semicolon, for the following block/statement.
     try:
         bot_defaults = Defaults(parse_mode=ParseMode.HTML)
-        application = (ApplicationBuilder().token(config.TELEGRAM_BOT_TOKEN).defaults(bot_defaults)
-                       .connect_timeout(30).read_timeout(30).write_timeout(60).pool_timeout(60).build())
+        builder = (ApplicationBuilder().token(config.TELEGRAM_BOT_TOKEN).defaults(bot_defaults)
+                   .connect_timeout(30).read_timeout(30).write_timeout(60).pool_timeout(60)
+                   .post_init(on_post_init).post_shutdown(on_post_shutdown))
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if config.TELEGRAM_BOT_API_URL:
+            builder = builder.base_url(f"{config.TELEGRAM_BOT_API_URL}/bot").base_file_url(f"{config.TELEGRAM_BOT_API_URL}/file/bot").local_mode(config.TELEGRAM_LOCAL_MODE)
+            logger.info(f"Используется Bot API сервер {config.TELEGRAM_BOT_API_URL} (local_mode={config.TELEGRAM_LOCAL_MODE}).")
+        application = builder.build()
         application.bot_data = bot_data_cache
         _application_instance = application
-        logger.info("Данные в памяти."); logger.info("bot_data: TTLCache + ручное сохр/загр.")
+        logger.info(f"bot_data: горячий кэш {config.STATE_HOT_CACHE_MAX_BYTES // (1024 * 1024)}MB + холодное хранилище SQLite (WAL).")
         logger.info("Регистрация обработчиков...")
         application.add_error_handler(error_handlers.error_handler)
 
@@ -149,6 +121,7 @@ def main():
         application.add_handler(CommandHandler("artists", info_command_handlers.list_artists, block=False), group=0)
         application.add_handler(CommandHandler("man", info_command_handlers.manual_command, block=False), group=0) # Add /man handler
         application.add_handler(CommandHandler("find", info_command_handlers.find_items, block=False), group=0) # Add /find handler
+        application.add_handler(CommandHandler("api_status", command_handlers.api_status_command, block=False), group=0)
 
         # Group 1: Core generation commands
         application.add_handler(CommandHandler("ask", text_gen_handlers.handle_ask_command, block=False), group=1)
@@ -178,21 +151,42 @@ def main():
         )
 
         logger.info("Регистрация обработчиков завершена.")
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if application.job_queue and config.IMAGE_CACHE_JANITOR_INTERVAL_SECONDS > 0:
+            application.job_queue.run_repeating(cache_janitor_job, interval=config.IMAGE_CACHE_JANITOR_INTERVAL_SECONDS, first=60, name="image_cache_janitor")
+            logger.info(f"Janitor кэша изображений: каждые {config.IMAGE_CACHE_JANITOR_INTERVAL_SECONDS:.0f}с.")
+        else: logger.warning("Janitor кэша изображений не запущен (нет job_queue или интервал 0).")
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if application.job_queue and config.RESULT_CACHE_SWEEP_INTERVAL_SECONDS > 0:
+            application.job_queue.run_repeating(result_cache_sweep_job, interval=config.RESULT_CACHE_SWEEP_INTERVAL_SECONDS, first=120, name="result_cache_sweep")
+            logger.info(f"Очистка кэша результатов: каждые {config.RESULT_CACHE_SWEEP_INTERVAL_SECONDS:.0f}с.")
+        else: logger.warning("Очистка кэша результатов не запущена (нет job_queue или интервал 0).")
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if application.job_queue and config.STATE_CHECKPOINT_INTERVAL_SECONDS > 0:
+            bot_data_cache.write_behind = True
+            application.job_queue.run_repeating(state_checkpoint_job, interval=config.STATE_CHECKPOINT_INTERVAL_SECONDS, first=config.STATE_CHECKPOINT_INTERVAL_SECONDS, name="state_checkpoint")
+            logger.info(f"Checkpoint состояний: каждые {config.STATE_CHECKPOINT_INTERVAL_SECONDS:.0f}с в фоновом потоке.")
+        else: logger.info("Checkpoint состояний отключен: каждое изменение пишется в SQLite сразу.")
         logger.info("Запуск бота (run_polling)...")
         application.run_polling(allowed_updates=Update.ALL_TYPES, drop_pending_updates=True)
     # Reminder: Use new line, not semicolon, for the following block/statement.
     except Exception as e: logger.critical(f"Критическая ошибка инициализации: {e}", exc_info=True); sys.exit(1)
-    finally: logger.info("Выход из main(). Попытка сохранения..."); save_state_on_shutdown()
+    finally: logger.info("Выход из main(). Закрытие хранилища состояний..."); save_state_on_shutdown()
 # ================================== main() end ==================================
 
 
-# ================================== save_state_on_shutdown(): Saves state before exit ==================================
+# ================================== save_state_on_shutdown(): Flushes the state store before exit ==================================
 def save_state_on_shutdown():
+    """Writes states changed since the last checkpoint, then checkpoints the WAL and closes the database."""
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    try:
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if _application_instance is not None and isinstance(_application_instance.bot_data, PersistentStateCache):
+            logger.info(f"Записано {_application_instance.bot_data.flush()} несохраненных состояний.")
+        state_store.close()
+        logger.info("Хранилище состояний закрыто.")
     # Reminder: Use new line, not semicolon, for the following block/statement.
-    if _application_instance and isinstance(_application_instance.bot_data, TTLCache):
-        logger.info("Попытка сохранения state...")
-        save_bot_data_to_file(_application_instance.bot_data)
-    else: logger.warning("Не удалось сохранить state.")
+    except Exception as e: logger.error(f"Не удалось закрыть хранилище состояний: {e}", exc_info=True)
 # ================================== save_state_on_shutdown() end ==================================
 
 
@@ -8,6 +8,7 @@ Loads default prompts/suffix from YAML. Renamed prefix keys/constants to suffix.
 Loads default LLM text display setting from .env.
 Loads explicit artist short aliases and style group aliases from YAML.
 Added MAX_IMAGE_BYTES_API constant.
+API keys are scheduled by api/key_pool.py (cooldown settings loaded here).
 """
 import os
 import sys
@@ -16,7 +17,6 @@ import re
 from pathlib import Path
 from typing import Dict, List, Set, Optional, Any
 import yaml
-import itertools
 from dotenv import load_dotenv
 
 logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
@@ -57,12 +57,29 @@ DEFAULT_DISPLAY_LLM_TEXT_STR = os.getenv("DEFAULT_DISPLAY_LLM_TEXT", "False")
 DEFAULT_DISPLAY_LLM_TEXT_BOOL = DEFAULT_DISPLAY_LLM_TEXT_STR.lower() == 'true'
 logger.info(f"Default LLM Text Display: {DEFAULT_DISPLAY_LLM_TEXT_BOOL} (Loaded from env: '{DEFAULT_DISPLAY_LLM_TEXT_STR}')")
 
+# Telegram Bot API server: empty = cloud api.telegram.org; set to a self-hosted telegram-bot-api (e.g. http://localhost:8081)
+TELEGRAM_BOT_API_URL = os.getenv("TELEGRAM_BOT_API_URL", "").strip().rstrip("/")
+TELEGRAM_LOCAL_MODE = os.getenv("TELEGRAM_LOCAL_MODE", "False").lower() == 'true'
+# Reminder: Use new line, not semicolon, for the following block/statement.
+if TELEGRAM_LOCAL_MODE and not TELEGRAM_BOT_API_URL: logger.critical("CRITICAL: TELEGRAM_LOCAL_MODE requires TELEGRAM_BOT_API_URL!"); sys.exit(1)
+
+# Shared Gemini HTTP client (connection pool limits)
+GEMINI_HTTP2_ENABLED = os.getenv("GEMINI_HTTP2", "True").lower() == 'true'
+# Reminder: Use new line, not semicolon, for the following block/statement.
+try:
+    GEMINI_HTTP_MAX_CONNECTIONS = int(os.getenv("GEMINI_HTTP_MAX_CONNECTIONS", "100"))
+    GEMINI_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("GEMINI_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    GEMINI_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("GEMINI_HTTP_KEEPALIVE_EXPIRY", "60"))
+# Reminder: Use new line, not semicolon, for the following block/statement.
+except ValueError: logger.critical("CRITICAL: GEMINI_HTTP_* pool settings must be numbers!"); sys.exit(1)
+
 # Constants
 MAX_HISTORY_MESSAGES = 10
 IMAGE_CACHE_DIR = BASE_DIR / "image_cache"
 CHAT_DATA_KEY_CONVERSATION_HISTORY = "conversation_history"
 CHAT_DATA_KEY_TEXT_SYSTEM_PROMPT = "text_system_prompt"
-BOT_DATA_STATE_FILE = BASE_DIR / "persistence" / "keyboard_state.pkl"
+BOT_DATA_STATE_FILE = BASE_DIR / "persistence" / "keyboard_state.pkl" # Legacy shutdown-only dump, imported once into STATE_DB_FILE
+STATE_DB_FILE = BASE_DIR / "persistence" / "state.sqlite3"
 CHAT_DATA_KEY_DISPLAY_LLM_TEXT = "display_llm_text"
 MEDIA_GROUP_CACHE_KEY_PREFIX = "media_group_"
 # This is now an "inactivity timeout" for a media group.
@@ -75,6 +92,43 @@ USER_DATA_KEY_PROMPT_EDIT_TARGET = "prompt_edit_target"
 CHAT_DATA_KEY_LAST_GENERATION = "last_generation"
 MAX_IMAGE_BYTES_API = 4 * 1024 * 1024 # Added constant for API image size limit (4MB)
 SUPPORTED_ASPECT_RATIOS = {"1:1", "16:9", "9:16", "4:3", "3:4"} # Added from image_gen for central access
+RESULT_CACHE_DIR = BASE_DIR / "result_cache"
+# Reminder: Use new line, not semicolon, for the following block/statement.
+try:
+    DESCRIBE_CACHE_TTL_SECONDS = float(os.getenv("DESCRIBE_CACHE_TTL_SECONDS", str(7 * 24 * 60 * 60)))
+    DESCRIBE_CACHE_MEMORY_SIZE = int(os.getenv("DESCRIBE_CACHE_MEMORY_SIZE", "512"))
+    RESULT_CACHE_SWEEP_INTERVAL_SECONDS = float(os.getenv("RESULT_CACHE_SWEEP_INTERVAL_SECONDS", "3600"))
+# Reminder: Use new line, not semicolon, for the following block/statement.
+except ValueError: logger.critical("CRITICAL: DESCRIBE_CACHE_* / RESULT_CACHE_SWEEP_INTERVAL_SECONDS must be numbers!"); sys.exit(1)
+# Reminder: Use new line, not semicolon, for the following block/statement.
+try:
+    ENHANCE_CACHE_MAXSIZE = int(os.getenv("ENHANCE_CACHE_MAXSIZE", "1000"))
+    ENHANCE_CACHE_TTL_SECONDS = float(os.getenv("ENHANCE_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+    ENHANCE_CACHE_ALTERNATIVES = max(1, int(os.getenv("ENHANCE_CACHE_ALTERNATIVES", "3")))
+# Reminder: Use new line, not semicolon, for the following block/statement.
+except ValueError: logger.critical("CRITICAL: ENHANCE_CACHE_* must be numbers!"); sys.exit(1)
+# Reminder: Use new line, not semicolon, for the following block/statement.
+try:
+    IMAGE_MEMORY_CACHE_MAX_BYTES = int(os.getenv("IMAGE_MEMORY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    IMAGE_MEMORY_CACHE_MAX_ITEM_BYTES = int(os.getenv("IMAGE_MEMORY_CACHE_MAX_ITEM_BYTES", str(8 * 1024 * 1024)))
+# Reminder: Use new line, not semicolon, for the following block/statement.
+except ValueError: logger.critical("CRITICAL: IMAGE_MEMORY_CACHE_* must be integers!"); sys.exit(1)
+# Reminder: Use new line, not semicolon, for the following block/statement.
+try:
+    IMAGE_CACHE_MAX_BYTES = int(float(os.getenv("IMAGE_CACHE_MAX_MB", "2048")) * 1024 * 1024)
+    IMAGE_CACHE_CHAT_MAX_BYTES = int(float(os.getenv("IMAGE_CACHE_CHAT_MAX_MB", "0")) * 1024 * 1024)
+    IMAGE_CACHE_MAX_AGE_SECONDS = float(os.getenv("IMAGE_CACHE_MAX_AGE_DAYS", "30")) * 24 * 60 * 60
+    IMAGE_CACHE_JANITOR_INTERVAL_SECONDS = float(os.getenv("IMAGE_CACHE_JANITOR_INTERVAL_SECONDS", "1800"))
+# Reminder: Use new line, not semicolon, for the following block/statement.
+except ValueError: logger.critical("CRITICAL: IMAGE_CACHE_MAX_MB / IMAGE_CACHE_CHAT_MAX_MB / IMAGE_CACHE_MAX_AGE_DAYS / IMAGE_CACHE_JANITOR_INTERVAL_SECONDS must be numbers!"); sys.exit(1)
+
+# Reminder: Use new line, not semicolon, for the following block/statement.
+try:
+    STATE_HOT_CACHE_MAX_BYTES = int(float(os.getenv("STATE_HOT_CACHE_MAX_MB", "64")) * 1024 * 1024)
+    STATE_COLD_TTL_SECONDS = float(os.getenv("STATE_COLD_TTL_DAYS", "30")) * 24 * 60 * 60
+    STATE_CHECKPOINT_INTERVAL_SECONDS = float(os.getenv("STATE_CHECKPOINT_INTERVAL_SECONDS", "5"))
+# Reminder: Use new line, not semicolon, for the following block/statement.
+except ValueError: logger.critical("CRITICAL: STATE_HOT_CACHE_MAX_MB / STATE_COLD_TTL_DAYS / STATE_CHECKPOINT_INTERVAL_SECONDS must be numbers!"); sys.exit(1)
 
 # Validate essential environment variables
 # Reminder: Use new line, not semicolon, for the following block/statement.
@@ -89,7 +143,36 @@ GEMINI_API_KEYS = [key.strip() for key in GEMINI_API_KEYS_STR.split(",") if key.
 # Reminder: Use new line, not semicolon, for the following block/statement.
 if not GEMINI_API_KEYS: logger.critical("CRITICAL: No valid Gemini API keys found!"); sys.exit(1)
 logger.info(f"Loaded {len(GEMINI_API_KEYS)} Gemini API Key(s).")
-api_key_cycler = itertools.cycle(GEMINI_API_KEYS)
+# Reminder: Use new line, not semicolon, for the following block/statement.
+try:
+    GEMINI_KEY_COOLDOWN_BASE = float(os.getenv("GEMINI_KEY_COOLDOWN_BASE", "30"))
+    GEMINI_KEY_COOLDOWN_MAX = float(os.getenv("GEMINI_KEY_COOLDOWN_MAX", "600"))
+    GEMINI_RETRY_MAX_ATTEMPTS = max(1, int(os.getenv("GEMINI_RETRY_MAX_ATTEMPTS", "3")))
+    GEMINI_RETRY_BACKOFF_BASE = float(os.getenv("GEMINI_RETRY_BACKOFF_BASE", "1.0"))
+    GEMINI_RETRY_BACKOFF_MAX = float(os.getenv("GEMINI_RETRY_BACKOFF_MAX", "20"))
+# Reminder: Use new line, not semicolon, for the following block/statement.
+except ValueError: logger.critical("CRITICAL: GEMINI_KEY_COOLDOWN_* / GEMINI_RETRY_* must be numbers!"); sys.exit(1)
+
+# Hedged image requests (opt-in)
+GEMINI_HEDGE_ENABLED = os.getenv("GEMINI_HEDGE_IMAGES", "False").lower() == 'true'
+# Reminder: Use new line, not semicolon, for the following block/statement.
+try:
+    GEMINI_HEDGE_BUDGET_PERCENT = float(os.getenv("GEMINI_HEDGE_BUDGET_PERCENT", "5"))
+    GEMINI_HEDGE_DEFAULT_DELAY = float(os.getenv("GEMINI_HEDGE_DEFAULT_DELAY", "30"))
+# Reminder: Use new line, not semicolon, for the following block/statement.
+except ValueError: logger.critical("CRITICAL: GEMINI_HEDGE_* must be numbers!"); sys.exit(1)
+logger.info(f"Image hedging: {GEMINI_HEDGE_ENABLED} (budget {GEMINI_HEDGE_BUDGET_PERCENT}%)")
+
+# Codec pool for JSON/base64 payload work (thread | process | inline)
+CODEC_POOL_KIND = os.getenv("CODEC_POOL_KIND", "thread").strip().lower()
+# Reminder: Use new line, not semicolon, for the following block/statement.
+if CODEC_POOL_KIND not in ("thread", "process", "inline"): logger.critical(f"CRITICAL: CODEC_POOL_KIND must be thread, process or inline (got '{CODEC_POOL_KIND}')!"); sys.exit(1)
+# Reminder: Use new line, not semicolon, for the following block/statement.
+try:
+    CODEC_POOL_WORKERS = max(1, int(os.getenv("CODEC_POOL_WORKERS", "2")))
+    CODEC_OFFLOAD_MIN_BYTES = int(os.getenv("CODEC_OFFLOAD_MIN_BYTES", str(64 * 1024)))
+# Reminder: Use new line, not semicolon, for the following block/statement.
+except ValueError: logger.critical("CRITICAL: CODEC_POOL_WORKERS / CODEC_OFFLOAD_MIN_BYTES must be integers!"); sys.exit(1)
 
 # Process authorization IDs
 # Reminder: Use new line, not semicolon, for the following block/statement.
@@ -250,7 +333,9 @@ else: logging.getLogger().setLevel(logging.INFO); logging.getLogger("telegram").
 # Final log messages
 logger.info(f"Gemini Image Model: {GEMINI_IMAGE_MODEL}")
 logger.info(f"Gemini Text Model: {GEMINI_TEXT_MODEL}")
-logger.info(f"Image cache: {IMAGE_CACHE_DIR.resolve()}")
+logger.info(f"Gemini HTTP pool: max={GEMINI_HTTP_MAX_CONNECTIONS}, keepalive={GEMINI_HTTP_MAX_KEEPALIVE_CONNECTIONS}, http2={GEMINI_HTTP2_ENABLED}")
+logger.info(f"Telegram Bot API: {TELEGRAM_BOT_API_URL or 'cloud'} (local mode: {TELEGRAM_LOCAL_MODE})")
+logger.info(f"Image cache: {IMAGE_CACHE_DIR.resolve()} (memory tier {IMAGE_MEMORY_CACHE_MAX_BYTES // (1024 * 1024)}MB)")
 logger.info(f"Image Prompt Template: '{IMAGE_GENERATION_PROMPT_TEMPLATE}'")
 # Reminder: Use new line, not semicolon, for the following block/statement.
 if MAIN_TYPES_DATA: logger.info(f"Loaded {len(MAIN_TYPES_DATA)} image types.")
@@ -4,6 +4,7 @@
 Handlers for basic informational and configuration commands.
 Includes /edit command to modify last generated image using targeted editing.
 Handles /prompt set/reset/clear for image suffix (renamed from prefix).
+Adds admin-only /api_status showing the Gemini API key pool state.
 """
 
 import logging
@@ -20,9 +21,16 @@ from config import (
     DEFAULT_IMAGE_PROMPT_SUFFIX # Renamed constant
 )
 from handlers.image_gen import parse_img_args_prompt_first, _initiate_image_generation, _initiate_image_editing
-from utils.cache import get_cached_image_bytes
+from utils.cache import get_cached_image_bytes, image_memory_cache, download_flight
+from utils.chat_settings import chat_settings
 from utils.decorators import restrict_private_unauthorized
 from utils.telegram_helpers import delete_message_safely
+from api.key_pool import key_pool
+from api.hedging import image_hedge_policy
+from api.gemini_api import image_flight, text_flight, describe_flight
+from utils.loop_monitor import loop_lag_monitor
+from utils.cache_janitor import cache_janitor
+from utils.state_store import state_store, PersistentStateCache
 import config # Import config to access constants easily
 
 logger = logging.getLogger(__name__)
@@ -169,14 +177,13 @@ async def set_image_prompt_suffix_command(update: Update, context: ContextTypes.
         return
     chat_id = update.effective_chat.id
     user_id = update.effective_user.id
-    current_chat_data = context.chat_data
     prompt_key = config.CHAT_DATA_KEY_IMAGE_SUFFIX # Use new key
     default_suffix = config.DEFAULT_IMAGE_PROMPT_SUFFIX # Use new constant
     # Reminder: Use new line, not semicolon, for the following block/statement.
     if not context.args:
-        current_suffix = current_chat_data.get(prompt_key, default_suffix)
+        current_suffix = chat_settings.get(chat_id, prompt_key, default_suffix)
         # Check explicitly for empty string to differentiate from default if default is also empty
-        is_explicitly_cleared = prompt_key in current_chat_data and current_chat_data[prompt_key] == ""
+        is_explicitly_cleared = chat_settings.contains(chat_id, prompt_key) and current_suffix == ""
         is_default = not is_explicitly_cleared and current_suffix == default_suffix
         usage_set = f"<code>/prompt {escape('<текст>')}</code>"
         usage_reset = f"<code>/prompt reset</code>"
@@ -198,14 +205,12 @@ async def set_image_prompt_suffix_command(update: Update, context: ContextTypes.
     sub_command = " ".join(context.args).strip()
     # Reminder: Use new line, not semicolon, for the following block/statement.
     if sub_command.lower() == "reset":
-        # Reminder: Use new line, not semicolon, for the following block/statement.
-        if prompt_key in current_chat_data:
-            del current_chat_data[prompt_key]
+        chat_settings.pop(chat_id, prompt_key)
         await update.message.reply_html(f"✅ <b>Суффикс</b> изображений сброшен к стандартному:\n<code>{escape(default_suffix) if default_suffix else '(Пусто)'}</code>") # Updated text
         logger.info(f"Суффикс img {chat_id} сброшен к умолч. {user_id}")
     # --- Handle "clear" explicitly ---
     elif sub_command.lower() == "clear":
-        current_chat_data[prompt_key] = "" # Set to empty string
+        chat_settings.set(chat_id, prompt_key, "") # Set to empty string
         await update.message.reply_html(f"✅ <b>Суффикс</b> для изображений очищен.") # Updated text
         logger.info(f"Суффикс img {chat_id} очищен {user_id}")
     # --- Handle setting new text ---
@@ -214,7 +219,7 @@ async def set_image_prompt_suffix_command(update: Update, context: ContextTypes.
         if len(sub_command) > 1000:
             await update.message.reply_text("⚠️ Суффикс > 1000.")
             return
-        current_chat_data[prompt_key] = sub_command
+        chat_settings.set(chat_id, prompt_key, sub_command)
         await update.message.reply_html(f"✅ <b>Суффикс</b> изображений установлен:\n<code>{escape(sub_command)}</code>") # Updated text
         logger.info(f"Суффикс img {chat_id} установлен {user_id}: '{sub_command[:50]}...'")
     else:
@@ -234,10 +239,9 @@ async def clear_image_prompt_suffix_command(update: Update, context: ContextType
         return
     chat_id = update.effective_chat.id
     user_id = update.effective_user.id
-    current_chat_data = context.chat_data
     prompt_key = config.CHAT_DATA_KEY_IMAGE_SUFFIX # Use new key
-    current_chat_data[prompt_key] = "" # Set to empty string
-    await update.message.reply_html(f"✅ <b>Суффикс</b> для изображений очищен (до перезапуска).") # Updated text
+    chat_settings.set(chat_id, prompt_key, "") # Set to empty string
+    await update.message.reply_html(f"✅ <b>Суффикс</b> для изображений очищен.") # Updated text
     logger.info(f"Суффикс img {chat_id} очищен {user_id}")
 # ================================== clear_image_prompt_suffix_command() end ==================================
 
@@ -254,9 +258,9 @@ async def toggle_llm_text_command(update: Update, context: ContextTypes.DEFAULT_
     user_id = update.effective_user.id
     key = CHAT_DATA_KEY_DISPLAY_LLM_TEXT
     # Use the new default value from config
-    current_value = context.chat_data.get(key, config.DEFAULT_DISPLAY_LLM_TEXT_BOOL)
+    current_value = chat_settings.get(chat_id, key, config.DEFAULT_DISPLAY_LLM_TEXT_BOOL)
     new_value = not current_value
-    context.chat_data[key] = new_value
+    chat_settings.set(chat_id, key, new_value)
     state_text = "ВКЛ" if new_value else "ВЫКЛ"
     await update.message.reply_html(f"✅ Отображение текста LLM в подписях: <b>{state_text}</b>.")
     logger.info(f"Текст LLM {chat_id} изменен на {new_value} {user_id}")
@@ -274,15 +278,14 @@ async def reset_text_system_prompt_command(update: Update, context: ContextTypes
         return
     chat_id = update.effective_chat.id
     user_id = update.effective_user.id
-    current_chat_data = context.chat_data
     prompt_key = CHAT_DATA_KEY_TEXT_SYSTEM_PROMPT
-    logger.debug(f"/reset check: before = {current_chat_data}")
+    logger.debug(f"/reset check: before = {chat_settings.snapshot(chat_id)}")
     # Reminder: Use new line, not semicolon, for the following block/statement.
     if not context.args:
-        prompt_was_set = prompt_key in current_chat_data
+        prompt_was_set = chat_settings.contains(chat_id, prompt_key)
         # Reminder: Use new line, not semicolon, for the following block/statement.
         if prompt_was_set:
-            del current_chat_data[prompt_key]
+            chat_settings.pop(chat_id, prompt_key)
             logger.info(f"Removed '{prompt_key}' from {chat_id}")
         optional_feedback = "\n(Стандартная.)" if not prompt_was_set else ""
         reply_text = (f"✅ Инструкция <b>текста</b> сброшена:\n<code>{escape(DEFAULT_TEXT_SYSTEM_PROMPT)}</code>{optional_feedback}")
@@ -304,12 +307,69 @@ async def reset_text_system_prompt_command(update: Update, context: ContextTypes
         if len(new_prompt) > 2000:
             await update.message.reply_text("⚠️ Инструкция > 2000.")
             return
-        current_chat_data[prompt_key] = new_prompt
+        chat_settings.set(chat_id, prompt_key, new_prompt)
         await update.message.reply_html(f"✅ Инструкция <b>текста</b>:\n<code>{escape(new_prompt)}</code>")
         logger.info(f"Текст инструкция {chat_id} установлена {user_id}: '{new_prompt[:50]}...'")
-        logger.debug(f"/reset set: after = {current_chat_data}")
-    logger.debug(f"/reset check: final = {context.chat_data}")
+        logger.debug(f"/reset set: after = {chat_settings.snapshot(chat_id)}")
 # ================================== reset_text_system_prompt_command() end ==================================
 
 
+# ================================== api_status_command(): Shows Gemini API key pool state (admin only) ==================================
+async def api_status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if not update.message or not update.effective_user:
+        return
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if update.effective_user.id != config.ADMIN_ID_INT:
+        logger.warning(f"/api_status от не-админа {update.effective_user.id}")
+        return
+    lines = ["🔑 <b>Ключи Gemini API</b>:"]
+    for entry in key_pool.snapshot():
+        latency_str = f"{entry['latency_ewma']:.2f}с" if entry["latency_ewma"] is not None else "—"
+        state_str = f"⏸ cooldown {entry['cooldown_left']:.0f}с" if entry["cooldown_left"] > 0 else "✅"
+        lines.append(
+            f"<code>{escape(entry['key'])}</code> {state_str}\n"
+            f"  в работе: {entry['in_flight']}, задержка: {latency_str}, "
+            f"429: {entry['rate_429']:.0%}, 5xx: {entry['rate_5xx']:.0%} "
+            f"(всего: {entry['total_requests']}, 429: {entry['total_429']}, 5xx: {entry['total_5xx']})"
+        )
+    hedge = image_hedge_policy.snapshot()
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if hedge["enabled"]:
+        lines.append(
+            f"\n🪃 <b>Хедж изображений</b>: задержка {hedge['delay']:.1f}с (выборка {hedge['samples']}), "
+            f"окно: {hedge['window_hedges']}/{hedge['window_requests']} (бюджет {hedge['budget_percent']:.0f}%), "
+            f"всего: {hedge['total_hedges']}, выиграно: {hedge['hedge_wins']}"
+        )
+    else: lines.append("\n🪃 Хедж изображений: ВЫКЛ")
+    lines.append("🔗 <b>Объединено запросов</b>: " + ", ".join(f"{flight.name} {flight.coalesced}/{flight.started}" for flight in (image_flight, text_flight, describe_flight)))
+    image_cache = image_memory_cache.snapshot()
+    lines.append(
+        f"🖼 <b>Кэш изображений (память)</b>: {image_cache['items']} шт., {image_cache['bytes'] / (1024 * 1024):.1f}/{image_cache['max_bytes'] / (1024 * 1024):.0f}MB, "
+        f"попадания: {image_cache['hits']}, промахи: {image_cache['misses']} ({image_cache['hit_rate']:.0%}), вытеснено: {image_cache['evictions']}; "
+        f"загрузки из Telegram: {download_flight.started} (объединено: {download_flight.coalesced})"
+    )
+    janitor = cache_janitor.snapshot()
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if janitor["last_run"]:
+        lines.append(
+            f"🧹 <b>Janitor кэша</b>: последний проход удалил записей: {janitor['last_removed_entries']} ({janitor['last_reclaimed_bytes'] / (1024 * 1024):.1f}MB), "
+            f"всего освобождено {janitor['total_reclaimed_bytes'] / (1024 * 1024):.1f}MB"
+        )
+    else: lines.append("🧹 Janitor кэша: ещё не запускался")
+    lines.append(f"💾 <b>Состояния</b>: в памяти {len(context.application.bot_data)}, записей в SQLite: {state_store.writes} (ошибок: {state_store.write_errors})")
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if isinstance(context.application.bot_data, PersistentStateCache):
+        tiers = context.application.bot_data.snapshot()
+        lines.append(f"   горячий кэш {tiers['hot_bytes'] / (1024 * 1024):.1f}/{tiers['hot_max_bytes'] / (1024 * 1024):.0f}MB, попаданий: {tiers['hot_hits']}, из SQLite: {tiers['cold_hits']}, не найдено: {tiers['misses']}")
+        lines.append(f"   ожидают записи: {tiers['dirty']}, checkpoint'ов: {tiers['checkpoints']}, пропущено без изменений: {tiers['skipped_unchanged']}")
+    lag = loop_lag_monitor.snapshot()
+    lines.append(
+        f"\n⏱ <b>Event loop</b>: задержка ср. {lag['mean'] * 1000:.1f}мс, p99 {lag['p99'] * 1000:.1f}мс, "
+        f"макс. (окно) {lag['window_max'] * 1000:.0f}мс, макс. (всего) {lag['max'] * 1000:.0f}мс; пул кодеков: {config.CODEC_POOL_KIND}"
+    )
+    await update.message.reply_html("\n".join(lines))
+# ================================== api_status_command() end ==================================
+
+
 # handlers/commands.py end
\ No newline at end of file
@@ -23,6 +23,7 @@ from telegram.constants import ParseMode, ChatType
 from telegram.error import TelegramError
 from utils.auth import is_authorized
 from utils.cache import get_cached_image_bytes, get_cached_image_bytes_by_id
+from utils.chat_settings import chat_settings
 from utils.telegram_helpers import delete_message_safely
 from utils.prompt_helpers import construct_prompt_with_style, get_style_detail
 # Import describe_image_with_gemini
@@ -98,7 +99,7 @@ def parse_img_args_prompt_first(full_text: str) -> Tuple[str, Dict[str, Any]]:
         # Reminder: Use new line, not semicolon, for the following block/statement.
         if first_match:
             prompt_text = text[:first_match_pos].strip(); args_part = text[first_match_pos:].strip()
-            logger.debug(f"Split prompt: '{prompt_text}', Args: '{args_part}'")
+            logger.debug("Split prompt: '%s', Args: '%s'", prompt_text, args_part)
         else:
             prompt_text = text; args_part = ""
             logger.debug("No argument flags found.")
@@ -120,17 +121,17 @@ def parse_img_args_prompt_first(full_text: str) -> Tuple[str, Dict[str, Any]]:
         # Reminder: Use new line, not semicolon, for the following block/statement.
         if direct_match:
             matched_segment = direct_match.group(1); type_value = direct_match.group(2); style_value = direct_match.group(3)
-            logger.debug(f"Found direct pattern: {matched_segment}")
+            logger.debug("Found direct pattern: %s", matched_segment)
             args_part = args_part.replace(matched_segment, " ", 1) # Remove segment
             # Reminder: Use new line, not semicolon, for the following block/statement.
             try:
                 type_id = int(type_value); style_id = int(style_value)
                 type_data = config.TYPE_INDEX_TO_DATA.get(type_id); style_data = config.STYLE_ABSOLUTE_INDEX_TO_DATA.get(style_id)
                 # Reminder: Use new line, not semicolon, for the following block/statement.
-                if type_data: parsed_settings_data["type"] = type_data; processed_pre_flags.add("-t"); logger.debug(f"Directly parsed Type: {type_data.get('alias')}")
+                if type_data: parsed_settings_data["type"] = type_data; processed_pre_flags.add("-t"); logger.debug("Directly parsed Type: %s", type_data.get('alias'))
                 else: logger.warning(f"Direct pattern: Type index '{type_id}' not found.")
                 # Reminder: Use new line, not semicolon, for the following block/statement.
-                if style_data: parsed_settings_data["style"] = style_data; parsed_settings_data["style_marker"] = style_data; processed_pre_flags.add("-s"); logger.debug(f"Directly parsed Style: {style_data.get('alias')}")
+                if style_data: parsed_settings_data["style"] = style_data; parsed_settings_data["style_marker"] = style_data; processed_pre_flags.add("-s"); logger.debug("Directly parsed Style: %s", style_data.get('alias'))
                 else: logger.warning(f"Direct pattern: Style index '{style_id}' not found.")
             # Reminder: Use new line, not semicolon, for the following block/statement.
             except ValueError: logger.warning(f"Invalid numeric values in direct pattern: {matched_segment}")
@@ -169,11 +170,11 @@ def parse_img_args_prompt_first(full_text: str) -> Tuple[str, Dict[str, Any]]:
                 # group(1) is the string of numbers inside the parentheses, e.g., "1,2,3" or "5"
                 indices_str = list_match.group(1)
 
-                logger.debug(f"Found list pattern for {key}: '{full_matched_segment}', extracting indices: '{indices_str}'")
+                logger.debug("Found list pattern for %s: '%s', extracting indices: '%s'", key, full_matched_segment, indices_str)
 
                 # Remove the entire processed segment from args_part
                 args_part = args_part.replace(full_matched_segment, " ", 1)
-                logger.debug(f"args_part after removing '{full_matched_segment}': '{args_part}'")
+                logger.debug("args_part after removing '%s': '%s'", full_matched_segment, args_part)
 
                 try:
                     # Split the string of numbers by comma, strip whitespace, and convert to int
@@ -185,7 +186,7 @@ def parse_img_args_prompt_first(full_text: str) -> Tuple[str, Dict[str, Any]]:
                         # Mark the base flag (e.g., -t, -s, -a) as handled to avoid double processing
                         # if you have other logic that handles simple flags like -t without a list.
                         processed_pre_flags.add(f'-{key[0].lower()}') # Use lower() if IGNORECASE can lead to -T
-                        logger.debug(f"Parsed {key} choice list: {indices}")
+                        logger.debug("Parsed %s choice list: %s", key, indices)
                     else:
                         logger.warning(f"Empty or invalid index list for {key} from string: '{indices_str}'")
                 except ValueError:
@@ -213,12 +214,12 @@ def parse_img_args_prompt_first(full_text: str) -> Tuple[str, Dict[str, Any]]:
         # Check if flag was handled by pre-processing
         # Reminder: Use new line, not semicolon, for the following block/statement.
         if matched_flag in processed_pre_flags:
-            logger.debug(f"Skipping flag '{matched_flag}' as it was handled by pre-processing.")
+            logger.debug("Skipping flag '%s' as it was handled by pre-processing.", matched_flag)
             # Consume just the flag so loop continues
             remaining_args = remaining_args[len(matched_flag):]
             continue
 
-        logger.debug(f"Iterative: Found flag: '{matched_flag}'")
+        logger.debug("Iterative: Found flag: '%s'", matched_flag)
         arg_after_flag = current_arg[flag_len:]; consumed_len = flag_len; current_value = None
         m_val = re.match(r"^\s*([\w:]+)", arg_after_flag)
         # Reminder: Use new line, not semicolon, for the following block/statement.
@@ -230,14 +231,14 @@ def parse_img_args_prompt_first(full_text: str) -> Tuple[str, Dict[str, Any]]:
             # Reminder: Use new line, not semicolon, for the following block/statement.
             if not is_another_flag:
                 current_value = potential_value; consumed_len += m_val.end(0)
-                logger.debug(f"Iterative: Extracted value: '{current_value}'")
-            else: logger.debug(f"Iterative: Potential value '{potential_value}' is another flag, treating '{matched_flag}' as boolean.")
+                logger.debug("Iterative: Extracted value: '%s'", current_value)
+            else: logger.debug("Iterative: Potential value '%s' is another flag, treating '%s' as boolean.", potential_value, matched_flag)
         # Reminder: Use new line, not semicolon, for the following block/statement.
-        else: logger.debug(f"Iterative: No value found after '{matched_flag}', treating as boolean.")
+        else: logger.debug("Iterative: No value found after '%s', treating as boolean.", matched_flag)
 
         # Reminder: Use new line, not semicolon, for the following block/statement.
         if matched_flag not in processed_args: processed_args[matched_flag] = current_value
-        else: logger.debug(f"Flag '{matched_flag}' already processed, skipping.")
+        else: logger.debug("Flag '%s' already processed, skipping.", matched_flag)
 
         remaining_args = remaining_args[consumed_len:]
 
@@ -256,7 +257,7 @@ def parse_img_args_prompt_first(full_text: str) -> Tuple[str, Dict[str, Any]]:
         combined_keys = [k for k, v in processed_args.items() if v is None and k.startswith('-') and len(k) > 2 and all(c in 'tsar' for c in k[1:])]
         # Reminder: Use new line, not semicolon, for the following block/statement.
         if combined_keys:
-            combined_flag = combined_keys[0]; logger.debug(f"Found combined flag: {combined_flag}")
+            combined_flag = combined_keys[0]; logger.debug("Found combined flag: %s", combined_flag)
             # Reminder: Use new line, not semicolon, for the following block/statement.
             if 't' in combined_flag[1:]: parsed_settings_data["randomize_type"] = True; processed_flags_yielded.add('-t'); processed_flags_yielded.add('--type')
             # Reminder: Use new line, not semicolon, for the following block/statement.
@@ -283,13 +284,13 @@ def parse_img_args_prompt_first(full_text: str) -> Tuple[str, Dict[str, Any]]:
              if value_str:
                  norm_ar = value_str.replace('x', ':')
                  # Reminder: Use new line, not semicolon, for the following block/statement.
-                 if norm_ar in config.SUPPORTED_ASPECT_RATIOS: parsed_settings_data["ar"] = norm_ar; logger.debug(f"Parsed AR: {norm_ar}")
+                 if norm_ar in config.SUPPORTED_ASPECT_RATIOS: parsed_settings_data["ar"] = norm_ar; logger.debug("Parsed AR: %s", norm_ar)
                  else: logger.warning(f"Invalid AR '{value_str}'."); parsed_settings_data["ar"] = None
              else: logger.warning(f"AR flag '{flag}' found without value.")
              processed_flags_this_pass.update(flag_aliases)
         elif setting_key == "type":
              # Reminder: Use new line, not semicolon, for the following block/statement.
-             if value_str is None: parsed_settings_data["randomize_type"] = True; logger.debug(f"Flag '{flag}' implies random Type.")
+             if value_str is None: parsed_settings_data["randomize_type"] = True; logger.debug("Flag '%s' implies random Type.", flag)
              elif parsed_settings_data["type"] is None and not parsed_settings_data["type_choice_list"]: # Process only if not set by special cases
                 resolved_type_data = None; value_lower = value_str.lower()
                 # Reminder: Use new line, not semicolon, for the following block/statement.
@@ -297,18 +298,18 @@ def parse_img_args_prompt_first(full_text: str) -> Tuple[str, Dict[str, Any]]:
                 # Reminder: Use new line, not semicolon, for the following block/statement.
                 except ValueError: name = config.TYPE_ALIAS_TO_NAME.get(value_lower) or value_str; data = config.TYPE_NAME_TO_DATA.get(name.lower()); resolved_type_data = data if data else None
                 # Reminder: Use new line, not semicolon, for the following block/statement.
-                if resolved_type_data: parsed_settings_data["type"] = resolved_type_data; logger.debug(f"Parsed Type: {resolved_type_data.get('alias')}")
+                if resolved_type_data: parsed_settings_data["type"] = resolved_type_data; logger.debug("Parsed Type: %s", resolved_type_data.get('alias'))
                 else: logger.warning(f"Type '{value_str}' not found.")
              processed_flags_this_pass.update(flag_aliases)
         elif setting_key == "style":
              # Reminder: Use new line, not semicolon, for the following block/statement.
-             if value_str is None: parsed_settings_data["randomize_style"] = True; parsed_settings_data["style_marker"] = RANDOM_MARKER_GLOBAL_STYLE; logger.debug(f"Flag '{flag}' implies GLOBAL random Style.")
-             elif value_str == '0': parsed_settings_data["randomize_style"] = True; parsed_settings_data["style_marker"] = RANDOM_MARKER_RELATIVE_STYLE; logger.debug(f"Value '0' implies RELATIVE random Style.")
+             if value_str is None: parsed_settings_data["randomize_style"] = True; parsed_settings_data["style_marker"] = RANDOM_MARKER_GLOBAL_STYLE; logger.debug("Flag '%s' implies GLOBAL random Style.", flag)
+             elif value_str == '0': parsed_settings_data["randomize_style"] = True; parsed_settings_data["style_marker"] = RANDOM_MARKER_RELATIVE_STYLE; logger.debug("Value '0' implies RELATIVE random Style.")
              elif parsed_settings_data["style"] is None and parsed_settings_data["style_marker"] is None and not parsed_settings_data["style_choice_list"]: # Process only if not set by special cases
                  group_key = config.STYLE_GROUP_ALIASES.get(value_str.lower())
                  # Reminder: Use new line, not semicolon, for the following block/statement.
                  if group_key:
-                     parsed_settings_data["randomize_style"] = True; parsed_settings_data["style_marker"] = f"{RANDOM_MARKER_GROUP_STYLE_PREFIX}{group_key}"; logger.debug(f"Value '{value_str}' implies GROUP random Style ('{group_key}').")
+                     parsed_settings_data["randomize_style"] = True; parsed_settings_data["style_marker"] = f"{RANDOM_MARKER_GROUP_STYLE_PREFIX}{group_key}"; logger.debug("Value '%s' implies GROUP random Style ('%s').", value_str, group_key)
                  else:
                      resolved_style_data = None
                      # Reminder: Use new line, not semicolon, for the following block/statement.
@@ -320,12 +321,12 @@ def parse_img_args_prompt_first(full_text: str) -> Tuple[str, Dict[str, Any]]:
                      # Reminder: Use new line, not semicolon, for the following block/statement.
                      except ValueError: name = config.STYLE_ALIAS_TO_NAME.get(value_str.lower()) or value_str; data = config.STYLE_NAME_TO_DATA.get(name.lower()); resolved_style_data = data if data else None
                      # Reminder: Use new line, not semicolon, for the following block/statement.
-                     if resolved_style_data: parsed_settings_data["style"] = resolved_style_data; parsed_settings_data["style_marker"] = resolved_style_data; logger.debug(f"Parsed Style: {resolved_style_data.get('alias')}")
+                     if resolved_style_data: parsed_settings_data["style"] = resolved_style_data; parsed_settings_data["style_marker"] = resolved_style_data; logger.debug("Parsed Style: %s", resolved_style_data.get('alias'))
                      else: logger.warning(f"Style value '{value_str}' not found as index, alias, name, or group.")
              processed_flags_this_pass.update(flag_aliases)
         elif setting_key == "artist":
              # Reminder: Use new line, not semicolon, for the following block/statement.
-             if value_str is None: parsed_settings_data["randomize_artist"] = True; logger.debug(f"Flag '{flag}' implies random Artist.")
+             if value_str is None: parsed_settings_data["randomize_artist"] = True; logger.debug("Flag '%s' implies random Artist.", flag)
              elif parsed_settings_data["artist"] is None and not parsed_settings_data["artist_choice_list"]: # Process only if not set by special case
                  resolved_artist_data = None; value_lower = value_str.lower()
                  # Reminder: Use new line, not semicolon, for the following block/statement.
@@ -342,7 +343,7 @@ def parse_img_args_prompt_first(full_text: str) -> Tuple[str, Dict[str, Any]]:
                       else: name_from_full_alias = config.ARTIST_ALIAS_TO_NAME.get(value_lower); data = config.ARTIST_NAME_TO_DATA.get(name_from_full_alias.lower()) if name_from_full_alias else config.ARTIST_NAME_TO_DATA.get(value_lower)
                       resolved_artist_data = data if data else None
                  # Reminder: Use new line, not semicolon, for the following block/statement.
-                 if resolved_artist_data: parsed_settings_data["artist"] = resolved_artist_data; logger.debug(f"Parsed Artist: {resolved_artist_data.get('alias')}")
+                 if resolved_artist_data: parsed_settings_data["artist"] = resolved_artist_data; logger.debug("Parsed Artist: %s", resolved_artist_data.get('alias'))
                  else: logger.warning(f"Artist '{value_str}' not found.")
              processed_flags_this_pass.update(flag_aliases)
 
@@ -359,7 +360,7 @@ def parse_img_args_prompt_first(full_text: str) -> Tuple[str, Dict[str, Any]]:
     if prompt_text.startswith("!") or prompt_text.startswith("/img"):
         prompt_text = re.sub(r"^(?:!|/img)\s*", "", prompt_text, count=1)
 
-    logger.debug(f"Final parsed settings data: {parsed_settings_data}")
+    logger.debug("Final parsed settings data: %s", parsed_settings_data)
     return prompt_text, parsed_settings_data
 # ================================== parse_img_args_prompt_first() end ==================================
 
@@ -385,13 +386,13 @@ def _determine_context(update: Optional[Update], query: Optional[CallbackQuery])
         if not user:
             user = query.message.from_user
             logger.warning("Using query.message.from_user.")
-        logger.debug(f"Context from Query: Chat={chat.id if chat else 'N/A'}, User={user.id if user else 'N/A'}, ReplyTo={reply_to_msg_id}")
+        logger.debug("Context from Query: Chat=%s, User=%s, ReplyTo=%s", chat.id if chat else 'N/A', user.id if user else 'N/A', reply_to_msg_id)
     elif update and update.effective_chat and update.effective_user and update.message:
         chat = update.effective_chat
         user = update.effective_user
         reply_to_msg_id = update.message.message_id
         source_message_for_reply = update.message
-        logger.debug(f"Context from Update: Chat={chat.id if chat else 'N/A'}, User={user.id if user else 'N/A'}, ReplyTo={reply_to_msg_id}")
+        logger.debug("Context from Update: Chat=%s, User=%s, ReplyTo=%s", chat.id if chat else 'N/A', user.id if user else 'N/A', reply_to_msg_id)
     # Reminder: Use new line, not semicolon, for the following block/statement.
     if not chat or not user or not reply_to_msg_id or not source_message_for_reply:
         logger.error(f"Failed determine context. C:{chat is not None} U:{user is not None} R:{reply_to_msg_id} S:{source_message_for_reply is not None}")
@@ -418,7 +419,7 @@ async def _send_processing_message(context: ContextTypes.DEFAULT_TYPE, chat_id:
             parse_mode=ParseMode.HTML, # Use HTML for user_mention
             reply_to_message_id=reply_to_message_id
         )
-        logger.debug(f"Sent '{action_text}' msg {processing_msg.message_id} reply to {reply_to_message_id}")
+        logger.debug("Sent '%s' msg %s reply to %s", action_text, processing_msg.message_id, reply_to_message_id)
     # Reminder: Use new line, not semicolon, for the following block/statement.
     except Exception as e:
         logger.error(f"Failed send '{action_text}' reply msg to chat {chat_id}, replying to {reply_to_message_id}: {e}", exc_info=True)
@@ -458,7 +459,7 @@ def _resolve_settings(parsed_settings_data: Dict[str, Any]) -> Tuple[Dict[str, A
     # --- Resolve Type (Priority: List -> Specific -> Random Flag) ---
     # Reminder: Use new line, not semicolon, for the following block/statement.
     if type_choice_list:
-        logger.debug(f"Resolving random Type from list: {type_choice_list}")
+        logger.debug("Resolving random Type from list: %s", type_choice_list)
         # Reminder: Use new line, not semicolon, for the following block/statement.
         try:
             chosen_type_index = random.choice(type_choice_list)
@@ -482,13 +483,13 @@ def _resolve_settings(parsed_settings_data: Dict[str, Any]) -> Tuple[Dict[str, A
         if config.MAIN_TYPES_DATA: resolved_type_data = random.choice(config.MAIN_TYPES_DATA); logger.info(f"Random type resolved: {resolved_type_data.get('alias')}")
         else: logger.error("Cannot select random type: MAIN_TYPES_DATA is empty."); resolved_type_data = None
     elif not resolved_type_data and type_data: # Use specific type if list/random flags didn't apply/succeed
-         resolved_type_data = type_data; logger.debug(f"Using specific Type: {type_data.get('alias')}")
+         resolved_type_data = type_data; logger.debug("Using specific Type: %s", type_data.get('alias'))
 
 
     # --- Resolve Style (Priority: List -> Specific -> Markers -> Random Flag) ---
     # Reminder: Use new line, not semicolon, for the following block/statement.
     if style_choice_list:
-        logger.debug(f"Resolving random Style from list: {style_choice_list}")
+        logger.debug("Resolving random Style from list: %s", style_choice_list)
         # Reminder: Use new line, not semicolon, for the following block/statement.
         try:
             chosen_style_index = random.choice(style_choice_list)
@@ -534,7 +535,7 @@ def _resolve_settings(parsed_settings_data: Dict[str, Any]) -> Tuple[Dict[str, A
         # Reminder: Use new line, not semicolon, for the following block/statement.
         elif isinstance(style_marker, str) and style_marker.startswith(RANDOM_MARKER_GROUP_STYLE_PREFIX):
             group_key = style_marker.split(':', 1)[1]
-            logger.debug(f"Resolving GROUP random Style for group key: '{group_key}'.")
+            logger.debug("Resolving GROUP random Style for group key: '%s'.", group_key)
             style_list = config.STYLE_LISTS.get(group_key, [])
             group_styles_failed = False
             # Reminder: Use new line, not semicolon, for the following block/statement.
@@ -553,16 +554,16 @@ def _resolve_settings(parsed_settings_data: Dict[str, Any]) -> Tuple[Dict[str, A
              if config.ALL_STYLES_DATA: resolved_style_data = random.choice(config.ALL_STYLES_DATA); logger.info(f"Random global style resolved: {resolved_style_data.get('alias')}")
              else: logger.error("Cannot select global random style: ALL_STYLES_DATA is empty."); resolved_style_data = None
         elif style_marker and style_marker not in [RANDOM_MARKER_GLOBAL_STYLE, RANDOM_MARKER_RELATIVE_STYLE] and not isinstance(style_marker, str): # Specific style object was set as marker
-             logger.debug(f"Using specific Style from marker: {style_marker.get('alias')}")
+             logger.debug("Using specific Style from marker: %s", style_marker.get('alias'))
              resolved_style_data = style_marker # Use the data stored as the marker
         elif not style_marker and style_data: # Fallback to specifically parsed style data if no marker applied
-            logger.debug(f"Using specific Style from initial parse data: {style_data.get('alias')}")
+            logger.debug("Using specific Style from initial parse data: %s", style_data.get('alias'))
             resolved_style_data = style_data
 
     # --- Resolve Artist (Priority: List -> Specific -> Random Flag) ---
     # Reminder: Use new line, not semicolon, for the following block/statement.
     if artist_choice_list:
-        logger.debug(f"Resolving random Artist from list: {artist_choice_list}")
+        logger.debug("Resolving random Artist from list: %s", artist_choice_list)
         # Reminder: Use new line, not semicolon, for the following block/statement.
         try:
             chosen_artist_index = random.choice(artist_choice_list)
@@ -586,7 +587,7 @@ def _resolve_settings(parsed_settings_data: Dict[str, Any]) -> Tuple[Dict[str, A
         if config.ALL_ARTISTS_DATA: resolved_artist_data = random.choice(config.ALL_ARTISTS_DATA); logger.info(f"Random artist resolved: {resolved_artist_data.get('alias')}")
         else: logger.error("Cannot select random artist: ALL_ARTISTS_DATA is empty."); resolved_artist_data = None
     elif not resolved_artist_data and artist_data: # Use specific artist if list/random flags didn't apply/succeed
-         resolved_artist_data = artist_data; logger.debug(f"Using specific Artist: {artist_data.get('alias')}")
+         resolved_artist_data = artist_data; logger.debug("Using specific Artist: %s", artist_data.get('alias'))
 
 
     # --- Determine Indices ---
@@ -600,11 +601,19 @@ def _resolve_settings(parsed_settings_data: Dict[str, Any]) -> Tuple[Dict[str, A
 
     # --- Combine final results ---
     final_settings = {"type_data": resolved_type_data, "style_data": resolved_style_data, "artist_data": resolved_artist_data, "ar": selected_ar}
-    logger.debug(f"Resolved settings: Type={resolved_type_data.get('alias') if resolved_type_data else 'N/A'} (#{type_idx}), Style={resolved_style_data.get('alias') if resolved_style_data else 'N/A'} (#{style_idx}), Artist={resolved_artist_data.get('alias') if resolved_artist_data else 'N/A'} (#{artist_idx}), AR={selected_ar}")
+    logger.debug("Resolved settings: Type=%s (#%s), Style=%s (#%s), Artist=%s (#%s), AR=%s", resolved_type_data.get('alias') if resolved_type_data else 'N/A', type_idx, resolved_style_data.get('alias') if resolved_style_data else 'N/A', style_idx, resolved_artist_data.get('alias') if resolved_artist_data else 'N/A', artist_idx, selected_ar)
     return final_settings, type_idx, style_idx, artist_idx
 # ================================== _resolve_settings() end ==================================
 
 
+# ================================== _has_random_settings(): True if parsed settings request any random choice ==================================
+def _has_random_settings(parsed_settings_data: Dict[str, Any]) -> bool:
+    return any(parsed_settings_data.get(key) for key in (
+        "randomize_type", "randomize_style", "randomize_artist", "type_choice_list", "style_choice_list", "artist_choice_list"
+    ))
+# ================================== _has_random_settings() end ==================================
+
+
 async def _initiate_image_generation(
     update: Optional[Update], context: ContextTypes.DEFAULT_TYPE, query: Optional[CallbackQuery],
     user_prompt: str, parsed_settings_data: Dict[str, Any], original_prompt_for_display: str,
@@ -645,20 +654,8 @@ async def _initiate_image_generation(
     resolved_settings, type_idx, style_idx, artist_idx = _resolve_settings(parsed_settings_data)
     resolved_settings_tuple = (resolved_settings, type_idx, style_idx, artist_idx)
     
-    # Get chat-specific image suffix from chat_data (or default)
-    # Since this function can be called from various contexts (direct command, callback, job),
-    # we need to robustly access chat_data.
-    # For direct handlers (update is not None), context.chat_data is fine.
-    # For callbacks (query is not None), context.chat_data might be available via query.message.chat_id.
-    # For jobs, we'd need to pass chat_id and use application.bot_data.
-    # Let's assume for now that if this function is called, chat.id is valid.
-    system_suffix = ""
-    # Reminder: Use new line, not semicolon, for the following block/statement.
-    if context.application.bot_data.get('chat_data') and chat.id in context.application.bot_data['chat_data']:
-        system_suffix = context.application.bot_data['chat_data'][chat.id].get(CHAT_DATA_KEY_IMAGE_SUFFIX, DEFAULT_IMAGE_PROMPT_SUFFIX)
-    else: # Fallback if chat_data for this specific chat isn't initialized in bot_data yet
-        system_suffix = DEFAULT_IMAGE_PROMPT_SUFFIX
-        logger.debug(f"Chat data for {chat.id} not found in bot_data for suffix, using default.")
+    # Chat-specific image suffix (or default) from the durable per-chat settings store
+    system_suffix = chat_settings.get(chat.id, CHAT_DATA_KEY_IMAGE_SUFFIX, DEFAULT_IMAGE_PROMPT_SUFFIX)
 
 
     # Construct the prompt using RESOLVED settings
@@ -675,7 +672,8 @@ async def _initiate_image_generation(
     api_text, api_img, api_err = await generate_image_with_gemini(
         final_api_prompt, 
         input_image_original=base_image_bytes, 
-        input_image_user=user_image_bytes
+        input_image_user=user_image_bytes,
+        coalesce=not _has_random_settings(parsed_settings_data) # Random picks ask for a fresh result per call
     )
     
     await send_image_generation_response(
@@ -16,6 +16,7 @@ from telegram.error import TelegramError
 from utils.auth import is_authorized
 from utils.telegram_helpers import stream_and_update_message, delete_message_safely
 from utils.cache import get_cached_image_bytes
+from utils.chat_settings import chat_settings
 from handlers.image_gen import _initiate_image_generation, _initiate_image_editing, _resolve_settings, parse_img_args_prompt_first
 from config import (
     CHAT_DATA_KEY_CONVERSATION_HISTORY, CHAT_DATA_KEY_TEXT_SYSTEM_PROMPT,
@@ -56,7 +57,7 @@ async def process_text_generation_request(update: Update, context: ContextTypes.
     logger.info(f"Текст запрос от '{sender_full_name}' ({user.id}): '{user_prompt[:50]}...'")
     history_key = CHAT_DATA_KEY_CONVERSATION_HISTORY; sys_prompt_key = CHAT_DATA_KEY_TEXT_SYSTEM_PROMPT
     raw_history = context.chat_data.get(history_key, [])
-    current_text_system_prompt = context.chat_data.get(sys_prompt_key, DEFAULT_TEXT_SYSTEM_PROMPT)
+    current_text_system_prompt = chat_settings.get(chat.id, sys_prompt_key, DEFAULT_TEXT_SYSTEM_PROMPT)
     history_contents = [{"role": entry["role"], "parts": [{"text": entry["text"]}]} for entry in raw_history if entry.get("role") and entry.get("text")]
     logger.debug(f"История: {len(raw_history)}. Сист.инстр.: '{current_text_system_prompt[:100]}...'")
     try:
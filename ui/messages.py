@@ -8,6 +8,7 @@ Adheres strictly to multi-line formatting rules. Includes Artist selection.
 LLM text response shown by default. Handles prompt change request state.
 Displays /edit prefix if settings/prompt changed from original generation.
 Tracks last successful image generation.
+Seeds the local image cache with generated bytes under the sent photo's file_id.
 """
 import logging
 import io
@@ -21,6 +22,9 @@ from telegram.error import TelegramError, BadRequest
 # Import helpers and config
 from utils.html_helpers import convert_basic_markdown_to_html
 from utils.telegram_helpers import delete_message_safely
+from utils.cache import seed_cached_image
+from utils.chat_settings import chat_settings
+from utils.image_state import ImageState
 from config import (
     IMAGE_STATE_CACHE_KEY_PREFIX,
     CHAT_DATA_KEY_DISPLAY_LLM_TEXT,
@@ -190,25 +194,7 @@ async def send_image_generation_response(
     keyboard = None
     generated_file_id = None
 
-    # --- Correctly access chat_data from TTLCache ---
-    # 1. Get the top-level 'chat_data' dictionary from bot_data (TTLCache)
-    #    If it doesn't exist, create it.
-    if 'chat_data' not in context.application.bot_data:
-        context.application.bot_data['chat_data'] = {}
-    
-    # 2. Get the specific chat_id's data dictionary from the 'chat_data' dictionary.
-    #    If it doesn't exist for this chat_id, create it.
-    if chat_id not in context.application.bot_data['chat_data']:
-        context.application.bot_data['chat_data'][chat_id] = {}
-    
-    # Now, current_chat_data_dict is the dictionary for this specific chat_id
-    current_chat_data_dict = context.application.bot_data['chat_data'][chat_id]
-    # --- End of corrected access ---
-
-    show_llm_text_for_caption = current_chat_data_dict.get(
-        CHAT_DATA_KEY_DISPLAY_LLM_TEXT, 
-        DEFAULT_DISPLAY_LLM_TEXT_BOOL 
-    )
+    show_llm_text_for_caption = chat_settings.get(chat_id, CHAT_DATA_KEY_DISPLAY_LLM_TEXT, DEFAULT_DISPLAY_LLM_TEXT_BOOL)
 
     resolved_settings, type_idx, style_idx, artist_idx = resolved_settings_tuple
     
@@ -219,7 +205,7 @@ async def send_image_generation_response(
         # Reminder: Use new line, not semicolon, for the following block/statement.
         except Exception as edit_err: logger.warning(f"Не удалось отредактировать сообщение о обработке: {edit_err}")
 
-    initial_state = {
+    initial_state = ImageState.from_dict({
         "original_user_prompt": original_user_prompt,
         "effective_prompt": original_user_prompt,
         "selected_type_data": resolved_settings.get("type_data"),
@@ -242,7 +228,7 @@ async def send_image_generation_response(
         "source_image_file_id_1_for_regen": source_image_file_id_1_for_regen,
         "source_image_file_id_2_for_regen": source_image_file_id_2_for_regen,
         "is_combination_result": bool(source_image_file_id_1_for_regen and source_image_file_id_2_for_regen)
-    }
+    })
     logger.debug(f"Initial state built in sender (before file_id): {initial_state}")
 
     # Reminder: Use new line, not semicolon, for the following block/statement.
@@ -259,9 +245,7 @@ async def send_image_generation_response(
                 reply_to_message_id=reply_to_message_id, disable_web_page_preview=True
             )
             logger.info(f"Отправлено сообщение об ошибке API для чата {chat_id}.")
-            # Reminder: Use new line, not semicolon, for the following block/statement.
-            if CHAT_DATA_KEY_LAST_GENERATION in current_chat_data_dict: # Use current_chat_data_dict
-                del current_chat_data_dict[CHAT_DATA_KEY_LAST_GENERATION]
+            chat_settings.pop(chat_id, CHAT_DATA_KEY_LAST_GENERATION)
         elif api_image_bytes:
             caption_parts = _build_caption_parts(initial_state, api_text_result, show_llm_text_for_caption)
             final_caption_or_text = "".join(caption_parts); parse_mode = ParseMode.HTML
@@ -280,7 +264,8 @@ async def send_image_generation_response(
                 generated_file_id = best_photo.file_id
                 initial_state["generated_file_id"] = generated_file_id
                 logger.debug(f"Stored generated_file_id in state: {generated_file_id}")
-                current_chat_data_dict[CHAT_DATA_KEY_LAST_GENERATION] = {'chat_id': chat_id, 'message_id': sent_message.message_id} # Use current_chat_data_dict
+                seed_cached_image(generated_file_id, api_image_bytes, chat_id, sent_message.chat.username, best_photo.file_unique_id)
+                chat_settings.set(chat_id, CHAT_DATA_KEY_LAST_GENERATION, {'chat_id': chat_id, 'message_id': sent_message.message_id})
                 logger.info(f"Updated last generation tracker for chat {chat_id} to msg {sent_message.message_id}")
                 keyboard_with_id = generate_main_keyboard(initial_state, sent_message.message_id)
                 # Reminder: Use new line, not semicolon, for the following block/statement.
@@ -292,9 +277,7 @@ async def send_image_generation_response(
                 logger.debug(f"Сохранено состояние для {state_key} (включая orig_parsed_settings)")
             else:
                 logger.error("Не удалось получить sent_message или photo details!")
-                # Reminder: Use new line, not semicolon, for the following block/statement.
-                if CHAT_DATA_KEY_LAST_GENERATION in current_chat_data_dict: # Use current_chat_data_dict
-                    del current_chat_data_dict[CHAT_DATA_KEY_LAST_GENERATION]
+                chat_settings.pop(chat_id, CHAT_DATA_KEY_LAST_GENERATION)
         elif api_text_result:
             logger.info(f"API изображений вернул только текст для чата {chat_id}.")
             caption_parts = _build_caption_parts(initial_state, api_text_result, show_llm_text_for_caption)
@@ -309,24 +292,18 @@ async def send_image_generation_response(
                 chat_id=chat_id, text=final_caption_or_text[:4096], parse_mode=parse_mode,
                 reply_to_message_id=reply_to_message_id, disable_web_page_preview=True
             )
-            # Reminder: Use new line, not semicolon, for the following block/statement.
-            if CHAT_DATA_KEY_LAST_GENERATION in current_chat_data_dict: # Use current_chat_data_dict
-                del current_chat_data_dict[CHAT_DATA_KEY_LAST_GENERATION]
+            chat_settings.pop(chat_id, CHAT_DATA_KEY_LAST_GENERATION)
         else:
             logger.error(f"send_image_generation_response: От API не получено ни ошибки, ни контента (чат {chat_id}).")
             caption_parts = _build_caption_parts(initial_state, None, show_llm_text_for_caption)
             error_msg_text = f"Извините, не удалось сгенерировать ответ (пустой ответ от API)."
             final_caption_or_text = f"{error_msg_text}\n\n{''.join(caption_parts)}"
             await context.bot.send_message(chat_id=chat_id, text=final_caption_or_text, parse_mode=ParseMode.HTML, reply_to_message_id=reply_to_message_id, disable_web_page_preview=True)
-            # Reminder: Use new line, not semicolon, for the following block/statement.
-            if CHAT_DATA_KEY_LAST_GENERATION in current_chat_data_dict: # Use current_chat_data_dict
-                del current_chat_data_dict[CHAT_DATA_KEY_LAST_GENERATION]
+            chat_settings.pop(chat_id, CHAT_DATA_KEY_LAST_GENERATION)
     # Reminder: Use new line, not semicolon, for the following block/statement.
     except TelegramError as e:
         logger.error(f"Ошибка Telegram при отправке ответа генерации (чат {chat_id}): {e}")
-        # Reminder: Use new line, not semicolon, for the following block/statement.
-        if CHAT_DATA_KEY_LAST_GENERATION in current_chat_data_dict: # Use current_chat_data_dict
-            del current_chat_data_dict[CHAT_DATA_KEY_LAST_GENERATION]
+        chat_settings.pop(chat_id, CHAT_DATA_KEY_LAST_GENERATION)
         # Reminder: Use new line, not semicolon, for the following block/statement.
         if "parse error" in str(e).lower() or "Can't parse entities" in str(e):
              logger.error(f"ОШИБКА ПАРСИНГА! Контент: {final_caption_or_text[:500]}...")
@@ -350,9 +327,7 @@ async def send_image_generation_response(
     # Reminder: Use new line, not semicolon, for the following block/statement.
     except Exception as e:
          logger.exception(f"Неожиданная ошибка в send_image_generation_response (чат {chat_id}): {e}")
-         # Reminder: Use new line, not semicolon, for the following block/statement.
-         if CHAT_DATA_KEY_LAST_GENERATION in current_chat_data_dict: # Use current_chat_data_dict
-            del current_chat_data_dict[CHAT_DATA_KEY_LAST_GENERATION]
+         chat_settings.pop(chat_id, CHAT_DATA_KEY_LAST_GENERATION)
          # Reminder: Use new line, not semicolon, for the following block/statement.
          try: await context.bot.send_message(chat_id=chat_id, text="❌ Внутренняя ошибка.", reply_to_message_id=reply_to_message_id)
          # Reminder: Use new line, not semicolon, for the following block/statement.
@@ -372,18 +347,7 @@ async def update_caption_and_keyboard(context: ContextTypes.DEFAULT_TYPE, chat_i
         except Exception: pass
         return
 
-    # --- Correctly access chat_data from TTLCache ---
-    if 'chat_data' not in context.application.bot_data:
-        context.application.bot_data['chat_data'] = {}
-    if chat_id not in context.application.bot_data['chat_data']:
-        context.application.bot_data['chat_data'][chat_id] = {}
-    current_chat_data_dict_update = context.application.bot_data['chat_data'][chat_id]
-    # --- End of corrected access ---
-
-    show_llm_text_for_caption_update = current_chat_data_dict_update.get(
-        CHAT_DATA_KEY_DISPLAY_LLM_TEXT, 
-        DEFAULT_DISPLAY_LLM_TEXT_BOOL
-    )
+    show_llm_text_for_caption_update = chat_settings.get(chat_id, CHAT_DATA_KEY_DISPLAY_LLM_TEXT, DEFAULT_DISPLAY_LLM_TEXT_BOOL)
 
     keyboard = None
     ar_select_visible = state.get("ar_select_visible", False)
@@ -3,22 +3,113 @@
 """
 Handles downloading and caching Telegram photos locally.
 Refactored to avoid code duplication.
+Hot images are served from an in-memory LRU tier (byte budget) before the disk cache is touched.
+Disk lookups go through a persistent SQLite index (utils/cache_index.py) instead of globbing the chat directory.
+Files are stored once as content-addressed blobs (sha256); per-chat file_id and Telegram file_unique_id aliases point at them,
+so a photo forwarded to several chats or re-sent with a new file_id is neither stored nor downloaded again.
+All cache file I/O runs in worker threads; writes go to a temp file and are renamed into place.
+Concurrent downloads of the same file_id share one Telegram fetch (utils/singleflight.py).
+getFile results are cached for most of their validity window; file_size is checked before downloading.
+Downloads stream in chunks straight into a temp file in the blob store (size limit enforced while streaming), then are
+renamed into place and read back once, instead of buffering in BytesIO and copying again for the disk write.
+With a local Bot API server (TELEGRAM_LOCAL_MODE) files are read from its data directory and hard-linked into the store.
 """
 
 import io
 import logging
 import re
 import asyncio
+import hashlib
+import os
+import uuid
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional, Tuple
-from telegram import Chat
+from typing import Optional, Tuple, Dict, Any, BinaryIO, List
+import httpx
+from cachetools import TTLCache
+from telegram import Chat, File
 from telegram.ext import ContextTypes
 from telegram.error import TelegramError
-from config import IMAGE_CACHE_DIR
+from config import IMAGE_CACHE_DIR, IMAGE_MEMORY_CACHE_MAX_BYTES, IMAGE_MEMORY_CACHE_MAX_ITEM_BYTES, TELEGRAM_LOCAL_MODE
+from utils.cache_index import CacheIndex
+from utils.singleflight import SingleFlight
+from api.http_client import get_download_client
 
 logger = logging.getLogger(__name__)
 
-MAX_DOWNLOAD_SIZE_BYTES = 20 * 1024 * 1024
+MAX_DOWNLOAD_SIZE_BYTES = (2000 if TELEGRAM_LOCAL_MODE else 20) * 1024 * 1024 # A local Bot API server has no 20MB download limit
+FILE_META_TTL_SECONDS = 50 * 60 # Telegram keeps a getFile download path valid for at least an hour
+FILE_META_CACHE_SIZE = 2048
+DOWNLOAD_CHUNK_BYTES = 256 * 1024
+DOWNLOAD_FLUSH_BYTES = 4 * 1024 * 1024 # Chunks buffered per worker-thread write (a 20MB file takes ~5 handoffs, not ~80)
+DOWNLOAD_TIMEOUT = httpx.Timeout(60, connect=15)
+
+# ================================== MemoryImageCache: LRU of image bytes bounded by total size ==================================
+class MemoryImageCache:
+    def __init__(self, max_bytes: int, max_item_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self._items: "OrderedDict[str, bytes]" = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ================================== get(): Returns bytes and marks the entry as recently used ==================================
+    def get(self, key: str) -> Optional[bytes]:
+        data = self._items.get(key)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if data is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return data
+    # ================================== get() end ==================================
+
+    # ================================== put(): Stores bytes, evicting least recently used entries over budget ==================================
+    def put(self, key: str, data: bytes):
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if not data or len(data) > self.max_item_bytes or len(data) > self.max_bytes:
+            return
+        old = self._items.pop(key, None)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if old is not None:
+            self.current_bytes -= len(old)
+        self._items[key] = data
+        self.current_bytes += len(data)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        while self.current_bytes > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.current_bytes -= len(evicted); self.evictions += 1
+    # ================================== put() end ==================================
+
+    # ================================== discard(): Drops an entry if present ==================================
+    def discard(self, key: str):
+        old = self._items.pop(key, None)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if old is not None:
+            self.current_bytes -= len(old)
+    # ================================== discard() end ==================================
+
+    # ================================== snapshot(): Counters for /api_status ==================================
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "items": len(self._items), "bytes": self.current_bytes, "max_bytes": self.max_bytes,
+            "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+    # ================================== snapshot() end ==================================
+# ================================== MemoryImageCache end ==================================
+
+
+# Keyed by file_id: Telegram file_ids are per bot, not per chat, so one entry serves every chat
+image_memory_cache = MemoryImageCache(IMAGE_MEMORY_CACHE_MAX_BYTES, IMAGE_MEMORY_CACHE_MAX_ITEM_BYTES)
+cache_index = CacheIndex(IMAGE_CACHE_DIR)
+download_flight = SingleFlight("telegram_download")
+file_meta_cache: TTLCache = TTLCache(maxsize=FILE_META_CACHE_SIZE, ttl=FILE_META_TTL_SECONDS)
+
 
 # ================================== _get_safe_chat_subdir_name(): Generates safe subdirectory name ==================================
 def _get_safe_chat_subdir_name(chat_id: int, chat_username: Optional[str]) -> str:
@@ -41,43 +132,255 @@ def _guess_mime_type(image_bytes: bytes) -> Tuple[str, str]:
 # ================================== _guess_mime_type() end ==================================
 
 
+# ================================== _write_cache_file(): Stores bytes as a blob (atomically, once) and records the aliases (worker thread) ==================================
+def _write_cache_file(image_bytes: bytes, chat_dir: str, safe_file_id: str, file_unique_id: Optional[str], mime: str, ext: str) -> Tuple[Path, bool]:
+    sha256 = hashlib.sha256(image_bytes).hexdigest()
+    blob = cache_index.get_blob(sha256)
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if blob and blob[0].is_file():
+        cache_index.add_alias(chat_dir, safe_file_id, sha256, file_unique_id)
+        return blob[0], False
+    save_path = cache_index.blob_path(sha256, ext)
+    save_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = save_path.with_name(f"{save_path.name}.{uuid.uuid4().hex}.tmp")
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    try:
+        tmp_path.write_bytes(image_bytes)
+        tmp_path.replace(save_path) # A crash leaves at most a stray .tmp, never a truncated cache hit
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    cache_index.add_blob(sha256, save_path, len(image_bytes), mime)
+    cache_index.add_alias(chat_dir, safe_file_id, sha256, file_unique_id)
+    return save_path, True
+# ================================== _write_cache_file() end ==================================
+
+
 # ================================== _save_to_cache(): Saves downloaded image bytes ==================================
-async def _save_to_cache(image_bytes: bytes, file_id: str, chat_cache_path: Path) -> bool:
+async def _save_to_cache(image_bytes: bytes, file_id: str, chat_cache_path: Path, file_unique_id: Optional[str] = None) -> bool:
     try:
         mime, ext = _guess_mime_type(image_bytes); safe_file_id = re.sub(r'[\\/*?:"<>|\s]', "_", file_id)
-        fname = f"{safe_file_id}{ext}"; save_path = chat_cache_path / fname
-        chat_cache_path.mkdir(parents=True, exist_ok=True)
-        save_path.write_bytes(image_bytes)
-        logger.info(f"Кэшировано {len(image_bytes)} байт: {save_path}")
+        save_path, written = await asyncio.to_thread(_write_cache_file, image_bytes, chat_cache_path.name, safe_file_id, file_unique_id, mime, ext)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if written: logger.info(f"Кэшировано {len(image_bytes)} байт: {save_path}")
+        else: logger.info(f"Кэш: {file_id} ({chat_cache_path.name}) -> существующий блоб {save_path.name}")
         return True
-    except OSError as e: logger.error(f"Ошибка записи кэша {save_path}: {e}"); return False
-    except Exception as e: logger.exception(f"Ошибка сохранения кэша {save_path}: {e}"); return False
+    except OSError as e: logger.error(f"Ошибка записи кэша {file_id}: {e}"); return False
+    except Exception as e: logger.exception(f"Ошибка сохранения кэша {file_id}: {e}"); return False
 # ================================== _save_to_cache() end ==================================
 
 
+# ================================== _read_blob(): Reads a resolved blob; drops it from the index if unreadable (worker thread) ==================================
+def _read_blob(entry: Optional[Tuple[Path, int, str, str]]) -> Optional[bytes]:
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if entry is None:
+        return None
+    blob_path, _, _, sha256 = entry
+    try: return blob_path.read_bytes()
+    except Exception as e:
+        logger.error(f"Ошибка чтения кэша {blob_path}: {e}")
+        cache_index.remove_blob(sha256)
+        try: blob_path.unlink(missing_ok=True)
+        except Exception as ue: logger.error(f"Ошибка удаления кэша {blob_path}: {ue}")
+        return None
+# ================================== _read_blob() end ==================================
+
+
+# ================================== _read_cache_file(): Resolves a file_id alias and reads its blob (worker thread) ==================================
+def _read_cache_file(chat_dir: str, safe_file_id: str) -> Optional[bytes]:
+    return _read_blob(cache_index.lookup(chat_dir, safe_file_id))
+# ================================== _read_cache_file() end ==================================
+
+
+# ================================== _read_unique_blob(): Resolves a file_unique_id, records the new file_id alias and reads the blob (worker thread) ==================================
+def _read_unique_blob(chat_dir: str, safe_file_id: str, file_unique_id: str) -> Optional[bytes]:
+    entry = cache_index.lookup_unique(file_unique_id)
+    data = _read_blob(entry)
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if data is not None:
+        cache_index.add_alias(chat_dir, safe_file_id, entry[3], file_unique_id)
+    return data
+# ================================== _read_unique_blob() end ==================================
+
+
 # ================================== _get_or_download_image(): Gets image from cache or downloads ==================================
 async def _get_or_download_image(context: ContextTypes.DEFAULT_TYPE, file_id: str, chat_cache_path: Path) -> Optional[bytes]:
+    cached_bytes = image_memory_cache.get(file_id)
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if cached_bytes is not None:
+        logger.debug("Кэш HIT (память): %s", file_id)
+        return cached_bytes
     safe_file_id = re.sub(r'[\\/*?:"<>|\s]', "_", file_id)
     try:
-        potential_files = list(chat_cache_path.glob(f"{safe_file_id}.*"))
-        cached_file_path = potential_files[0] if potential_files else None
-        if cached_file_path and cached_file_path.is_file():
-            logger.debug(f"Кэш HIT: {file_id} в {cached_file_path}")
-            try: return cached_file_path.read_bytes()
-            except Exception as e:
-                logger.error(f"Ошибка чтения кэша {cached_file_path}: {e}")
-                try: cached_file_path.unlink(missing_ok=True)
-                except Exception as ue: logger.error(f"Ошибка удаления кэша {cached_file_path}: {ue}")
+        img_bytes = await asyncio.to_thread(_read_cache_file, chat_cache_path.name, safe_file_id)
+        if img_bytes is not None:
+            logger.debug(f"Кэш HIT: {file_id} в {chat_cache_path.name}")
+            image_memory_cache.put(file_id, img_bytes); return img_bytes
     except Exception as e: logger.exception(f"Ошибка проверки кэша {file_id}: {e}")
     logger.debug(f"Кэш MISS: {file_id}. Загрузка...")
+    return await download_flight.do(file_id, lambda: _download_image(context, file_id, chat_cache_path))
+# ================================== _get_or_download_image() end ==================================
+
+
+# ================================== _open_download_tmp(): Creates a temp file for a streamed download (worker thread) ==================================
+def _open_download_tmp() -> Tuple[Path, BinaryIO]:
+    tmp_dir = cache_index.blob_dir / "tmp"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = tmp_dir / f"{uuid.uuid4().hex}.tmp"
+    return tmp_path, open(tmp_path, "wb")
+# ================================== _open_download_tmp() end ==================================
+
+
+# ================================== _write_chunks(): Appends buffered chunks and feeds the running hash (worker thread) ==================================
+def _write_chunks(handle: BinaryIO, hasher: "hashlib._Hash", chunks: List[bytes]):
+    for chunk in chunks:
+        handle.write(chunk); hasher.update(chunk)
+# ================================== _write_chunks() end ==================================
+
+
+# ================================== _commit_download(): Moves a finished temp file into the blob store and reads it back (worker thread) ==================================
+def _commit_download(tmp_path: Path, sha256: str, size: int, chat_dir: str, safe_file_id: str, file_unique_id: Optional[str]) -> bytes:
+    with open(tmp_path, "rb") as handle:
+        mime, ext = _guess_mime_type(handle.read(16))
+    blob = cache_index.get_blob(sha256)
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if blob and blob[0].is_file():
+        blob_path = blob[0]; tmp_path.unlink(missing_ok=True)
+    else:
+        blob_path = cache_index.blob_path(sha256, ext)
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path.replace(blob_path)
+        cache_index.add_blob(sha256, blob_path, size, mime)
+    cache_index.add_alias(chat_dir, safe_file_id, sha256, file_unique_id)
+    return blob_path.read_bytes()
+# ================================== _commit_download() end ==================================
+
+
+# ================================== _stream_download(): Streams a Telegram file into the blob store; None if over the size limit ==================================
+async def _stream_download(url: str, file_id: str, chat_cache_path: Path, file_unique_id: Optional[str]) -> Optional[bytes]:
+    """Peak memory is DOWNLOAD_FLUSH_BYTES of buffered chunks while streaming plus one copy of the file when it is read back."""
+    safe_file_id = re.sub(r'[\\/*?:"<>|\s]', "_", file_id)
+    tmp_path, handle = await asyncio.to_thread(_open_download_tmp)
+    hasher = hashlib.sha256(); size = 0; committed = False; pending: List[bytes] = []; pending_size = 0
+    # Reminder: Use new line, not semicolon, for the following block/statement.
     try:
-        bot_file = await context.bot.get_file(file_id); buf = io.BytesIO()
-        await bot_file.download_to_memory(out=buf); img_bytes = buf.getvalue()
-        if len(img_bytes) > MAX_DOWNLOAD_SIZE_BYTES:
-            size_mb = len(img_bytes)/(1024*1024); limit_mb = MAX_DOWNLOAD_SIZE_BYTES/(1024*1024)
-            logger.warning(f"Размер ({size_mb:.1f}MB) > лимита ({limit_mb:.1f}MB) {file_id}."); return None
-        logger.debug(f"Загружено {len(img_bytes)} байт для {file_id}.")
-        asyncio.create_task(_save_to_cache(img_bytes, file_id, chat_cache_path))
+        async with get_download_client().stream("GET", url, timeout=DOWNLOAD_TIMEOUT) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_BYTES):
+                size += len(chunk)
+                # Reminder: Use new line, not semicolon, for the following block/statement.
+                if size > MAX_DOWNLOAD_SIZE_BYTES:
+                    limit_mb = MAX_DOWNLOAD_SIZE_BYTES/(1024*1024)
+                    logger.warning(f"Загрузка {file_id} прервана: > лимита ({limit_mb:.1f}MB)."); return None
+                pending.append(chunk); pending_size += len(chunk)
+                # Reminder: Use new line, not semicolon, for the following block/statement.
+                if pending_size >= DOWNLOAD_FLUSH_BYTES:
+                    await asyncio.to_thread(_write_chunks, handle, hasher, pending); pending = []; pending_size = 0
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if pending:
+            await asyncio.to_thread(_write_chunks, handle, hasher, pending)
+        await asyncio.to_thread(handle.close)
+        img_bytes = await asyncio.to_thread(_commit_download, tmp_path, hasher.hexdigest(), size, chat_cache_path.name, safe_file_id, file_unique_id)
+        committed = True
+        logger.info(f"Загружено потоково и кэшировано {size} байт для {file_id}.")
+        return img_bytes
+    finally:
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if not committed:
+            handle.close(); tmp_path.unlink(missing_ok=True)
+# ================================== _stream_download() end ==================================
+
+
+# ================================== _get_file_meta(): getFile with a TTL cache; returns (File, served_from_cache) ==================================
+async def _get_file_meta(context: ContextTypes.DEFAULT_TYPE, file_id: str, refresh: bool = False) -> Tuple[File, bool]:
+    bot_file = None if refresh else file_meta_cache.get(file_id)
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if bot_file is not None:
+        return bot_file, True
+    bot_file = await context.bot.get_file(file_id)
+    file_meta_cache[file_id] = bot_file
+    return bot_file, False
+# ================================== _get_file_meta() end ==================================
+
+
+# ================================== _commit_local_file(): Reads a file from the local Bot API server and links it into the store (worker thread) ==================================
+def _commit_local_file(local_path: Path, file_id: str, chat_dir: str, safe_file_id: str, file_unique_id: Optional[str]) -> Optional[bytes]:
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if local_path.stat().st_size > MAX_DOWNLOAD_SIZE_BYTES:
+        logger.warning(f"Локальный файл {file_id} больше лимита, пропуск."); return None
+    img_bytes = local_path.read_bytes()
+    sha256 = hashlib.sha256(img_bytes).hexdigest()
+    blob = cache_index.get_blob(sha256)
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if not (blob and blob[0].is_file()):
+        mime, ext = _guess_mime_type(img_bytes)
+        blob_path = cache_index.blob_path(sha256, ext)
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        try:
+            os.link(local_path, blob_path) # Same filesystem: no second copy on disk
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        except FileExistsError:
+            pass
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        except OSError:
+            _write_cache_file(img_bytes, chat_dir, safe_file_id, file_unique_id, mime, ext)
+            return img_bytes
+        cache_index.add_blob(sha256, blob_path, len(img_bytes), mime)
+    cache_index.add_alias(chat_dir, safe_file_id, sha256, file_unique_id)
+    return img_bytes
+# ================================== _commit_local_file() end ==================================
+
+
+# ================================== _fetch_file_bytes(): Streams http(s) paths, reads local Bot API files, buffers anything else ==================================
+async def _fetch_file_bytes(bot_file: File, buf: io.BytesIO, file_id: str, chat_cache_path: Path, file_unique_id: Optional[str]) -> Optional[bytes]:
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if bot_file.file_path and bot_file.file_path.startswith(("http://", "https://")):
+        return await _stream_download(bot_file.file_path, file_id, chat_cache_path, file_unique_id)
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if TELEGRAM_LOCAL_MODE and bot_file.file_path and Path(bot_file.file_path).is_absolute():
+        safe_file_id = re.sub(r'[\\/*?:"<>|\s]', "_", file_id)
+        img_bytes = await asyncio.to_thread(_commit_local_file, Path(bot_file.file_path), file_id, chat_cache_path.name, safe_file_id, file_unique_id)
+        logger.debug("Прочитан локальный файл Bot API для %s.", file_id)
+        return img_bytes
+    await bot_file.download_to_memory(out=buf); img_bytes = buf.getvalue()
+    if len(img_bytes) > MAX_DOWNLOAD_SIZE_BYTES:
+        size_mb = len(img_bytes)/(1024*1024); limit_mb = MAX_DOWNLOAD_SIZE_BYTES/(1024*1024)
+        logger.warning(f"Размер ({size_mb:.1f}MB) > лимита ({limit_mb:.1f}MB) {file_id}."); return None
+    logger.debug(f"Загружено {len(img_bytes)} байт для {file_id}.")
+    asyncio.create_task(_save_to_cache(img_bytes, file_id, chat_cache_path, file_unique_id))
+    return img_bytes
+# ================================== _fetch_file_bytes() end ==================================
+
+
+# ================================== _download_image(): Downloads from Telegram, fills the memory tier, schedules the disk write ==================================
+async def _download_image(context: ContextTypes.DEFAULT_TYPE, file_id: str, chat_cache_path: Path) -> Optional[bytes]:
+    try:
+        bot_file, meta_from_cache = await _get_file_meta(context, file_id); buf = io.BytesIO()
+        file_unique_id = getattr(bot_file, "file_unique_id", None)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if file_unique_id:
+            safe_file_id = re.sub(r'[\\/*?:"<>|\s]', "_", file_id)
+            blob_bytes = await asyncio.to_thread(_read_unique_blob, chat_cache_path.name, safe_file_id, file_unique_id)
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if blob_bytes is not None:
+                logger.debug("Кэш HIT (file_unique_id %s): %s, загрузка не нужна.", file_unique_id, file_id)
+                image_memory_cache.put(file_id, blob_bytes)
+                return blob_bytes
+        if bot_file.file_size and bot_file.file_size > MAX_DOWNLOAD_SIZE_BYTES:
+            size_mb = bot_file.file_size/(1024*1024); limit_mb = MAX_DOWNLOAD_SIZE_BYTES/(1024*1024)
+            logger.warning(f"Размер по getFile ({size_mb:.1f}MB) > лимита ({limit_mb:.1f}MB) {file_id}, загрузка пропущена."); return None
+        try: img_bytes = await _fetch_file_bytes(bot_file, buf, file_id, chat_cache_path, file_unique_id)
+        except (TelegramError, httpx.HTTPStatusError, FileNotFoundError) as e: # FileNotFoundError: local server removed the file
+            if not meta_from_cache: raise
+            logger.info(f"Загрузка по кэшированному пути не удалась ({type(e).__name__}), повтор getFile для {file_id}.")
+            bot_file, _ = await _get_file_meta(context, file_id, refresh=True); buf = io.BytesIO()
+            img_bytes = await _fetch_file_bytes(bot_file, buf, file_id, chat_cache_path, file_unique_id)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if img_bytes is None:
+            return None
+        image_memory_cache.put(file_id, img_bytes)
         return img_bytes
     except TelegramError as e:
         error_msg = str(e).lower()
@@ -85,8 +388,10 @@ async def _get_or_download_image(context: ContextTypes.DEFAULT_TYPE, file_id: st
         elif "file not found" in error_msg or "invalid file_id" in error_msg: logger.warning(f"TG Error: File not found {file_id}. {e}")
         else: logger.error(f"TG Error при загрузке {file_id}: {e}")
         return None
+    except httpx.HTTPStatusError as e: logger.error(f"HTTP {e.response.status_code} при загрузке {file_id}."); return None # str(e) holds the URL with the bot token
+    except httpx.HTTPError as e: logger.error(f"Сетевая ошибка при загрузке {file_id}: {type(e).__name__}"); return None
     except Exception as e: logger.exception(f"Неож. ошибка при загрузке {file_id}: {e}"); return None
-# ================================== _get_or_download_image() end ==================================
+# ================================== _download_image() end ==================================
 
 
 # ================================== get_cached_image_bytes(): Public: gets image, uses Chat object for path ==================================
@@ -107,4 +412,14 @@ async def get_cached_image_bytes_by_id(context: ContextTypes.DEFAULT_TYPE, file_
     return await _get_or_download_image(context, file_id, chat_cache_path)
 # ================================== get_cached_image_bytes_by_id() end ==================================
 
+# ================================== seed_cached_image(): Public: stores bytes the bot already has under a file_id (write-through) ==================================
+def seed_cached_image(file_id: str, image_bytes: bytes, chat_id: int, chat_username: Optional[str], file_unique_id: Optional[str] = None):
+    """Used after sending a generated photo, so later edits of it never download it back from Telegram."""
+    if not file_id or not image_bytes: return
+    chat_cache_path = IMAGE_CACHE_DIR / _get_safe_chat_subdir_name(chat_id, chat_username)
+    image_memory_cache.put(file_id, image_bytes)
+    asyncio.create_task(_save_to_cache(image_bytes, file_id, chat_cache_path, file_unique_id))
+    logger.debug("Кэш засеян при отправке: %s (%s байт)", file_id, len(image_bytes))
+# ================================== seed_cached_image() end ==================================
+
 # utils/cache.py end
\ No newline at end of file
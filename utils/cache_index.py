@@ -0,0 +1,266 @@
+# utils/cache_index.py
+# -*- coding: utf-8 -*-
+"""
+Persistent SQLite index of the content-addressed Telegram image store.
+Blobs live once under image_cache/blobs/<sha[:2]>/<sha256><ext>; (chat dir, file_id) aliases and
+Telegram file_unique_id aliases point at them, so the same photo in several chats or re-sent with a new file_id is stored once.
+If the index file is missing (or has an older schema) it is rebuilt by scanning image_cache/: blobs are re-indexed and
+legacy per-chat files (<chat>/<file_id><ext>) are moved into the blob store with their alias.
+Calls are serialized by a lock so the janitor (utils/cache_janitor.py) can use the index from a worker thread.
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Tuple, List
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE_NAME = "index.sqlite3"
+BLOB_DIR_NAME = "blobs"
+SCHEMA_VERSION = 2
+EXTENSION_MIME_TYPES = {".jpg": "image/jpeg", ".png": "image/png", ".gif": "image/gif", ".webp": "image/webp"}
+
+# ================================== CacheIndex: SQLite-backed blob/alias index for the image cache ==================================
+class CacheIndex:
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = cache_dir
+        self.blob_dir = cache_dir / BLOB_DIR_NAME
+        self.db_path = cache_dir / INDEX_FILE_NAME
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+
+    # ================================== _connect(): Opens the index on first use, rebuilding it when missing or outdated ==================================
+    def _connect(self) -> sqlite3.Connection:
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if self._conn is not None:
+            return self._conn
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL"); conn.execute("PRAGMA synchronous=NORMAL")
+        needs_rebuild = conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if needs_rebuild:
+            conn.executescript("DROP TABLE IF EXISTS entries; DROP TABLE IF EXISTS blobs; DROP TABLE IF EXISTS aliases; DROP TABLE IF EXISTS unique_ids;")
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            " sha256 TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL, mime TEXT NOT NULL, last_access REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS aliases ("
+            " chat_dir TEXT NOT NULL, file_id TEXT NOT NULL, sha256 TEXT NOT NULL, last_access REAL NOT NULL,"
+            " PRIMARY KEY (chat_dir, file_id));"
+            "CREATE TABLE IF NOT EXISTS unique_ids (file_unique_id TEXT PRIMARY KEY, sha256 TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS blobs_last_access ON blobs (last_access);"
+            "CREATE INDEX IF NOT EXISTS aliases_file_id ON aliases (file_id);"
+            "CREATE INDEX IF NOT EXISTS aliases_sha256 ON aliases (sha256);"
+            "CREATE INDEX IF NOT EXISTS aliases_chat_access ON aliases (chat_dir, last_access);"
+            "CREATE INDEX IF NOT EXISTS unique_ids_sha256 ON unique_ids (sha256);"
+        )
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._conn = conn
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if needs_rebuild:
+            self.rebuild()
+        return conn
+    # ================================== _connect() end ==================================
+
+    # ================================== blob_path(): Location of a blob in the store ==================================
+    def blob_path(self, sha256: str, ext: str) -> Path:
+        return self.blob_dir / sha256[:2] / f"{sha256}{ext}"
+    # ================================== blob_path() end ==================================
+
+    # ================================== rebuild(): Re-indexes blobs and migrates legacy per-chat files ==================================
+    def rebuild(self) -> int:
+        with self._lock:
+            conn = self._connect()
+            blob_rows = {}; alias_rows = []
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if self.blob_dir.is_dir():
+                for blob_path in self.blob_dir.glob("*/*"):
+                    # Reminder: Use new line, not semicolon, for the following block/statement.
+                    if not blob_path.is_file() or blob_path.name.endswith(".tmp"):
+                        continue
+                    stat = blob_path.stat()
+                    blob_rows[blob_path.stem] = (blob_path.stem, str(blob_path.relative_to(self.cache_dir)), stat.st_size,
+                                                 EXTENSION_MIME_TYPES.get(blob_path.suffix.lower(), "application/octet-stream"), stat.st_mtime)
+            for chat_path in self.cache_dir.iterdir():
+                # Reminder: Use new line, not semicolon, for the following block/statement.
+                if not chat_path.is_dir() or chat_path.name == BLOB_DIR_NAME:
+                    continue
+                for file_path in chat_path.iterdir():
+                    # Reminder: Use new line, not semicolon, for the following block/statement.
+                    if not file_path.is_file() or file_path.name.endswith(".tmp"):
+                        continue
+                    # Reminder: Use new line, not semicolon, for the following block/statement.
+                    try:
+                        data = file_path.read_bytes(); sha256 = hashlib.sha256(data).hexdigest(); mtime = file_path.stat().st_mtime
+                        # Reminder: Use new line, not semicolon, for the following block/statement.
+                        if sha256 in blob_rows:
+                            file_path.unlink()
+                        else:
+                            target = self.blob_path(sha256, file_path.suffix.lower())
+                            target.parent.mkdir(parents=True, exist_ok=True)
+                            file_path.replace(target)
+                            blob_rows[sha256] = (sha256, str(target.relative_to(self.cache_dir)), len(data),
+                                                 EXTENSION_MIME_TYPES.get(target.suffix, "application/octet-stream"), mtime)
+                        alias_rows.append((chat_path.name, file_path.stem, sha256, mtime))
+                    # Reminder: Use new line, not semicolon, for the following block/statement.
+                    except OSError as e:
+                        logger.error(f"Индекс кэша: не удалось перенести {file_path}: {e}")
+                # Reminder: Use new line, not semicolon, for the following block/statement.
+                try:
+                    chat_path.rmdir() # Only succeeds once the legacy directory is empty
+                # Reminder: Use new line, not semicolon, for the following block/statement.
+                except OSError:
+                    pass
+            conn.execute("BEGIN")
+            conn.execute("DELETE FROM blobs"); conn.execute("DELETE FROM aliases"); conn.execute("DELETE FROM unique_ids")
+            conn.executemany("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?)", list(blob_rows.values()))
+            conn.executemany("INSERT OR REPLACE INTO aliases VALUES (?, ?, ?, ?)", alias_rows)
+            conn.execute("COMMIT")
+            logger.info(f"Индекс кэша перестроен: блобов {len(blob_rows)}, перенесено алиасов из каталогов чатов {len(alias_rows)} ({self.db_path}).")
+            return len(blob_rows)
+    # ================================== rebuild() end ==================================
+
+    # ================================== _touch(): Refreshes last access of a blob and optionally upserts one alias ==================================
+    def _touch(self, conn: sqlite3.Connection, sha256: str, chat_dir: Optional[str] = None, file_id: Optional[str] = None):
+        now = time.time()
+        conn.execute("UPDATE blobs SET last_access = ? WHERE sha256 = ?", (now, sha256))
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if chat_dir is not None:
+            conn.execute("INSERT OR REPLACE INTO aliases VALUES (?, ?, ?, ?)", (chat_dir, file_id, sha256, now))
+    # ================================== _touch() end ==================================
+
+    # ================================== lookup(): Resolves a file_id to (absolute path, size, mime, sha256) ==================================
+    def lookup(self, chat_dir: str, file_id: str) -> Optional[Tuple[Path, int, str, str]]:
+        """file_ids are per bot, not per chat: an alias from another chat is reused and recorded for this chat."""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT b.path, b.size, b.mime, b.sha256 FROM aliases a JOIN blobs b ON b.sha256 = a.sha256"
+                " WHERE a.file_id = ? ORDER BY a.chat_dir = ? DESC LIMIT 1", (file_id, chat_dir)
+            ).fetchone()
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if row is None:
+                return None
+            self._touch(conn, row[3], chat_dir, file_id)
+            return self.cache_dir / row[0], row[1], row[2], row[3]
+    # ================================== lookup() end ==================================
+
+    # ================================== lookup_unique(): Resolves a Telegram file_unique_id to (absolute path, size, mime, sha256) ==================================
+    def lookup_unique(self, file_unique_id: str) -> Optional[Tuple[Path, int, str, str]]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT b.path, b.size, b.mime, b.sha256 FROM unique_ids u JOIN blobs b ON b.sha256 = u.sha256 WHERE u.file_unique_id = ?",
+                (file_unique_id,)
+            ).fetchone()
+            return (self.cache_dir / row[0], row[1], row[2], row[3]) if row else None
+    # ================================== lookup_unique() end ==================================
+
+    # ================================== get_blob(): Returns (absolute path, size, mime) of a blob ==================================
+    def get_blob(self, sha256: str) -> Optional[Tuple[Path, int, str]]:
+        with self._lock:
+            row = self._connect().execute("SELECT path, size, mime FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+            return (self.cache_dir / row[0], row[1], row[2]) if row else None
+    # ================================== get_blob() end ==================================
+
+    # ================================== add_blob(): Records a blob written to the store ==================================
+    def add_blob(self, sha256: str, path: Path, size: int, mime: str):
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?)", (sha256, str(path.relative_to(self.cache_dir)), size, mime, time.time())
+            )
+    # ================================== add_blob() end ==================================
+
+    # ================================== add_alias(): Points (chat dir, file_id) and optionally a file_unique_id at a blob ==================================
+    def add_alias(self, chat_dir: str, file_id: str, sha256: str, file_unique_id: Optional[str] = None):
+        with self._lock:
+            conn = self._connect()
+            self._touch(conn, sha256, chat_dir, file_id)
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if file_unique_id:
+                conn.execute("INSERT OR REPLACE INTO unique_ids VALUES (?, ?)", (file_unique_id, sha256))
+    # ================================== add_alias() end ==================================
+
+    # ================================== remove_blob(): Forgets a blob and every alias pointing at it ==================================
+    def remove_blob(self, sha256: str):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM aliases WHERE sha256 = ?", (sha256,))
+            conn.execute("DELETE FROM unique_ids WHERE sha256 = ?", (sha256,))
+            conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+    # ================================== remove_blob() end ==================================
+
+    # ================================== remove_aliases(): Drops (chat dir, file_id, sha256) aliases; returns blobs left without any alias ==================================
+    def remove_aliases(self, keys: List[Tuple[str, str, str]]) -> List[Tuple[str, str, int]]:
+        with self._lock:
+            conn = self._connect()
+            conn.executemany("DELETE FROM aliases WHERE chat_dir = ? AND file_id = ?", [(chat_dir, file_id) for chat_dir, file_id, _ in keys])
+            orphans = []
+            for sha256 in {sha256 for _, _, sha256 in keys}:
+                # Reminder: Use new line, not semicolon, for the following block/statement.
+                if conn.execute("SELECT 1 FROM aliases WHERE sha256 = ? LIMIT 1", (sha256,)).fetchone() is None:
+                    row = conn.execute("SELECT sha256, path, size FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+                    # Reminder: Use new line, not semicolon, for the following block/statement.
+                    if row:
+                        orphans.append(row)
+            return orphans
+    # ================================== remove_aliases() end ==================================
+
+    # ================================== total_bytes(): Stored bytes overall, or bytes of the blobs a chat dir refers to ==================================
+    def total_bytes(self, chat_dir: Optional[str] = None) -> int:
+        with self._lock:
+            conn = self._connect()
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if chat_dir is None:
+                return conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            return conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM blobs WHERE sha256 IN (SELECT sha256 FROM aliases WHERE chat_dir = ?)", (chat_dir,)
+            ).fetchone()[0]
+    # ================================== total_bytes() end ==================================
+
+    # ================================== chats_over(): Chat dirs whose referenced blobs exceed quota ==================================
+    def chats_over(self, quota: int) -> List[Tuple[str, int]]:
+        with self._lock:
+            return self._connect().execute(
+                "SELECT a.chat_dir, SUM(b.size) AS total FROM (SELECT DISTINCT chat_dir, sha256 FROM aliases) a"
+                " JOIN blobs b ON b.sha256 = a.sha256 GROUP BY a.chat_dir HAVING total > ?", (quota,)
+            ).fetchall()
+    # ================================== chats_over() end ==================================
+
+    # ================================== expired_blobs(): Up to limit blobs (sha256, path, size) not accessed since cutoff ==================================
+    def expired_blobs(self, cutoff: float, limit: int) -> List[Tuple[str, str, int]]:
+        with self._lock:
+            return self._connect().execute(
+                "SELECT sha256, path, size FROM blobs WHERE last_access < ? ORDER BY last_access LIMIT ?", (cutoff, limit)
+            ).fetchall()
+    # ================================== expired_blobs() end ==================================
+
+    # ================================== oldest_blobs(): Up to limit least recently accessed blobs (sha256, path, size) ==================================
+    def oldest_blobs(self, limit: int) -> List[Tuple[str, str, int]]:
+        with self._lock:
+            return self._connect().execute("SELECT sha256, path, size FROM blobs ORDER BY last_access LIMIT ?", (limit,)).fetchall()
+    # ================================== oldest_blobs() end ==================================
+
+    # ================================== oldest_chat_aliases(): Up to limit least recently used aliases of a chat (chat_dir, file_id, sha256, size) ==================================
+    def oldest_chat_aliases(self, chat_dir: str, limit: int) -> List[Tuple[str, str, str, int]]:
+        with self._lock:
+            return self._connect().execute(
+                "SELECT a.chat_dir, a.file_id, a.sha256, b.size FROM aliases a JOIN blobs b ON b.sha256 = a.sha256"
+                " WHERE a.chat_dir = ? ORDER BY a.last_access LIMIT ?", (chat_dir, limit)
+            ).fetchall()
+    # ================================== oldest_chat_aliases() end ==================================
+
+    # ================================== close(): Closes the database connection ==================================
+    def close(self):
+        with self._lock:
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+    # ================================== close() end ==================================
+# ================================== CacheIndex end ==================================
+
+# utils/cache_index.py end
@@ -0,0 +1,154 @@
+# utils/cache_janitor.py
+# -*- coding: utf-8 -*-
+"""
+Background eviction for image_cache/: max age, optional per-chat quota, global quota.
+Evicts least recently accessed blobs/aliases (per utils/cache_index.py) in small batches in a worker thread,
+yielding to the event loop between batches. Run periodically via the job queue (see bot.py).
+"""
+
+import asyncio
+import logging
+import time
+from typing import Optional, List, Tuple, Dict, Any
+from telegram.ext import ContextTypes
+from config import IMAGE_CACHE_MAX_BYTES, IMAGE_CACHE_CHAT_MAX_BYTES, IMAGE_CACHE_MAX_AGE_SECONDS
+from utils.cache_index import CacheIndex
+from utils.cache import cache_index
+
+logger = logging.getLogger(__name__)
+
+JANITOR_BATCH_SIZE = 200
+
+# ================================== CacheJanitor: Evicts cached images by age and size quotas ==================================
+class CacheJanitor:
+    def __init__(self, index: CacheIndex, max_bytes: int, chat_max_bytes: int, max_age_seconds: float, batch_size: int = JANITOR_BATCH_SIZE):
+        self.index = index
+        self.max_bytes = max_bytes
+        self.chat_max_bytes = chat_max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.batch_size = batch_size
+        self._running = False
+        self.last_run: Optional[float] = None
+        self.last_reclaimed_bytes = 0
+        self.last_removed_entries = 0
+        self.total_reclaimed_bytes = 0
+
+    # ================================== _delete_blobs(): Deletes blob files and their index rows (worker thread) ==================================
+    def _delete_blobs(self, rows: List[Tuple[str, str, int]]) -> int:
+        reclaimed = 0
+        for sha256, rel_path, size in rows:
+            path = self.index.cache_dir / rel_path
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            try:
+                path.unlink(missing_ok=True)
+                reclaimed += size
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            except OSError as e:
+                logger.error(f"Janitor: не удалось удалить {path}: {e}")
+            self.index.remove_blob(sha256)
+        return reclaimed
+    # ================================== _delete_blobs() end ==================================
+
+    # ================================== _evict_expired_batch(): One batch of blobs older than max age ==================================
+    def _evict_expired_batch(self) -> Tuple[int, int]:
+        rows = self.index.expired_blobs(time.time() - self.max_age_seconds, self.batch_size)
+        return self._delete_blobs(rows), len(rows)
+    # ================================== _evict_expired_batch() end ==================================
+
+    # ================================== _evict_chat_batch(): One batch of a chat's oldest aliases while the chat is over quota ==================================
+    def _evict_chat_batch(self, quota: int, chat_dir: str) -> Tuple[int, int]:
+        """Drops the chat's aliases; a blob is deleted only once no chat refers to it any more."""
+        excess = self.index.total_bytes(chat_dir) - quota
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if excess <= 0:
+            return 0, 0
+        keys = []
+        for chat, file_id, sha256, size in self.index.oldest_chat_aliases(chat_dir, self.batch_size):
+            keys.append((chat, file_id, sha256)); excess -= size
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if excess <= 0:
+                break
+        orphans = self.index.remove_aliases(keys)
+        return self._delete_blobs(orphans), len(keys)
+    # ================================== _evict_chat_batch() end ==================================
+
+    # ================================== _evict_global_batch(): One batch of oldest blobs while the store is over quota ==================================
+    def _evict_global_batch(self, quota: int) -> Tuple[int, int]:
+        excess = self.index.total_bytes() - quota
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if excess <= 0:
+            return 0, 0
+        rows = []
+        for row in self.index.oldest_blobs(self.batch_size):
+            rows.append(row); excess -= row[2]
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if excess <= 0:
+                break
+        return self._delete_blobs(rows), len(rows)
+    # ================================== _evict_global_batch() end ==================================
+
+    # ================================== _drain(): Repeats a batch function until it removes nothing ==================================
+    async def _drain(self, batch_func, *args) -> Tuple[int, int]:
+        reclaimed = removed = 0
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        while True:
+            batch_reclaimed, batch_removed = await asyncio.to_thread(batch_func, *args)
+            reclaimed += batch_reclaimed; removed += batch_removed
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if batch_removed == 0:
+                return reclaimed, removed
+    # ================================== _drain() end ==================================
+
+    # ================================== run_once(): Applies age, per-chat and global limits; returns bytes reclaimed ==================================
+    async def run_once(self) -> int:
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if self._running:
+            logger.info("Janitor: предыдущий проход ещё выполняется, пропуск.")
+            return 0
+        self._running = True
+        start = time.monotonic(); reclaimed = removed = 0
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        try:
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if self.max_age_seconds > 0:
+                r, n = await self._drain(self._evict_expired_batch); reclaimed += r; removed += n
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if self.chat_max_bytes > 0:
+                for chat_dir, _ in await asyncio.to_thread(self.index.chats_over, self.chat_max_bytes):
+                    r, n = await self._drain(self._evict_chat_batch, self.chat_max_bytes, chat_dir); reclaimed += r; removed += n
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if self.max_bytes > 0:
+                r, n = await self._drain(self._evict_global_batch, self.max_bytes); reclaimed += r; removed += n
+        finally:
+            self._running = False
+        self.last_run = time.time(); self.last_reclaimed_bytes = reclaimed; self.last_removed_entries = removed
+        self.total_reclaimed_bytes += reclaimed
+        logger.info(f"Janitor: удалено записей: {removed}, освобождено {reclaimed / (1024 * 1024):.1f}MB за {time.monotonic() - start:.2f}с.")
+        return reclaimed
+    # ================================== run_once() end ==================================
+
+    # ================================== snapshot(): Stats for /api_status ==================================
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "last_run": self.last_run, "last_reclaimed_bytes": self.last_reclaimed_bytes,
+            "last_removed_entries": self.last_removed_entries, "total_reclaimed_bytes": self.total_reclaimed_bytes,
+            "max_bytes": self.max_bytes, "chat_max_bytes": self.chat_max_bytes,
+        }
+    # ================================== snapshot() end ==================================
+# ================================== CacheJanitor end ==================================
+
+
+cache_janitor = CacheJanitor(cache_index, IMAGE_CACHE_MAX_BYTES, IMAGE_CACHE_CHAT_MAX_BYTES, IMAGE_CACHE_MAX_AGE_SECONDS)
+
+
+# ================================== cache_janitor_job(): Job queue callback ==================================
+async def cache_janitor_job(context: ContextTypes.DEFAULT_TYPE):
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    try:
+        await cache_janitor.run_once()
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    except Exception as e:
+        logger.exception(f"Janitor: ошибка прохода: {e}")
+# ================================== cache_janitor_job() end ==================================
+
+# utils/cache_janitor.py end
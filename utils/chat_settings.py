@@ -0,0 +1,86 @@
+# utils/chat_settings.py
+# -*- coding: utf-8 -*-
+"""
+Durable per-chat settings: image suffix, text system prompt, LLM text display toggle, last generation tracker.
+Kept apart from bot_data so they are not evicted by image-state traffic and survive restarts.
+A chat's row is loaded from the state database on first access and written through on every change.
+Conversation history stays in PTB's in-memory context.chat_data.
+"""
+
+import logging
+from typing import Any, Dict
+from utils.state_store import StateStore, state_store
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# ================================== ChatSettingsStore: Lazily loaded, write-through settings per chat_id ==================================
+class ChatSettingsStore:
+    def __init__(self, store: StateStore):
+        self.store = store
+        self._chats: Dict[int, Dict[str, Any]] = {}
+
+    # ================================== _chat(): The chat's settings dict, loaded on first use ==================================
+    def _chat(self, chat_id: int) -> Dict[str, Any]:
+        data = self._chats.get(chat_id)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if data is None:
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            try:
+                data = self.store.load_chat_settings(chat_id) or {}
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            except Exception as e:
+                logger.error(f"Не удалось загрузить настройки чата {chat_id}: {e}"); data = {}
+            self._chats[chat_id] = data
+        return data
+    # ================================== _chat() end ==================================
+
+    # ================================== _save(): Writes the chat's row through ==================================
+    def _save(self, chat_id: int):
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        try:
+            self.store.save_chat_settings(chat_id, self._chats.get(chat_id, {}))
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        except Exception as e:
+            logger.error(f"Не удалось сохранить настройки чата {chat_id}: {e}")
+    # ================================== _save() end ==================================
+
+    # ================================== get(): One setting, or default ==================================
+    def get(self, chat_id: int, key: str, default: Any = None) -> Any:
+        return self._chat(chat_id).get(key, default)
+    # ================================== get() end ==================================
+
+    # ================================== contains(): Whether the chat has the setting (even an empty one) ==================================
+    def contains(self, chat_id: int, key: str) -> bool:
+        return key in self._chat(chat_id)
+    # ================================== contains() end ==================================
+
+    # ================================== set(): Stores a setting; writes only when the value changes ==================================
+    def set(self, chat_id: int, key: str, value: Any):
+        data = self._chat(chat_id)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if data.get(key, _MISSING) != value:
+            data[key] = value; self._save(chat_id)
+    # ================================== set() end ==================================
+
+    # ================================== pop(): Removes a setting and returns it ==================================
+    def pop(self, chat_id: int, key: str, default: Any = None) -> Any:
+        data = self._chat(chat_id)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if key not in data:
+            return default
+        value = data.pop(key); self._save(chat_id)
+        return value
+    # ================================== pop() end ==================================
+
+    # ================================== snapshot(): Copy of a chat's settings ==================================
+    def snapshot(self, chat_id: int) -> Dict[str, Any]:
+        return dict(self._chat(chat_id))
+    # ================================== snapshot() end ==================================
+# ================================== ChatSettingsStore end ==================================
+
+
+chat_settings = ChatSettingsStore(state_store)
+
+# utils/chat_settings.py end
@@ -0,0 +1,109 @@
+# utils/codec_pool.py
+# -*- coding: utf-8 -*-
+"""
+Bounded worker pool for CPU-heavy payload encoding/decoding (JSON, base64) off the event loop.
+Pool kind (thread/process/inline) and size come from config; small payloads are handled inline.
+Worker functions are module-level so they can be pickled for the process pool.
+"""
+
+import asyncio
+import base64
+import binascii
+import hashlib
+import json
+import logging
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Optional
+from config import CODEC_POOL_KIND, CODEC_POOL_WORKERS, CODEC_OFFLOAD_MIN_BYTES
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[Executor] = None
+
+# ================================== encode_json_bytes(): Serializes an object to UTF-8 JSON bytes ==================================
+def encode_json_bytes(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+# ================================== encode_json_bytes() end ==================================
+
+
+# ================================== decode_json_bytes(): Parses UTF-8 JSON bytes ==================================
+def decode_json_bytes(data: bytes) -> Any:
+    return json.loads(data)
+# ================================== decode_json_bytes() end ==================================
+
+
+# ================================== b64encode_str(): Base64-encodes bytes to str ==================================
+def b64encode_str(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+# ================================== b64encode_str() end ==================================
+
+
+# ================================== sha256_digest(): SHA-256 digest of bytes ==================================
+def sha256_digest(data: bytes) -> bytes:
+    return hashlib.sha256(data).digest()
+# ================================== sha256_digest() end ==================================
+
+
+# ================================== decode_json_with_inline_data(): Parses a Gemini response and decodes inlineData to bytes ==================================
+def decode_json_with_inline_data(data: bytes) -> Any:
+    """Like decode_json_bytes, but candidates[].content.parts[].inlineData.data becomes bytes when it decodes cleanly."""
+    res_json = json.loads(data)
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if not isinstance(res_json, dict):
+        return res_json
+    for candidate in res_json.get("candidates") or []:
+        for part in (candidate.get("content") or {}).get("parts") or []:
+            inline_data = part.get("inlineData")
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if not inline_data or not isinstance(inline_data.get("data"), str):
+                continue
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            try:
+                inline_data["data"] = base64.b64decode(inline_data["data"])
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            except (binascii.Error, ValueError):
+                pass # Left as str; the caller reports the decode error
+    return res_json
+# ================================== decode_json_with_inline_data() end ==================================
+
+
+# ================================== get_codec_executor(): Returns the shared executor, creating it on first use ==================================
+def get_codec_executor() -> Optional[Executor]:
+    global _executor
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if CODEC_POOL_KIND == "inline":
+        return None
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if _executor is None:
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if CODEC_POOL_KIND == "process":
+            _executor = ProcessPoolExecutor(max_workers=CODEC_POOL_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=CODEC_POOL_WORKERS, thread_name_prefix="codec")
+        logger.info(f"Пул кодеков создан: {CODEC_POOL_KIND}, воркеров: {CODEC_POOL_WORKERS}")
+    return _executor
+# ================================== get_codec_executor() end ==================================
+
+
+# ================================== run_codec(): Runs func(*args) in the codec pool, inline for small payloads ==================================
+async def run_codec(func: Callable, *args: Any, size_hint: int = 0) -> Any:
+    executor = get_codec_executor()
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if executor is None or size_hint < CODEC_OFFLOAD_MIN_BYTES:
+        return func(*args)
+    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+# ================================== run_codec() end ==================================
+
+
+# ================================== shutdown_codec_pool(): Stops the pool workers ==================================
+def shutdown_codec_pool():
+    global _executor
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if _executor is None:
+        return
+    _executor.shutdown(wait=False, cancel_futures=True)
+    _executor = None
+    logger.info("Пул кодеков остановлен.")
+# ================================== shutdown_codec_pool() end ==================================
+
+# utils/codec_pool.py end
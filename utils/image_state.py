@@ -0,0 +1,275 @@
+# utils/image_state.py
+# -*- coding: utf-8 -*-
+"""
+Compact keyboard state of one generated image message (bot_data["img_info:<chat>:<msg>"]).
+ImageState uses __slots__ instead of a per-message dict and keeps the mapping interface the handlers use
+(state["key"], state.get("key"), state["key"] = value), so callers are unchanged.
+Type/style/artist dicts are shared references to the config catalogs, never copies.
+encode()/decode() give a versioned binary form: catalog dicts become their catalog index, repeated strings
+(effective prompt == original prompt, file ids) are written once. Pickling goes through the same encoding.
+"""
+
+import logging
+import operator
+import struct
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+from config import TYPE_INDEX_TO_DATA, STYLE_ABSOLUTE_INDEX_TO_DATA, ARTIST_ABSOLUTE_INDEX_TO_DATA
+
+logger = logging.getLogger(__name__)
+
+ENCODING_MAGIC = b"IS"
+ENCODING_VERSION = 1
+INTERN_MAX_LENGTH = 24
+
+# Field order is part of the encoding: append new fields at the end and bump ENCODING_VERSION
+STATE_FIELDS: Tuple[str, ...] = (
+    "original_user_prompt", "effective_prompt",
+    "selected_type_data", "selected_style_data", "selected_artist_data", "selected_ar",
+    "selected_type_index", "selected_style_abs_index", "selected_artist_abs_index",
+    "settings_visible", "ar_select_visible", "type_select_visible", "style_select_visible", "artist_select_visible",
+    "prompt_action_visible", "awaiting_prompt_change",
+    "type_page", "style_page", "artist_page",
+    "last_api_text_result", "api_call_prompt", "api_call_settings", "original_parsed_settings",
+    "generated_file_id", "base_image_file_id_for_regen", "source_image_file_id_1_for_regen", "source_image_file_id_2_for_regen",
+    "is_combination_result",
+)
+_FIELD_SET = frozenset(STATE_FIELDS)
+_FALSE_DEFAULTS = frozenset(("settings_visible", "ar_select_visible", "type_select_visible", "style_select_visible", "artist_select_visible", "prompt_action_visible", "awaiting_prompt_change", "is_combination_result"))
+_ZERO_DEFAULTS = frozenset(("type_page", "style_page", "artist_page"))
+
+_T_NONE, _T_FALSE, _T_TRUE, _T_INT, _T_STR, _T_STR_REF, _T_LIST, _T_DICT, _T_TYPE, _T_STYLE, _T_ARTIST, _T_FLOAT = range(12)
+_CATALOGS = ((_T_TYPE, TYPE_INDEX_TO_DATA), (_T_STYLE, STYLE_ABSOLUTE_INDEX_TO_DATA), (_T_ARTIST, ARTIST_ABSOLUTE_INDEX_TO_DATA))
+# id(catalog dict) -> (tag, index); only the catalog objects themselves are compacted, edited copies are written out in full
+_CATALOG_REFS: Dict[int, Tuple[int, int]] = {id(data): (tag, index) for tag, catalog in _CATALOGS for index, data in catalog.items()}
+_CATALOG_BY_TAG = {tag: catalog for tag, catalog in _CATALOGS}
+_CONTAINER_TYPES = (dict, list)
+_get_fields = operator.attrgetter(*STATE_FIELDS)
+
+
+# ================================== _write_varint(): Unsigned LEB128 ==================================
+def _write_varint(out: bytearray, value: int):
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80); value >>= 7
+    out.append(value)
+# ================================== _write_varint() end ==================================
+
+
+# ================================== _read_varint(): Returns (value, new offset) ==================================
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    result = shift = 0
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    while True:
+        byte = data[pos]; pos += 1
+        result |= (byte & 0x7F) << shift; shift += 7
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if not byte & 0x80:
+            return result, pos
+# ================================== _read_varint() end ==================================
+
+
+# ================================== _encode_value(): Appends one tagged value ==================================
+def _encode_value(out: bytearray, value: Any, strings: Dict[str, int]):
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if value is None:
+        out.append(_T_NONE)
+    elif value is True or value is False:
+        out.append(_T_TRUE if value else _T_FALSE)
+    elif isinstance(value, int):
+        out.append(_T_INT); _write_varint(out, (value << 1) if value >= 0 else ((-value << 1) - 1)) # zigzag
+    elif isinstance(value, str):
+        ref = strings.get(value)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if ref is not None:
+            out.append(_T_STR_REF); _write_varint(out, ref)
+        else:
+            strings[value] = len(strings); raw = value.encode("utf-8")
+            out.append(_T_STR); _write_varint(out, len(raw)); out += raw
+    elif isinstance(value, dict):
+        catalog_ref = _CATALOG_REFS.get(id(value))
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if catalog_ref is not None:
+            out.append(catalog_ref[0]); _write_varint(out, catalog_ref[1])
+        else:
+            out.append(_T_DICT); _write_varint(out, len(value))
+            for key, item in value.items():
+                _encode_value(out, key, strings); _encode_value(out, item, strings)
+    elif isinstance(value, (list, tuple)):
+        out.append(_T_LIST); _write_varint(out, len(value))
+        for item in value:
+            _encode_value(out, item, strings)
+    elif isinstance(value, float):
+        out.append(_T_FLOAT); out += struct.pack("<d", value)
+    else:
+        raise TypeError(f"ImageState: неподдерживаемый тип {type(value).__name__}")
+# ================================== _encode_value() end ==================================
+
+
+# ================================== _decode_value(): Reads one tagged value; returns (value, new offset) ==================================
+def _decode_value(data: bytes, pos: int, strings: List[str]) -> Tuple[Any, int]:
+    tag = data[pos]; pos += 1
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if tag == _T_NONE:
+        return None, pos
+    if tag == _T_FALSE or tag == _T_TRUE:
+        return tag == _T_TRUE, pos
+    if tag == _T_INT:
+        raw, pos = _read_varint(data, pos)
+        return (raw >> 1) if not raw & 1 else -((raw + 1) >> 1), pos
+    if tag == _T_STR:
+        length, pos = _read_varint(data, pos)
+        value = data[pos:pos + length].decode("utf-8")
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if length <= INTERN_MAX_LENGTH:
+            value = sys.intern(value) # Settings keys and values like "16:9" are shared across states instead of repeated
+        strings.append(value)
+        return value, pos + length
+    if tag == _T_STR_REF:
+        ref, pos = _read_varint(data, pos)
+        return strings[ref], pos
+    if tag in _CATALOG_BY_TAG:
+        index, pos = _read_varint(data, pos)
+        return _CATALOG_BY_TAG[tag].get(index), pos # None if the catalog shrank since the state was written
+    if tag == _T_DICT:
+        count, pos = _read_varint(data, pos); result = {}
+        for _ in range(count):
+            key, pos = _decode_value(data, pos, strings); result[key], pos = _decode_value(data, pos, strings)
+        return result, pos
+    if tag == _T_LIST:
+        count, pos = _read_varint(data, pos); result = []
+        for _ in range(count):
+            item, pos = _decode_value(data, pos, strings); result.append(item)
+        return result, pos
+    if tag == _T_FLOAT:
+        return struct.unpack_from("<d", data, pos)[0], pos + 8
+    raise ValueError(f"ImageState: неизвестный тег {tag}")
+# ================================== _decode_value() end ==================================
+
+
+# ================================== _snapshot_value(): Copies nested containers, keeping catalog dicts as shared references ==================================
+def _snapshot_value(value: Any) -> Any:
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if type(value) is dict:
+        return value if id(value) in _CATALOG_REFS else {key: (_snapshot_value(item) if type(item) in _CONTAINER_TYPES else item) for key, item in value.items()}
+    if type(value) is list:
+        return [_snapshot_value(item) if type(item) in _CONTAINER_TYPES else item for item in value]
+    return value
+# ================================== _snapshot_value() end ==================================
+
+
+# ================================== ImageState: Slotted per-message keyboard state with a dict-like interface ==================================
+class ImageState:
+    __slots__ = STATE_FIELDS + ("stored_digest",) # stored_digest: blake2b of the encoding last written to / read from the state store
+
+    def __init__(self, **values: Any):
+        for field in STATE_FIELDS:
+            default = False if field in _FALSE_DEFAULTS else 0 if field in _ZERO_DEFAULTS else None
+            object.__setattr__(self, field, default)
+        self.stored_digest: Optional[bytes] = None
+        for key, value in values.items():
+            self[key] = value
+
+    # ================================== from_dict(): Builds a state from a legacy dict (unknown keys are dropped) ==================================
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ImageState":
+        unknown = [key for key in data if key not in _FIELD_SET]
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if unknown:
+            logger.debug("ImageState.from_dict: пропущены ключи %s", unknown)
+        return cls(**{key: value for key, value in data.items() if key in _FIELD_SET})
+    # ================================== from_dict() end ==================================
+
+    # ================================== to_dict(): Plain dict view (for logging/debugging) ==================================
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in STATE_FIELDS}
+    # ================================== to_dict() end ==================================
+
+    # Mapping interface used by handlers/ui: only known fields are accepted
+    def __getitem__(self, key: str) -> Any:
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if key not in _FIELD_SET:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value: Any):
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if key not in _FIELD_SET:
+            raise KeyError(f"ImageState: неизвестное поле {key!r}")
+        object.__setattr__(self, key, value)
+
+    def __contains__(self, key: object) -> bool:
+        return key in _FIELD_SET
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in _FIELD_SET else default
+
+    def __repr__(self) -> str:
+        return f"ImageState({self.to_dict()!r})"
+
+    # ================================== approx_size(): Rough bytes held by this state (shared catalog dicts not counted) ==================================
+    def approx_size(self) -> int:
+        size = sys.getsizeof(self)
+        for field in STATE_FIELDS:
+            value = getattr(self, field)
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if isinstance(value, str):
+                size += sys.getsizeof(value)
+            elif isinstance(value, (dict, list)) and id(value) not in _CATALOG_REFS:
+                size += sys.getsizeof(value) + sum(sys.getsizeof(item) for item in (value.values() if isinstance(value, dict) else value) if isinstance(item, str))
+        return size
+    # ================================== approx_size() end ==================================
+
+    # ================================== snapshot(): Field values detached from this state, for encode_snapshot() off the loop ==================================
+    def snapshot(self) -> Tuple[Any, ...]:
+        """Only nested containers are copied (catalog dicts stay shared); handlers may keep mutating the state afterwards."""
+        return tuple(_snapshot_value(value) if type(value) in _CONTAINER_TYPES else value for value in _get_fields(self))
+    # ================================== snapshot() end ==================================
+
+    # ================================== encode(): Versioned binary form ==================================
+    def encode(self) -> bytes:
+        return encode_snapshot(_get_fields(self))
+    # ================================== encode() end ==================================
+
+    # ================================== decode(): Inverse of encode() ==================================
+    @classmethod
+    def decode(cls, data: bytes) -> "ImageState":
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if data[:2] != ENCODING_MAGIC:
+            raise ValueError("ImageState: неверная сигнатура")
+        version = data[2]
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if version != ENCODING_VERSION:
+            raise ValueError(f"ImageState: неподдерживаемая версия {version}")
+        state = cls.__new__(cls); state.stored_digest = None; pos = 3; strings: List[str] = []
+        for field in STATE_FIELDS:
+            value, pos = _decode_value(data, pos, strings); object.__setattr__(state, field, value)
+        return state
+    # ================================== decode() end ==================================
+
+    def __reduce__(self):
+        return (ImageState.decode, (self.encode(),))
+# ================================== ImageState end ==================================
+
+
+# ================================== encode_snapshot(): Encodes field values in STATE_FIELDS order (ImageState.snapshot()) ==================================
+def encode_snapshot(values: Tuple[Any, ...]) -> bytes:
+    out = bytearray(ENCODING_MAGIC); out.append(ENCODING_VERSION); strings: Dict[str, int] = {}
+    for value in values:
+        _encode_value(out, value, strings)
+    return bytes(out)
+# ================================== encode_snapshot() end ==================================
+
+
+# ================================== is_encoded_state(): Whether bytes were produced by ImageState.encode() ==================================
+def is_encoded_state(data: bytes) -> bool:
+    return data[:2] == ENCODING_MAGIC
+# ================================== is_encoded_state() end ==================================
+
+
+# ================================== as_image_state(): Converts a legacy dict state; passes ImageState and anything else through ==================================
+def as_image_state(value: Any) -> Any:
+    return ImageState.from_dict(value) if isinstance(value, dict) else value
+# ================================== as_image_state() end ==================================
+
+# utils/image_state.py end
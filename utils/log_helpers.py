@@ -0,0 +1,106 @@
+# utils/log_helpers.py
+# -*- coding: utf-8 -*-
+"""
+Cheap logging helpers for hot paths.
+LazyPayload defers formatting until a handler actually emits the record (use with %-style logger args),
+and summarizes payloads by size and shape instead of str(), so multi-MB base64/bytes are never copied.
+"""
+
+from typing import Any, Callable, List
+
+SUMMARY_MAX_CHARS = 500
+SUMMARY_MAX_DEPTH = 8
+SUMMARY_MAX_ITEMS = 8
+SUMMARY_STR_PREVIEW = 60
+
+# ================================== _summarize(): Appends a size/shape summary of obj to out ==================================
+def _summarize(obj: Any, out: List[str], depth: int, budget: List[int]):
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if budget[0] <= 0:
+        return
+    # Reminder: Use new line, not semicolon, for the following block/statement.
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        piece = f"<bytes {len(obj)}>"
+    elif isinstance(obj, str):
+        piece = repr(obj) if len(obj) <= SUMMARY_STR_PREVIEW else f"<str {len(obj)} {obj[:SUMMARY_STR_PREVIEW]!r}…>"
+    elif isinstance(obj, dict):
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if depth >= SUMMARY_MAX_DEPTH:
+            piece = f"<dict {len(obj)}>"
+        else:
+            out.append("{"); budget[0] -= 1
+            for i, (key, value) in enumerate(obj.items()):
+                # Reminder: Use new line, not semicolon, for the following block/statement.
+                if i >= SUMMARY_MAX_ITEMS:
+                    out.append(f", …+{len(obj) - i}"); break
+                # Reminder: Use new line, not semicolon, for the following block/statement.
+                if i:
+                    out.append(", ")
+                key_piece = f"{key!r}: "; out.append(key_piece); budget[0] -= len(key_piece)
+                _summarize(value, out, depth + 1, budget)
+                # Reminder: Use new line, not semicolon, for the following block/statement.
+                if budget[0] <= 0:
+                    return
+            out.append("}"); budget[0] -= 1
+            return
+    elif isinstance(obj, (list, tuple)):
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if depth >= SUMMARY_MAX_DEPTH:
+            piece = f"<{type(obj).__name__} {len(obj)}>"
+        else:
+            out.append("["); budget[0] -= 1
+            for i, value in enumerate(obj):
+                # Reminder: Use new line, not semicolon, for the following block/statement.
+                if i >= SUMMARY_MAX_ITEMS:
+                    out.append(f", …+{len(obj) - i}"); break
+                # Reminder: Use new line, not semicolon, for the following block/statement.
+                if i:
+                    out.append(", ")
+                _summarize(value, out, depth + 1, budget)
+                # Reminder: Use new line, not semicolon, for the following block/statement.
+                if budget[0] <= 0:
+                    return
+            out.append("]"); budget[0] -= 1
+            return
+    elif obj is None or isinstance(obj, (bool, int, float)):
+        piece = repr(obj)
+    else:
+        piece = f"<{type(obj).__name__}>"
+    out.append(piece); budget[0] -= len(piece)
+# ================================== _summarize() end ==================================
+
+
+# ================================== summarize_payload(): Size/shape summary of a payload, bounded in length and cost ==================================
+def summarize_payload(obj: Any, max_chars: int = SUMMARY_MAX_CHARS) -> str:
+    out: List[str] = []
+    _summarize(obj, out, 0, [max_chars])
+    summary = "".join(out)
+    return summary if len(summary) <= max_chars else summary[:max_chars] + "…"
+# ================================== summarize_payload() end ==================================
+
+
+# ================================== LazyPayload: Formats a payload summary only when the log record is emitted ==================================
+class LazyPayload:
+    __slots__ = ("obj", "max_chars")
+
+    def __init__(self, obj: Any, max_chars: int = SUMMARY_MAX_CHARS):
+        self.obj = obj
+        self.max_chars = max_chars
+
+    def __str__(self) -> str:
+        return summarize_payload(self.obj, self.max_chars)
+# ================================== LazyPayload end ==================================
+
+
+# ================================== LazyStr: Calls func() only when the log record is emitted ==================================
+class LazyStr:
+    __slots__ = ("func",)
+
+    def __init__(self, func: Callable[[], Any]):
+        self.func = func
+
+    def __str__(self) -> str:
+        return str(self.func())
+# ================================== LazyStr end ==================================
+
+# utils/log_helpers.py end
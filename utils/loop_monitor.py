@@ -0,0 +1,81 @@
+# utils/loop_monitor.py
+# -*- coding: utf-8 -*-
+"""
+Event-loop lag monitor: a background task that sleeps a fixed interval and records how late it wakes up.
+Lag means some callback held the loop (e.g. decoding a multi-MB payload inline). Shown by /api_status.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG_WARN_SECONDS = 0.5
+
+# ================================== LoopLagMonitor: Samples event-loop scheduling delay ==================================
+class LoopLagMonitor:
+    def __init__(self, interval: float = 0.25, window: int = 1200):
+        self.interval = interval
+        self._samples: deque = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+        self.max_lag = 0.0
+
+    # ================================== _run(): Sleep/measure loop ==================================
+    async def _run(self):
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - expected)
+            self._samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if lag >= LOOP_LAG_WARN_SECONDS:
+                logger.warning(f"Event loop заблокирован на {lag * 1000:.0f}мс.")
+    # ================================== _run() end ==================================
+
+    # ================================== start(): Starts sampling on the running loop ==================================
+    def start(self):
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="loop-lag-monitor")
+    # ================================== start() end ==================================
+
+    # ================================== stop(): Cancels the sampling task ==================================
+    async def stop(self):
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if self._task is None:
+            return
+        self._task.cancel()
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        try:
+            await self._task
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+    # ================================== stop() end ==================================
+
+    # ================================== snapshot(): Returns lag statistics over the window (seconds) ==================================
+    def snapshot(self) -> Dict[str, Any]:
+        ordered = sorted(self._samples)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if not ordered:
+            return {"samples": 0, "mean": 0.0, "p99": 0.0, "window_max": 0.0, "max": self.max_lag}
+        return {
+            "samples": len(ordered),
+            "mean": sum(ordered) / len(ordered),
+            "p99": ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))],
+            "window_max": ordered[-1],
+            "max": self.max_lag,
+        }
+    # ================================== snapshot() end ==================================
+# ================================== LoopLagMonitor end ==================================
+
+
+loop_lag_monitor = LoopLagMonitor()
+
+# utils/loop_monitor.py end
@@ -0,0 +1,161 @@
+# utils/result_cache.py
+# -*- coding: utf-8 -*-
+"""
+Two-tier (memory + disk) TTL cache for JSON-serializable API results.
+Memory tier is an LRU TTLCache; disk tier stores one JSON file per key under a sharded directory.
+Keys are hex digests (see make_cache_key); disk I/O runs in a worker thread.
+Expired disk entries of keys that are never read again are removed by result_cache_sweep_job (see bot.py).
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from pathlib import Path
+from typing import Any, List, Optional
+from cachetools import TTLCache
+from telegram.ext import ContextTypes
+
+logger = logging.getLogger(__name__)
+
+STALE_TMP_SECONDS = 60 * 60 # Temp files of writers that died mid-write
+result_caches: List["ResultCache"] = [] # Every ResultCache, for the sweep job
+
+# ================================== make_cache_key(): Builds a sha256 hex key from text/bytes parts ==================================
+def make_cache_key(*parts: Any) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, (bytes, bytearray, memoryview)) else str(part).encode("utf-8")
+        digest.update(len(data).to_bytes(8, "big")); digest.update(data)
+    return digest.hexdigest()
+# ================================== make_cache_key() end ==================================
+
+
+# ================================== ResultCache: Memory LRU + disk JSON cache with TTL ==================================
+class ResultCache:
+    def __init__(self, name: str, cache_dir: Path, ttl_seconds: float, memory_maxsize: int):
+        self.name = name
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self._memory: TTLCache = TTLCache(maxsize=max(1, memory_maxsize), ttl=ttl_seconds)
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.swept_entries = 0
+        result_caches.append(self)
+
+    # ================================== _path(): Disk path for a key ==================================
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+    # ================================== _path() end ==================================
+
+    # ================================== _read_disk(): Blocking read of a disk entry, drops expired ones ==================================
+    def _read_disk(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        except FileNotFoundError:
+            return None
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        except (OSError, ValueError) as e:
+            logger.warning(f"Кэш '{self.name}': повреждена запись {path.name}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if time.time() - entry.get("created", 0) > self.ttl_seconds:
+            path.unlink(missing_ok=True)
+            return None
+        return entry.get("value")
+    # ================================== _read_disk() end ==================================
+
+    # ================================== _write_disk(): Blocking atomic write of a disk entry ==================================
+    def _write_disk(self, key: str, value: Any):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        tmp_path.write_text(json.dumps({"created": time.time(), "value": value}, ensure_ascii=False), encoding="utf-8")
+        tmp_path.replace(path)
+    # ================================== _write_disk() end ==================================
+
+    # ================================== _sweep_disk(): Blocking removal of expired entries and stale temp files ==================================
+    def _sweep_disk(self) -> int:
+        """An entry's mtime is its write time, which is when "created" was stamped, so expiry is checked without parsing."""
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if not self.cache_dir.is_dir():
+            return 0
+        now = time.time(); removed = 0
+        for path in self.cache_dir.glob("*/*"):
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            try:
+                age = now - path.stat().st_mtime
+                # Reminder: Use new line, not semicolon, for the following block/statement.
+                if (path.suffix == ".json" and age > self.ttl_seconds) or (path.suffix == ".tmp" and age > STALE_TMP_SECONDS):
+                    path.unlink(missing_ok=True); removed += 1
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            except OSError as e:
+                logger.warning(f"Кэш '{self.name}': не удалось проверить {path.name}: {e}")
+        return removed
+    # ================================== _sweep_disk() end ==================================
+
+    # ================================== sweep(): Removes expired disk entries in a worker thread ==================================
+    async def sweep(self) -> int:
+        removed = await asyncio.to_thread(self._sweep_disk)
+        self.swept_entries += removed
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if removed:
+            logger.info(f"Кэш '{self.name}': удалено {removed} устаревших записей с диска.")
+        return removed
+    # ================================== sweep() end ==================================
+
+    # ================================== get(): Returns cached value or None ==================================
+    async def get(self, key: str) -> Optional[Any]:
+        value = self._memory.get(key)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if value is not None:
+            self.hits_memory += 1
+            return value
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        try:
+            value = await asyncio.to_thread(self._read_disk, key)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        except Exception as e:
+            logger.error(f"Кэш '{self.name}': ошибка чтения {key[:12]}: {e}")
+            value = None
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits_disk += 1
+        self._memory[key] = value
+        return value
+    # ================================== get() end ==================================
+
+    # ================================== set(): Stores value in both tiers ==================================
+    async def set(self, key: str, value: Any):
+        self._memory[key] = value
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        try:
+            await asyncio.to_thread(self._write_disk, key, value)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        except Exception as e:
+            logger.error(f"Кэш '{self.name}': ошибка записи {key[:12]}: {e}")
+    # ================================== set() end ==================================
+# ================================== ResultCache end ==================================
+
+
+# ================================== result_cache_sweep_job(): Job queue entry point ==================================
+async def result_cache_sweep_job(context: ContextTypes.DEFAULT_TYPE):
+    for cache in result_caches:
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        try:
+            await cache.sweep()
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        except Exception as e:
+            logger.exception(f"Кэш '{cache.name}': ошибка очистки: {e}")
+# ================================== result_cache_sweep_job() end ==================================
+
+# utils/result_cache.py end
@@ -0,0 +1,70 @@
+# utils/singleflight.py
+# -*- coding: utf-8 -*-
+"""
+Single-flight coalescing of identical concurrent async calls.
+The first caller for a key starts the work in its own task; concurrent callers with the same key await that task.
+A caller being cancelled does not cancel the shared work while other callers still wait for it.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+# ================================== _Flight: One in-flight call and its waiter count ==================================
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+# ================================== _Flight end ==================================
+
+
+# ================================== SingleFlight: Coalesces concurrent calls by key ==================================
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[str, _Flight] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    # ================================== do(): Runs factory() once per key among concurrent callers ==================================
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._flights.get(key)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self._flights[key] = flight
+            self.started += 1
+            flight.task.add_done_callback(lambda _task, k=key, f=flight: self._forget(k, f))
+        else:
+            self.coalesced += 1
+            logger.info(f"SingleFlight '{self.name}': запрос {key[:12]} присоединён к выполняющемуся ({flight.waiters} ожидающих).")
+        flight.waiters += 1
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        try:
+            return await asyncio.shield(flight.task)
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        except asyncio.CancelledError:
+            # Reminder: Use new line, not semicolon, for the following block/statement.
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel() # Last interested caller left
+            raise
+        finally:
+            flight.waiters -= 1
+    # ================================== do() end ==================================
+
+    # ================================== _forget(): Drops a finished flight so later calls start fresh ==================================
+    def _forget(self, key: str, flight: _Flight):
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # Reminder: Use new line, not semicolon, for the following block/statement.
+        if not flight.task.cancelled() and flight.task.exception() is not None and flight.waiters == 0:
+            logger.debug("SingleFlight '%s': ошибка без ожидающих: %s", self.name, flight.task.exception())
+    # ================================== _forget() end ==================================
+# ================================== SingleFlight end ==================================
+
+# utils/singleflight.py end